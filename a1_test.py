@@ -1,11 +1,25 @@
 import unittest
-from distance_map import DistanceMap
-from domain import Parcel, Truck, Fleet
-from container import PriorityQueue
-from scheduler import RandomScheduler, GreedyScheduler
-from experiment import SchedulingExperiment
+import distance_map
+from distance_map import DistanceMap, MatrixDistanceMap, SparseDistanceMap, \
+    CoordinateDistanceMap, FrozenDistanceMap
+import domain
+from domain import Parcel, ParcelTable, Truck, Fleet
+from container import Container, PriorityQueue, HeapPriorityQueue, \
+    KeyedPriorityQueue, IndexedPriorityQueue, BucketPriorityQueue, \
+    ConcurrentPriorityQueue, AsyncPriorityQueue
+from scheduler import RandomScheduler, GreedyScheduler, OnlineScheduler
+from local_search import RouteOptimizer, FleetOptimizer
+from experiment import SchedulingExperiment, read_distance_map, \
+    convert_distance_map, read_coordinates, read_parcels, read_parcel_table
+import asyncio
+import gc
+import os
+import pickle
+import queue
 import random
 import signal
+import tempfile
+import threading
 
 
 class TestUtil(unittest.TestCase):
@@ -55,7 +69,11 @@ class TestDistanceMap(TestUtil):
         self.assertPublicAttrs(self.m, [])
 
     def test_public_methods(self):
-        self.assertPublicMethods(DistanceMap, ['distance', 'add_distance'])
+        self.assertPublicMethods(DistanceMap, ['distance', 'add_distance',
+                                               'nearest', 'freeze',
+                                               'get_version',
+                                               'changed_since',
+                                               'route_distances'])
 
     def test_add_distance(self):
         self.assertIsNone(self.m.add_distance('a', 'b', 10),
@@ -83,6 +101,342 @@ class TestDistanceMap(TestUtil):
         self.assertEqual(12, self.m.distance('b', 'a'),
                          "You should return 12 for distance from b to a")
 
+    def assertNearest(self, cities):
+        for city in cities:
+            found = [(self.m.distance(city, other), other)
+                     for other in cities if other != city]
+            exp = [other for d, other in sorted(found) if d >= 0]
+            for k in [0, 1, 3, len(cities)]:
+                self.assertEqual(exp[:k], self.m.nearest(city, k))
+
+    def test_nearest(self):
+        cities = ['c' + str(i) for i in range(12)]
+        self.assertEqual([], self.m.nearest('c0', 3))
+        for _ in range(5):
+            for _ in range(10):
+                loc1, loc2 = random.sample(cities, 2)
+                self.m.add_distance(loc1, loc2, random.randint(1, 20),
+                                    random.randint(1, 20))
+            self.assertNearest(cities)
+
+    def test_freeze(self):
+        cities = ['c' + str(i) for i in range(10)]
+        for _ in range(20):
+            loc1, loc2 = random.sample(cities, 2)
+            self.m.add_distance(loc1, loc2, random.randint(1, 20),
+                                random.randint(1, 20))
+        frozen = self.m.freeze()
+        for loc1 in cities:
+            for loc2 in cities + ['unknown']:
+                self.assertEqual(self.m.distance(loc1, loc2),
+                                 frozen.distance(loc1, loc2))
+        self.assertRaises(TypeError, frozen.add_distance, 'c0', 'c1', 1)
+        self.assertIs(frozen, frozen.freeze())
+
+    def test_changed_since(self):
+        self.m.add_distance('a', 'b', 10)
+        version = self.m.get_version()
+        self.assertFalse(self.m.changed_since(version, ['a', 'b', 'c']))
+        self.m.add_distance('b', 'c', 5)
+        self.assertGreater(self.m.get_version(), version)
+        self.assertTrue(self.m.changed_since(version, ['a', 'c']))
+
+    def test_unchanged_cities_not_checked(self):
+        self.m.add_distance('a', 'b', 10)
+
+        class NoCities:
+            def __iter__(self):
+                raise AssertionError('cities were looked at')
+
+        self.assertFalse(self.m.changed_since(self.m.get_version(),
+                                              NoCities()))
+
+
+class TestFrozenDistanceMap(TestUtil):
+    def setUp(self) -> None:
+        self.m = DistanceMap()
+        self.m.add_distance('a', 'b', 3, 4)
+        self.m.add_distance('b', 'c', 5)
+
+    def test_pickle(self):
+        frozen = pickle.loads(pickle.dumps(self.m.freeze()))
+        self.assertEqual(4, frozen.distance('b', 'a'))
+        self.assertEqual(['a', 'c'], frozen.nearest('b', 2))
+
+    def test_shared_memory(self):
+        memory = self.m.freeze().to_shared_memory()
+        try:
+            frozen = FrozenDistanceMap.attach(memory.name)
+            self.assertEqual(5, frozen.distance('c', 'b'))
+            # pickled as the name of the block, not its contents
+            self.assertIn(memory.name.encode(), pickle.dumps(frozen))
+            frozen = pickle.loads(pickle.dumps(frozen))
+            self.assertEqual(3, frozen.distance('a', 'b'))
+            self.assertRaises(TypeError, frozen.complete)
+            del frozen
+        finally:
+            memory.close()
+            memory.unlink()
+
+    def test_concurrent_reads(self):
+        frozen = self.m.freeze()
+        results = []
+
+        def read():
+            results.append([frozen.distance('a', 'b')
+                            for _ in range(1000)] == [3] * 1000)
+
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([True] * 4, results)
+
+
+class TestMatrixDistanceMap(TestDistanceMap):
+    def setUp(self) -> None:
+        self.m = MatrixDistanceMap()
+
+    def tearDown(self) -> None:
+        self.m = MatrixDistanceMap()
+
+    def test_public_methods(self):
+        self.assertTrue(issubclass(MatrixDistanceMap, DistanceMap))
+
+    def test_same_as_dict(self):
+        m = DistanceMap()
+        cities = ['c' + str(i) for i in range(40)]
+        for _ in range(400):
+            a, b = random.choice(cities), random.choice(cities)
+            d1, d2 = random.randint(1, 100), random.choice([-1, 5])
+            m.add_distance(a, b, d1, d2)
+            self.m.add_distance(a, b, d1, d2)
+        for a in cities + ['unknown']:
+            for b in cities + ['unknown']:
+                self.assertEqual(m.distance(a, b), self.m.distance(a, b))
+
+    def assertShortestPaths(self, edges, cities):
+        exp = {(a, b): 0 if a == b else edges.get((a, b), float('inf'))
+               for a in cities for b in cities}
+        for k in cities:
+            for a in cities:
+                for b in cities:
+                    exp[a, b] = min(exp[a, b], exp[a, k] + exp[k, b])
+        for a in cities:
+            for b in cities:
+                d = -1 if exp[a, b] == float('inf') else exp[a, b]
+                self.assertEqual(d, self.m.distance(a, b))
+
+    def test_complete(self):
+        for use_numpy in [True, False]:
+            self.m = MatrixDistanceMap()
+            cities = ['c' + str(i) for i in range(12)]
+            edges = {}
+            for _ in range(20):
+                a, b = random.sample(cities, 2)
+                d1, d2 = random.randint(1, 50), random.randint(1, 50)
+                self.m.add_distance(a, b, d1, d2)
+                edges[a, b], edges[b, a] = d1, d2
+            numpy = distance_map.numpy
+            if not use_numpy:
+                distance_map.numpy = None
+            try:
+                self.m.complete()
+            finally:
+                distance_map.numpy = numpy
+            cities = self.m.cities()
+            self.assertShortestPaths(edges, cities)
+            # adding more roads completes the map again
+            a, b = random.sample(cities, 2)
+            self.m.add_distance(a, b, 1)
+            self.m.add_distance('new', a, 2)
+            edges[a, b] = edges[b, a] = 1
+            edges['new', a] = edges[a, 'new'] = 2
+            self.assertShortestPaths(edges, cities + ['new'])
+
+    def test_nearest_complete(self):
+        cities = ['c' + str(i) for i in range(12)]
+        for _ in range(15):
+            loc1, loc2 = random.sample(cities, 2)
+            self.m.add_distance(loc1, loc2, random.randint(1, 20))
+        self.assertNearest(cities)
+        self.m.complete()
+        self.assertNearest(cities)
+        self.m.add_distance('c0', 'c1', 1)
+        self.assertNearest(cities)
+
+    def test_from_distance_map(self):
+        m = DistanceMap()
+        m.add_distance('a', 'b', 10, 12)
+        m.add_distance('b', 'c', 3)
+        self.m = MatrixDistanceMap.from_distance_map(m)
+        for a in 'abc':
+            for b in 'abc':
+                self.assertEqual(m.distance(a, b), self.m.distance(a, b))
+
+    def test_binary_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            text_file = os.path.join(tmp, 'map.txt')
+            binary_file = os.path.join(tmp, 'map.bin')
+            with open(text_file, 'w') as file:
+                file.write('Toronto, Hamilton, 9\n')
+                file.write('Hamilton, Québec, 20, 25\n')
+            convert_distance_map(text_file, binary_file)
+            text_map = read_distance_map(text_file)
+            binary_map = read_distance_map(binary_file)
+            self.assertIsInstance(binary_map, MatrixDistanceMap)
+            cities = ['Toronto', 'Hamilton', 'Québec', 'Ottawa']
+            for a in cities:
+                for b in cities:
+                    self.assertEqual(text_map.distance(a, b),
+                                     binary_map.distance(a, b))
+            binary_map.add_distance('Toronto', 'Hamilton', 1)
+            binary_map.add_distance('Toronto', 'Ottawa', 2)
+            self.assertEqual(1, binary_map.distance('Hamilton', 'Toronto'))
+            self.assertEqual(2, binary_map.distance('Ottawa', 'Toronto'))
+            self.assertEqual(9, read_distance_map(binary_file).distance(
+                'Hamilton', 'Toronto'))
+            self.assertEqual(29, read_distance_map(
+                binary_file, complete=True).distance('Toronto', 'Québec'))
+            del binary_map
+
+    def test_binary_format(self):
+        self.m.add_distance('a', 'b', 258, 3)
+        data = self.m.to_bytes()
+        # the distances are stored little-endian on every host
+        self.assertEqual((258).to_bytes(4, 'little'), data[-12:-8])
+        self.assertEqual(3, MatrixDistanceMap.from_buffer(data).distance(
+            'b', 'a'))
+        for bad in [data[:-1], data + bytes(4), data[:10], b'XMAP' + data[4:]]:
+            self.assertRaises(ValueError, MatrixDistanceMap.from_buffer, bad)
+
+    def test_route_distances(self):
+        cities = ['c' + str(i) for i in range(10)]
+        for _ in range(60):
+            a, b = random.sample(cities, 2)
+            self.m.add_distance(a, b, random.randint(1, 50))
+        routes = [[random.choice(cities + ['unknown'])
+                   for _ in range(random.randint(1, 6))] for _ in range(50)]
+        exp = []
+        for route in routes:
+            closed = route + route[:1]
+            exp.append(sum(self.m.distance(closed[i], closed[i + 1])
+                           for i in range(len(route))))
+        self.assertEqual(exp, self.m.route_distances(routes))
+        numpy = distance_map.numpy
+        distance_map.numpy = None
+        try:
+            self.assertEqual(exp, self.m.route_distances(routes))
+        finally:
+            distance_map.numpy = numpy
+        self.assertEqual([], self.m.route_distances([]))
+
+    def test_index_distance(self):
+        self.m.add_distance('a', 'b', 10, 12)
+        i, j = self.m.index('a'), self.m.index('b')
+        self.assertEqual(['a', 'b'], self.m.cities())
+        self.assertEqual(10, self.m.index_distance(i, j))
+        self.assertEqual(12, self.m.index_distance(j, i))
+        self.assertEqual(-1, self.m.index('c'))
+
+
+class TestSparseDistanceMap(TestDistanceMap):
+    def setUp(self) -> None:
+        self.m = SparseDistanceMap()
+
+    def tearDown(self) -> None:
+        self.m = SparseDistanceMap()
+
+    def test_public_methods(self):
+        self.assertTrue(issubclass(SparseDistanceMap, DistanceMap))
+
+    def test_listed_and_shortest(self):
+        full = MatrixDistanceMap()
+        listed = DistanceMap()
+        self.m = SparseDistanceMap(max_trees=3)
+        cities = ['c' + str(i) for i in range(15)]
+        for _ in range(30):
+            a, b = random.sample(cities, 2)
+            d1, d2 = random.randint(1, 50), random.randint(1, 50)
+            for m in [full, listed, self.m]:
+                m.add_distance(a, b, d1, d2)
+        full.complete()
+        for _ in range(2):
+            for a in full.cities():
+                for b in full.cities():
+                    exp = listed.distance(a, b)
+                    if exp == -1:
+                        exp = full.distance(a, b)
+                    self.assertEqual(exp, self.m.distance(a, b))
+
+    def test_add_after_lookup(self):
+        self.m.add_distance('a', 'b', 10)
+        self.m.add_distance('b', 'c', 10)
+        self.assertEqual(20, self.m.distance('a', 'c'))
+        self.m.add_distance('b', 'c', 1)
+        self.assertEqual(11, self.m.distance('a', 'c'))
+        self.assertEqual(1, self.m.distance('c', 'b'))
+
+
+class TestCoordinateDistanceMap(TestDistanceMap):
+    def setUp(self) -> None:
+        self.m = CoordinateDistanceMap()
+
+    def tearDown(self) -> None:
+        self.m = CoordinateDistanceMap()
+
+    def test_public_methods(self):
+        self.assertTrue(issubclass(CoordinateDistanceMap, DistanceMap))
+
+    def test_nearest_coordinates(self):
+        cities = ['c' + str(i) for i in range(12)]
+        for city in cities[:8]:
+            self.m.add_city(city, random.uniform(-80, 80),
+                            random.uniform(-180, 180))
+        self.m.add_distance('c0', 'c9', 1)
+        self.assertNearest(cities)
+        numpy = distance_map.numpy
+        distance_map.numpy = None
+        try:
+            self.m.add_city('c10', 0, 0)
+            self.assertNearest(cities)
+        finally:
+            distance_map.numpy = numpy
+
+    def test_read_coordinates(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            coordinates_file = os.path.join(tmp, 'cities.txt')
+            with open(coordinates_file, 'w') as file:
+                file.write('Equator, 0, 0\nAntimeridian, 0, 180\n')
+                file.write('Pole, 90, 0\n')
+            self.m = read_coordinates(coordinates_file, road_factor=2)
+        self.assertEqual(40030, self.m.distance('Equator', 'Antimeridian'))
+        self.assertEqual(20015, self.m.distance('Pole', 'Equator'))
+        self.assertEqual(-1, self.m.distance('Pole', 'Nowhere'))
+
+    def test_route_distances(self):
+        m = CoordinateDistanceMap(road_factor=1.3, cache_size=5)
+        cities = ['c' + str(i) for i in range(10)]
+        for city in cities:
+            m.add_city(city, random.uniform(-80, 80), random.uniform(-180, 180))
+        m.add_distance('c0', 'c1', 1)
+        routes = [[random.choice(cities + ['unknown'])
+                   for _ in range(random.randint(1, 6))] for _ in range(50)]
+        routes.append(['c0', 'c1'])
+        exp = []
+        for route in routes:
+            closed = route + route[:1]
+            exp.append(sum(m.distance(closed[i], closed[i + 1])
+                           for i in range(len(route))))
+        self.assertEqual(exp, m.route_distances(routes))
+        numpy = distance_map.numpy
+        distance_map.numpy = None
+        try:
+            self.assertEqual(exp, m.route_distances(routes))
+        finally:
+            distance_map.numpy = numpy
+
 
 class TestTask2(TestUtil):
     def setUp(self) -> None:
@@ -134,6 +488,21 @@ class TestTruck(TestTask2):
         self.truck.pack(self.parcel_3)
         self.assertEqual(100, self.truck.fullness())
 
+    def test_load(self):
+        truck = Truck(3, 100, 'Toronto')
+        packed = []
+        for i in range(50):
+            p = Parcel(i, random.randint(1, 10), 'a', 'b')
+            if truck.pack(p):
+                packed.append(p.get_volume())
+            load = sum(packed)
+            self.assertEqual(load, truck.get_load())
+            self.assertEqual(load, truck.total_volume())
+            self.assertEqual(100 - load, truck.available_space())
+            self.assertAlmostEqual(load, truck.fullness())
+        self.assertFalse(truck.pack(Parcel(50, truck.available_space() + 1,
+                                           'a', 'b')))
+
 
 class TestFleet(TestTask2):
     def test_num_tracks(self):
@@ -315,6 +684,599 @@ class TestFleet(TestTask2):
         self.assertEqual(175, self.f.average_distance_travelled(self.m))
 
 
+class TestFleetAggregates(TestTask2):
+    def assertAggregates(self, d_map):
+        nonempty = [t for t in self.f.trucks if not t.is_empty()]
+        self.assertEqual(len(nonempty), self.f.num_nonempty_trucks())
+        self.assertEqual(sum(t.get_capacity() - t.total_volume()
+                             for t in nonempty), self.f.total_unused_space())
+        self.assertAlmostEqual(sum(t.fullness() for t in nonempty),
+                               self.f._total_fullness())
+        self.assertEqual(sum(t.route_distance(d_map) for t in nonempty),
+                         self.f.total_distance_travelled(d_map))
+
+    def test_incremental(self):
+        cities = ['Toronto', 'Kingston', 'London', 'Ajax']
+        for i in range(100):
+            if i % 10 == 0:
+                self.f.add_truck(Truck(i, random.randint(5, 20), 'Toronto'))
+            random.choice(self.f.trucks).pack(
+                Parcel(i, random.randint(1, 5), 'a', random.choice(cities)))
+            if i % 7 == 0:
+                self.m.add_distance(*random.sample(cities, 2),
+                                    random.randint(1, 100))
+            self.assertAggregates(self.m)
+
+    def test_trucks_appended_directly(self):
+        self.truck.pack(self.parcel)
+        self.f.add_truck(self.truck)
+        self.assertEqual(5, self.f.total_unused_space())
+        self.f.trucks.append(self.truck2)
+        self.truck2.pack(self.parcel_3)
+        self.assertAggregates(self.m)
+
+    def test_trucks_replaced_directly(self):
+        self.f.add_truck(self.truck)
+        self.truck.pack(self.parcel)
+        self.assertEqual(5, self.f.total_unused_space())
+        self.f.trucks = [self.truck2]
+        self.truck2.pack(self.parcel_4)
+        self.assertIsNone(self.f.get_truck(1))
+        self.assertIs(self.truck2, self.f.get_truck(2))
+        self.assertAggregates(self.m)
+        self.assertNotIn(self.f, self.truck._fleets)
+
+    def test_two_fleets(self):
+        other = Fleet()
+        self.f.add_truck(self.truck)
+        other.add_truck(self.truck)
+        self.truck.pack(self.parcel_4)
+        self.assertEqual(12, self.f.total_unused_space())
+        self.assertEqual(12, other.total_unused_space())
+
+
+class TestFleetIndexes(TestTask2):
+    def test_indexes(self):
+        cities = ['Kingston', 'London', 'Ajax']
+        for i in range(6):
+            self.f.add_truck(Truck(i, 20, random.choice(['Toronto', 'Ajax'])))
+        for i in range(60):
+            random.choice(self.f.trucks).pack(
+                Parcel(i, random.randint(1, 5), 'a', random.choice(cities)))
+            for city in cities + ['Toronto']:
+                self.assertCountEqual(
+                    [t for t in self.f.trucks if t.get_routes()[-1] == city],
+                    self.f.trucks_ending_at(city))
+        for depot in ['Toronto', 'Ajax', 'Kingston']:
+            self.assertEqual([t for t in self.f.trucks
+                              if t.get_depot() == depot],
+                             self.f.trucks_at_depot(depot))
+        for t in self.f.trucks:
+            self.assertIs(t, self.f.get_truck(t.get_id()))
+        self.assertIsNone(self.f.get_truck(99))
+
+    def test_truck_left_fleet(self):
+        self.f.add_truck(self.truck)
+        self.f.add_truck(self.truck2)
+        self.truck.pack(self.parcel_4)
+        self.f.trucks = [self.truck2]
+        self.assertEqual([], self.f.trucks_ending_at('b'))
+        self.assertNotIn(self.f, self.truck._fleets)
+        # a truck that still refers to a fleet it left is ignored by it
+        self.truck._fleets.add(self.f)
+        self.assertTrue(self.truck.pack(Parcel(5, 1, 'a', 'c')))
+        self.assertTrue(self.truck.unpack(self.parcel_4))
+        self.assertEqual([], self.f.trucks_ending_at('c'))
+        self.assertIsNone(self.f.truck_with_parcel(5))
+        self.assertEqual(0, self.f.num_nonempty_trucks())
+
+
+class TestUnpackRollback(TestFleetAggregates):
+    def state(self):
+        return [([p.get_id() for p in t.get_parcels()], t.get_routes()[:],
+                 t.get_load()) for t in self.f.trucks]
+
+    def random_changes(self, parcels, n):
+        cities = ['Kingston', 'London', 'Ajax']
+        for i in range(n):
+            truck = random.choice(self.f.trucks)
+            if truck.get_parcels() and random.random() < 0.4:
+                self.assertTrue(truck.unpack(
+                    random.choice(truck.get_parcels())))
+            else:
+                p = Parcel(len(parcels), random.randint(1, 5), 'a',
+                           random.choice(cities))
+                parcels.append(p)
+                truck.pack(p)
+
+    def test_unpack_routes(self):
+        truck = Truck(1, 100, 'Toronto')
+        parcels = []
+        for i in range(40):
+            p = Parcel(i, 1, 'a', random.choice(['K', 'L', 'A']))
+            parcels.append(p)
+            truck.pack(p)
+        random.shuffle(parcels)
+        for p in parcels:
+            self.assertTrue(truck.unpack(p))
+            self.assertFalse(truck.unpack(p))
+            routes = truck.get_routes()
+            self.assertEqual('Toronto', routes[0])
+            self.assertCountEqual({q.get_destination()
+                                   for q in truck.get_parcels()},
+                                  set(routes[1:]))
+            self.assertTrue(all(routes[i] != routes[i + 1]
+                                for i in range(len(routes) - 1)))
+        self.assertEqual(['Toronto'], truck.get_routes())
+        self.assertTrue(truck.is_empty())
+
+    def test_rollback(self):
+        for i in range(5):
+            self.f.add_truck(Truck(i, 30, 'Toronto'))
+        parcels = []
+        self.random_changes(parcels, 30)
+        self.f.checkpoint()
+        saved = self.state()
+        for _ in range(10):
+            self.assertEqual(saved, self.state())
+            self.assertAggregates(self.m)
+            self.random_changes(parcels, 20)
+            self.assertAggregates(self.m)
+            self.f.rollback()
+        self.assertEqual(saved, self.state())
+        self.random_changes(parcels, 5)
+        self.f.checkpoint()
+        saved = self.state()
+        self.random_changes(parcels, 5)
+        self.f.rollback()
+        self.assertEqual(saved, self.state())
+        self.assertAggregates(self.m)
+
+    def test_release(self):
+        for i in range(5):
+            self.f.add_truck(Truck(i, 30, 'Toronto'))
+        parcels = []
+        self.f.checkpoint()
+        self.random_changes(parcels, 20)
+        self.f.release()
+        self.assertIsNone(self.f._log)
+        self.random_changes(parcels, 20)
+        self.assertIsNone(self.f._log)
+        saved = self.state()
+        self.f.rollback()
+        self.assertEqual(saved, self.state())
+        self.f.checkpoint()
+        self.random_changes(parcels, 5)
+        self.f.rollback()
+        self.assertEqual(saved, self.state())
+        self.assertAggregates(self.m)
+
+    def assertStops(self, truck):
+        routes = truck.get_routes()
+        for city in ['Toronto', 'Kingston', 'London', 'Ajax']:
+            self.assertEqual(len([p for p in truck.get_parcels()
+                                  if p.get_destination() == city]),
+                             truck.num_parcels_to(city))
+            self.assertEqual([i for i in range(1, len(routes))
+                              if routes[i] == city],
+                             truck.stop_positions(city))
+
+    def test_stop_index(self):
+        for i in range(4):
+            self.f.add_truck(Truck(i, 30, 'Toronto'))
+        parcels = []
+        self.f.checkpoint()
+        for _ in range(10):
+            self.random_changes(parcels, 20)
+            truck = random.choice(self.f.trucks)
+            cities = list(set(truck.get_routes()[1:]))
+            random.shuffle(cities)
+            truck.reorder_route(['Toronto'] + cities)
+            for t in self.f.trucks:
+                self.assertStops(t)
+            if random.random() < 0.5:
+                self.f.rollback()
+                for t in self.f.trucks:
+                    self.assertStops(t)
+
+
+class TestDuplicateParcels(TestTask2):
+    def test_same_truck(self):
+        self.assertTrue(self.truck.pack(self.parcel_4))
+        self.assertFalse(self.truck.pack(Parcel(4, 1, 'a', 'c')))
+        self.assertEqual(3, self.truck.get_load())
+
+    def test_across_fleet(self):
+        self.f.add_truck(self.truck)
+        self.f.add_truck(self.truck2)
+        self.assertTrue(self.truck.pack(self.parcel_4))
+        self.assertFalse(self.truck2.pack(self.parcel_4))
+        self.assertIs(self.truck, self.f.truck_with_parcel(4))
+        self.f.checkpoint()
+        self.assertTrue(self.truck.unpack(self.parcel_4))
+        self.assertIsNone(self.f.truck_with_parcel(4))
+        self.assertTrue(self.truck2.pack(self.parcel_4))
+        self.assertIs(self.truck2, self.f.truck_with_parcel(4))
+        self.f.rollback()
+        self.assertIs(self.truck, self.f.truck_with_parcel(4))
+        self.assertFalse(self.truck2.pack(self.parcel_4))
+
+    def test_truck_added_after_packing(self):
+        self.truck.pack(self.parcel_4)
+        self.f.add_truck(self.truck)
+        self.f.add_truck(self.truck2)
+        self.assertFalse(self.truck2.pack(Parcel(4, 1, 'a', 'c')))
+        self.assertTrue(self.truck2.pack(Parcel(5, 1, 'a', 'c')))
+
+    def test_dropped_fleet(self):
+        self.f.add_truck(self.truck)
+        self.f.add_truck(self.truck2)
+        self.truck.pack(self.parcel_4)
+        other = Fleet()
+        other.add_truck(self.truck2)
+        self.f = None
+        gc.collect()
+        self.assertEqual([other], list(self.truck2._fleets))
+        self.assertTrue(self.truck2.pack(Parcel(4, 1, 'a', 'c')))
+
+    def test_greedy_returns_duplicates(self):
+        for priority in ['volume', 'destination']:
+            config = {'parcel_priority': priority,
+                      'parcel_order': 'non-decreasing',
+                      'truck_order': 'non-decreasing'}
+            trucks = [Truck(1, 20, 'a'), Truck(2, 20, 'a')]
+            p1, p2 = Parcel(7, 3, 'a', 'b'), Parcel(7, 4, 'a', 'c')
+            act = GreedyScheduler(config).schedule([p1, p2], trucks)
+            self.assertEqual([p2], act)
+            self.assertEqual([[p1], []], [t.get_parcels() for t in trucks])
+
+
+class TestCompactDomain(TestTask2):
+    def test_no_instance_dict(self):
+        self.assertFalse(hasattr(self.parcel, '__dict__'))
+        self.assertFalse(hasattr(self.truck, '__dict__'))
+        self.truck.pack(self.parcel_3)
+        self.assertEqual(5, self.truck.get_load())
+
+    def test_read_parcels_interned(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            parcel_file = os.path.join(tmp, 'parcels.txt')
+            with open(parcel_file, 'w') as file:
+                file.write('1, Toronto, Hamilton, 5\n')
+                file.write('2, Hamilton, Toronto, 3\n')
+            parcels = read_parcels(parcel_file)
+        self.assertIs(parcels[0].get_source(), parcels[1].get_destination())
+        self.assertIs(parcels[0].get_destination(), parcels[1].get_source())
+
+
+class TestParcelTable(TestUtil):
+    def setUp(self) -> None:
+        self.parcels, _ = random_problem(30, 0)
+        self.table = ParcelTable.from_parcels(self.parcels)
+
+    def assertSameParcels(self, exp, act):
+        self.assertEqual([(p.get_id(), p.get_volume(), p.get_source(),
+                           p.get_destination()) for p in exp],
+                         [(p.get_id(), p.get_volume(), p.get_source(),
+                           p.get_destination()) for p in act])
+
+    def test_append_while_viewed(self):
+        volumes = self.table.volumes()
+        self.assertRaises(BufferError, self.table.append, 99, 1, 'a', 'b')
+        self.assertEqual(30, len(self.table))
+        self.assertSameParcels(self.parcels, self.table)
+        volumes.release()
+        self.table.append(99, 1, 'a', 'b')
+        self.assertEqual(31, len(self.table))
+
+    def test_round_trip(self):
+        self.assertEqual(30, len(self.table))
+        self.assertSameParcels(self.parcels, self.table)
+        self.assertSameParcels(self.parcels[-1:], [self.table[-1]])
+
+    def test_slice_shares_columns(self):
+        part = self.table[5:20:3]
+        self.assertSameParcels(self.parcels[5:20:3], part)
+        self.assertIs(self.table.ids().obj, part.ids().obj)
+        self.assertSameParcels(self.parcels[5:20:3][::-1], part[::-1])
+
+    def test_sorted_by(self):
+        for use_numpy in [True, False]:
+            numpy = domain.numpy
+            domain.numpy = numpy if use_numpy else None
+            try:
+                for reverse in [True, False]:
+                    exp = sorted(self.parcels, key=Parcel.get_volume,
+                                 reverse=reverse)
+                    self.assertSameParcels(
+                        exp, self.table.sorted_by('volume', reverse))
+                    exp = sorted(self.parcels[::2],
+                                 key=Parcel.get_destination, reverse=reverse)
+                    self.assertSameParcels(
+                        exp, self.table[::2].sorted_by('destination',
+                                                       reverse))
+            finally:
+                domain.numpy = numpy
+
+    def test_take(self):
+        rows = [i for i, v in enumerate(self.table.volumes()) if v > 5]
+        self.assertSameParcels([p for p in self.parcels
+                                if p.get_volume() > 5], self.table.take(rows))
+
+    def test_read_parcel_table(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            parcel_file = os.path.join(tmp, 'parcels.txt')
+            with open(parcel_file, 'w') as file:
+                file.write('1, Toronto, Hamilton, 5\n')
+                file.write('2, Hamilton, Toronto, 3\n')
+            table = read_parcel_table(parcel_file)
+            self.assertSameParcels(read_parcels(parcel_file), table)
+        self.assertEqual(['Toronto', 'Hamilton'], table.cities())
+        self.assertEqual([1, 0], table.destination_codes().tolist())
+
+
+class TestFleetRouteDistances(TestTask2):
+    def test_route_distances(self):
+        parcels = [Parcel(i, 1, 'a', random.choice(['Kingston', 'London',
+                                                    'Ajax']))
+                   for i in range(30)]
+        trucks = [Truck(i, 5, 'Toronto') for i in range(8)]
+        for t in trucks:
+            self.f.add_truck(t)
+        for p in parcels:
+            random.choice(trucks).pack(p)
+        matrix_map = MatrixDistanceMap.from_distance_map(self.m)
+        exp = [0 if t.is_empty() else t.route_distance(self.m)
+               for t in trucks]
+        self.assertEqual((exp, sum(exp)), self.f.route_distances(self.m))
+        self.assertEqual((exp, sum(exp)), self.f.route_distances(matrix_map))
+        self.assertEqual(sum(exp), self.f.total_distance_travelled(matrix_map))
+
+    def test_only_changed_routes_recomputed(self):
+        looked_up = []
+
+        class CountingMap(DistanceMap):
+            def distance(self, loc1, loc2):
+                looked_up.append((loc1, loc2))
+                return DistanceMap.distance(self, loc1, loc2)
+
+        m = CountingMap()
+        m.add_distance('Toronto', 'Kingston', 100)
+        m.add_distance('Toronto', 'Ajax', 50, 100)
+        m.add_distance('Ajax', 'Oshawa', 7)
+        m.add_distance('Oshawa', 'Toronto', 30)
+        trucks = [Truck(i, 5, 'Toronto') for i in range(3)]
+        for t in trucks:
+            self.f.add_truck(t)
+        trucks[0].pack(Parcel(1, 1, 'a', 'Kingston'))
+        trucks[1].pack(Parcel(2, 1, 'a', 'Ajax'))
+        trucks[1].pack(Parcel(3, 1, 'a', 'Oshawa'))
+        self.assertEqual(([200, 87, 0], 287), self.f.route_distances(m))
+        looked_up.clear()
+        self.assertEqual(([200, 87, 0], 287), self.f.route_distances(m))
+        self.assertEqual([], looked_up)
+        m.add_distance('Ajax', 'Oshawa', 9)
+        self.assertEqual(([200, 89, 0], 289), self.f.route_distances(m))
+        self.assertEqual([('Toronto', 'Ajax'), ('Ajax', 'Oshawa'),
+                          ('Oshawa', 'Toronto')], looked_up)
+        trucks[0].pack(Parcel(4, 1, 'a', 'Ajax'))
+        self.assertEqual(([199, 89, 0], 288), self.f.route_distances(m))
+
+    def test_matrix_map_changes(self):
+        m = MatrixDistanceMap.from_distance_map(self.m)
+        trucks = [Truck(i, 5, 'Toronto') for i in range(2)]
+        for t in trucks:
+            self.f.add_truck(t)
+        trucks[0].pack(Parcel(1, 1, 'a', 'Kingston'))
+        trucks[0].pack(Parcel(2, 1, 'a', 'London'))
+        trucks[1].pack(Parcel(3, 1, 'a', 'Ajax'))
+        self.assertEqual(([175, 150], 325), self.f.route_distances(m))
+        m.add_distance('Kingston', 'London', 40)
+        self.assertEqual(([165, 150], 315), self.f.route_distances(m))
+        m.complete()
+        m.add_distance('Toronto', 'London', 5)
+        self.assertEqual(([90, 150], 240), self.f.route_distances(m))
+        self.assertEqual(90, trucks[0].route_distance(m))
+
+
+class TestRouteOptimizer(TestUtil):
+    def setUp(self) -> None:
+        self.cities = ['c' + str(i) for i in range(8)]
+        self.m = MatrixDistanceMap()
+        for a in ['depot'] + self.cities:
+            for b in ['depot'] + self.cities:
+                if a != b:
+                    self.m.add_distance(a, b, random.randint(1, 100),
+                                        random.randint(1, 100))
+
+    def random_trucks(self, num_trucks, num_parcels):
+        trucks = [Truck(i, num_parcels, 'depot') for i in range(num_trucks)]
+        for i in range(num_parcels):
+            random.choice(trucks).pack(Parcel(i, 1, 'a',
+                                              random.choice(self.cities)))
+        return trucks
+
+    def tour_distance(self, tour):
+        return sum(self.m.distance(tour[i], tour[i + 1])
+                   for i in range(len(tour) - 1) if tour[i] != tour[i + 1])
+
+    def test_routes_get_shorter(self):
+        for _ in range(20):
+            trucks = self.random_trucks(4, 20)
+            before = [t.route_distance(self.m) for t in trucks]
+            parcels = [t.get_parcels() for t in trucks]
+            saved = RouteOptimizer(self.m).optimize(trucks)
+            after = [t.route_distance(self.m) for t in trucks]
+            self.assertEqual(sum(before) - sum(after), saved)
+            for t, b, a, ps in zip(trucks, before, after, parcels):
+                self.assertLessEqual(a, b)
+                self.assertEqual(ps, t.get_parcels())
+                routes = t.get_routes()
+                self.assertEqual('depot', routes[0])
+                self.assertEqual({p.get_destination() for p in ps},
+                                 set(routes[1:]))
+
+    def test_incomplete_map_never_longer(self):
+        for _ in range(100):
+            m = DistanceMap()
+            for a in ['depot'] + self.cities:
+                for b in ['depot'] + self.cities:
+                    if a < b and random.random() < 0.9:
+                        m.add_distance(a, b, random.randint(1, 40))
+            trucks = self.random_trucks(3, 12)
+            before = [t.route_distance(m) for t in trucks]
+            saved = RouteOptimizer(m).optimize(trucks)
+            after = [t.route_distance(m) for t in trucks]
+            self.assertGreaterEqual(saved, 0)
+            self.assertEqual(sum(before) - sum(after), saved)
+            for b, a in zip(before, after):
+                self.assertLessEqual(a, b)
+
+    def test_no_move_left(self):
+        for _ in range(20):
+            t = self.random_trucks(1, 8)[0]
+            RouteOptimizer(self.m).optimize([t])
+            tour = t.get_routes() + ['depot']
+            best = self.tour_distance(tour)
+            for i in range(1, len(tour) - 1):
+                for j in range(i + 1, len(tour) - 1):
+                    reversed_ = tour[:i] + tour[j:i - 1:-1] + tour[j + 1:]
+                    self.assertGreaterEqual(self.tour_distance(reversed_),
+                                            best)
+                rest = tour[:i] + tour[i + 1:]
+                for k in range(1, len(rest)):
+                    moved = rest[:k] + [tour[i]] + rest[k:]
+                    self.assertGreaterEqual(self.tour_distance(moved), best)
+
+    def test_missing_distances_avoided(self):
+        m = DistanceMap()
+        m.add_distance('depot', 'a', 1, 50)
+        m.add_distance('a', 'b', 1, 50)
+        m.add_distance('b', 'c', 1, 50)
+        m.add_distance('c', 'depot', 1, 50)
+        t = Truck(1, 10, 'depot')
+        for i, city in enumerate(['c', 'a', 'b']):
+            t.pack(Parcel(i, 1, 'x', city))
+        RouteOptimizer(m).optimize([t])
+        self.assertEqual(['depot', 'a', 'b', 'c'], t.get_routes())
+        self.assertEqual(4, t.route_distance(m))
+
+    def test_budget(self):
+        trucks = self.random_trucks(3, 20)
+        routes = [t.get_routes() for t in trucks]
+        self.assertEqual(0, RouteOptimizer(self.m, max_moves=0).optimize(
+            trucks))
+        self.assertEqual(0, RouteOptimizer(self.m, time_limit=0).optimize(
+            trucks))
+        self.assertEqual(routes, [t.get_routes() for t in trucks])
+        optimizer = RouteOptimizer(self.m, max_moves=1)
+        optimizer.optimize(trucks)
+        changed = [t for t, r in zip(trucks, routes) if t.get_routes() != r]
+        self.assertLessEqual(len(changed), 1)
+
+    def test_reorder_route(self):
+        f = Fleet()
+        t = Truck(1, 10, 'depot')
+        f.add_truck(t)
+        t.pack(Parcel(1, 1, 'x', 'a'))
+        t.pack(Parcel(2, 1, 'x', 'b'))
+        for routes in [['a', 'depot', 'b'], ['depot', 'a'],
+                       ['depot', 'a', 'b', 'c'], ['depot', 'a', 'a', 'b']]:
+            self.assertRaises(ValueError, t.reorder_route, routes)
+        f.checkpoint()
+        t.reorder_route(['depot', 'b', 'a'])
+        self.assertEqual([t], f.trucks_ending_at('a'))
+        f.rollback()
+        self.assertEqual(['depot', 'a', 'b'], t.get_routes())
+        self.assertEqual([t], f.trucks_ending_at('b'))
+        self.assertEqual([], f.trucks_ending_at('a'))
+
+
+class TestFleetOptimizer(TestUtil):
+    def setUp(self) -> None:
+        self.cities = ['c' + str(i) for i in range(10)]
+        self.m = MatrixDistanceMap()
+        for a in ['depot'] + self.cities:
+            for b in ['depot'] + self.cities:
+                if a != b:
+                    self.m.add_distance(a, b, random.randint(1, 100),
+                                        random.randint(1, 100))
+
+    def scheduled_fleet(self, num_parcels, num_trucks):
+        parcels = [Parcel(i, random.randint(1, 10), 'depot',
+                          random.choice(self.cities))
+                   for i in range(num_parcels)]
+        f = Fleet()
+        for i in range(num_trucks):
+            f.add_truck(Truck(i, random.randint(10, 40), 'depot'))
+        GreedyScheduler({'parcel_priority': 'volume',
+                         'parcel_order': 'non-increasing',
+                         'truck_order': 'non-increasing'}).schedule(parcels,
+                                                                    f.trucks)
+        return f
+
+    def test_distance_gets_shorter(self):
+        for _ in range(20):
+            f = self.scheduled_fleet(60, 8)
+            parcels = sorted(p for ps in f.parcel_allocations().values()
+                             for p in ps)
+            before = f.total_distance_travelled(self.m)
+            saved = FleetOptimizer(self.m).optimize(f)
+            after = f.total_distance_travelled(self.m)
+            self.assertEqual(before - after, saved)
+            self.assertGreaterEqual(saved, 0)
+            self.assertEqual(parcels, sorted(
+                p for ps in f.parcel_allocations().values() for p in ps))
+            for t in f.trucks:
+                self.assertGreaterEqual(t.available_space(), 0)
+                self.assertEqual(
+                    {p.get_destination() for p in t.get_parcels()},
+                    set(t.get_routes()[1:]))
+
+    def test_every_move_saves(self):
+        for _ in range(10):
+            f = self.scheduled_fleet(40, 6)
+            optimizer = FleetOptimizer(self.m, max_moves=1)
+            while True:
+                allocations = f.parcel_allocations()
+                saved = optimizer.optimize(f)
+                if f.parcel_allocations() == allocations:
+                    self.assertEqual(0, saved)
+                    break
+                self.assertGreater(saved, 0)
+
+    def test_trucks_emptied(self):
+        for _ in range(20):
+            f = self.scheduled_fleet(30, 10)
+            used = f.num_nonempty_trucks()
+            FleetOptimizer(self.m, truck_cost=1000).optimize(f)
+            self.assertLessEqual(f.num_nonempty_trucks(), used)
+
+    def test_exchange(self):
+        m = DistanceMap()
+        m.add_distance('depot', 'a', 10)
+        m.add_distance('depot', 'b', 10)
+        m.add_distance('a', 'b', 100)
+        f = Fleet()
+        t1, t2 = Truck(1, 5, 'depot'), Truck(2, 5, 'depot')
+        f.add_truck(t1)
+        f.add_truck(t2)
+        p1, p2 = Parcel(1, 3, 'x', 'a'), Parcel(2, 2, 'x', 'b')
+        p3, p4 = Parcel(3, 3, 'x', 'b'), Parcel(4, 2, 'x', 'a')
+        for t, p in [(t1, p1), (t1, p2), (t2, p3), (t2, p4)]:
+            t.pack(p)
+        self.assertEqual(200, FleetOptimizer(m).optimize(f))
+        self.assertEqual(40, f.total_distance_travelled(m))
+        self.assertEqual(5, t1.total_volume())
+
+    def test_budget(self):
+        f = self.scheduled_fleet(60, 8)
+        allocations = f.parcel_allocations()
+        self.assertEqual(0, FleetOptimizer(self.m, max_moves=0).optimize(f))
+        self.assertEqual(0, FleetOptimizer(self.m, time_limit=0).optimize(f))
+        self.assertEqual(allocations, f.parcel_allocations())
+
+
 class TestPriorityQueue(TestUtil):
     def setUp(self) -> None:
         self.num_gt = lambda x, y: x > y
@@ -332,7 +1294,8 @@ class TestPriorityQueue(TestUtil):
         self.assertPublicAttrs(PriorityQueue(lambda x, y: True), [])
 
     def test_no_public_methods(self):
-        self.assertPublicMethods(PriorityQueue, ['add', 'remove', 'is_empty'])
+        self.assertPublicMethods(PriorityQueue, ['add', 'remove', 'is_empty',
+                                                 'add_many', 'from_iterable'])
 
     def test_add_empty(self):
         pq = PriorityQueue(self.num_gt)
@@ -404,6 +1367,346 @@ class TestPriorityQueue(TestUtil):
             self.assertEqual(exp, act, self.error_msg(seq, exp, act))
 
 
+class TestHeapPriorityQueue(TestUtil):
+    def setUp(self) -> None:
+        self.num_gt = lambda x, y: x > y
+        self.list_len = lambda x, y: len(x) > len(y)
+
+        def remove_pq(pq):
+            acc = []
+            while not pq.is_empty():
+                acc.append(pq.remove())
+            return acc
+        self.remove_pq = remove_pq
+
+    def test_no_public_attrs(self):
+        self.assertPublicAttrs(HeapPriorityQueue(lambda x, y: True), [])
+
+    def test_is_priority_queue(self):
+        self.assertIsInstance(HeapPriorityQueue(self.num_gt), PriorityQueue)
+
+    def test_add_with_tie(self):
+        pq = HeapPriorityQueue(self.list_len)
+        seq = [[1], [1, 2], [2], [2, 3]]
+        for i in seq:
+            pq.add(i)
+        self.assertEqual([[1, 2], [2, 3], [1], [2]], self.remove_pq(pq))
+
+    def test_same_order_as_sorted_list(self):
+        for _ in range(100):
+            seq = [[0] * random.randint(0, 5) + [i] for i in range(30)]
+            random.shuffle(seq)
+            heap_pq = HeapPriorityQueue(self.list_len)
+            list_pq = PriorityQueue(self.list_len)
+            for i in seq:
+                heap_pq.add(i)
+                list_pq.add(i)
+            self.assertEqual(self.remove_pq(list_pq), self.remove_pq(heap_pq))
+
+    def test_from_iterable_same_as_add(self):
+        for cls in [PriorityQueue, HeapPriorityQueue]:
+            seq = [[0] * random.randint(0, 5) + [i] for i in range(50)]
+            pq = PriorityQueue(self.list_len)
+            for i in seq:
+                pq.add(i)
+            bulk_pq = cls.from_iterable(seq, self.list_len)
+            self.assertEqual(self.remove_pq(pq), self.remove_pq(bulk_pq))
+
+    def test_add_many_after_add(self):
+        for cls in [PriorityQueue, HeapPriorityQueue]:
+            seq = [[0] * random.randint(0, 5) + [i] for i in range(50)]
+            pq = PriorityQueue(self.list_len)
+            bulk_pq = cls(self.list_len)
+            for i in seq[:20]:
+                pq.add(i)
+                bulk_pq.add(i)
+            for i in seq[20:]:
+                pq.add(i)
+            bulk_pq.add_many(seq[20:])
+            self.assertEqual(self.remove_pq(pq), self.remove_pq(bulk_pq))
+
+    def test_interleaved_add_remove(self):
+        heap_pq = HeapPriorityQueue(self.num_gt)
+        list_pq = PriorityQueue(self.num_gt)
+        for _ in range(500):
+            if random.random() < 0.6 or heap_pq.is_empty():
+                i = random.randint(0, 10)
+                heap_pq.add(i)
+                list_pq.add(i)
+            else:
+                self.assertEqual(list_pq.remove(), heap_pq.remove())
+        self.assertEqual(self.remove_pq(list_pq), self.remove_pq(heap_pq))
+
+
+class TestKeyedPriorityQueue(TestHeapPriorityQueue):
+    def test_no_public_attrs(self):
+        self.assertPublicAttrs(KeyedPriorityQueue(len), [])
+
+    def test_is_priority_queue(self):
+        self.assertIsInstance(KeyedPriorityQueue(len), Container)
+
+    def test_add_with_tie(self):
+        pq = KeyedPriorityQueue(len, reverse=True)
+        seq = [[1], [1, 2], [2], [2, 3]]
+        for i in seq:
+            pq.add(i)
+        self.assertEqual([[1, 2], [2, 3], [1], [2]], self.remove_pq(pq))
+
+    def test_key_computed_once(self):
+        calls = []
+
+        def key(x):
+            calls.append(x)
+            return x
+
+        pq = KeyedPriorityQueue(key)
+        for i in [5, 3, 8, 1, 9, 2]:
+            pq.add(i)
+        self.assertEqual([1, 2, 3, 5, 8, 9], self.remove_pq(pq))
+        self.assertEqual(6, len(calls))
+
+    def test_reverse_string_keys(self):
+        pq = KeyedPriorityQueue(lambda x: x[0], reverse=True)
+        seq = [('a', 1), ('c', 2), ('b', 3), ('c', 4), ('a', 5)]
+        for i in seq:
+            pq.add(i)
+        self.assertEqual([('c', 2), ('c', 4), ('b', 3), ('a', 1), ('a', 5)],
+                         self.remove_pq(pq))
+
+    def test_same_order_as_sorted_list(self):
+        for reverse in [False, True]:
+            seq = [[0] * random.randint(0, 5) + [i] for i in range(30)]
+            random.shuffle(seq)
+            keyed_pq = KeyedPriorityQueue(len, reverse)
+            if reverse:
+                list_pq = PriorityQueue(self.list_len)
+            else:
+                list_pq = PriorityQueue(lambda x, y: len(x) < len(y))
+            for i in seq:
+                keyed_pq.add(i)
+                list_pq.add(i)
+            self.assertEqual(self.remove_pq(list_pq),
+                             self.remove_pq(keyed_pq))
+
+    def test_from_iterable_same_as_add(self):
+        for cls in [KeyedPriorityQueue, IndexedPriorityQueue]:
+            for reverse in [False, True]:
+                seq = [[0] * random.randint(0, 5) + [i] for i in range(50)]
+                pq = KeyedPriorityQueue(len, reverse)
+                for i in seq:
+                    pq.add(i)
+                bulk_pq = cls.from_iterable(seq, len, reverse)
+                self.assertEqual(self.remove_pq(pq), self.remove_pq(bulk_pq))
+
+    def test_add_many_after_add(self):
+        for cls in [KeyedPriorityQueue, IndexedPriorityQueue]:
+            seq = [[0] * random.randint(0, 5) + [i] for i in range(50)]
+            pq = KeyedPriorityQueue(len)
+            bulk_pq = cls(len)
+            for i in seq[:20]:
+                pq.add(i)
+                bulk_pq.add(i)
+            for i in seq[20:]:
+                pq.add(i)
+            bulk_pq.add_many(seq[20:])
+            self.assertEqual(self.remove_pq(pq), self.remove_pq(bulk_pq))
+
+    def test_interleaved_add_remove(self):
+        keyed_pq = KeyedPriorityQueue(lambda x: x, reverse=True)
+        list_pq = PriorityQueue(self.num_gt)
+        for _ in range(500):
+            if random.random() < 0.6 or keyed_pq.is_empty():
+                i = random.randint(0, 10)
+                keyed_pq.add(i)
+                list_pq.add(i)
+            else:
+                self.assertEqual(list_pq.remove(), keyed_pq.remove())
+        self.assertEqual(self.remove_pq(list_pq), self.remove_pq(keyed_pq))
+
+
+class TestIndexedPriorityQueue(TestKeyedPriorityQueue):
+    def test_no_public_attrs(self):
+        self.assertPublicAttrs(IndexedPriorityQueue(len), [])
+
+    def test_is_priority_queue(self):
+        self.assertIsInstance(IndexedPriorityQueue(len), KeyedPriorityQueue)
+
+    def test_remove_item(self):
+        pq = IndexedPriorityQueue(len)
+        seq = [[1], [1, 2], [2], [2, 3], [3]]
+        for i in seq:
+            pq.add(i)
+        self.assertIs(seq[2], pq.remove(seq[2]))
+        self.assertNotIn(seq[2], pq)
+        self.assertEqual(4, len(pq))
+        self.assertEqual([[1], [3], [1, 2], [2, 3]], self.remove_pq(pq))
+
+    def test_update_keeps_fifo_order(self):
+        pq = IndexedPriorityQueue(len)
+        seq = [[1, 1], [2], [3, 3]]
+        for i in seq:
+            pq.add(i)
+        seq[0].pop()
+        seq[2].pop()
+        pq.update(seq[0])
+        pq.update(seq[2])
+        self.assertEqual([[1], [2], [3]], self.remove_pq(pq))
+
+    def test_first_at_least(self):
+        for reverse in [False, True]:
+            pq = IndexedPriorityQueue(lambda x: x[0], reverse)
+            seq = [(random.randint(0, 20), i) for i in range(50)]
+            for i in seq:
+                pq.add(i)
+            for bound in range(-1, 23):
+                fits = sorted((x for x in seq if x[0] >= bound),
+                              key=lambda x: -x[0] if reverse else x[0])
+                exp = fits[0] if fits else None
+                self.assertEqual(exp, pq.first_at_least(bound))
+
+    def test_random_updates(self):
+        items = [[random.randint(0, 9)] for _ in range(40)]
+        pq = IndexedPriorityQueue(lambda x: x[0], reverse=True)
+        for i in items:
+            pq.add(i)
+        for _ in range(200):
+            i = random.choice(items)
+            i[0] = random.randint(0, 9)
+            pq.update(i)
+        order = {id(x): n for n, x in enumerate(items)}
+        exp = sorted(items, key=lambda x: (-x[0], order[id(x)]))
+        act = self.remove_pq(pq)
+        self.assertEqual([id(x) for x in exp], [id(x) for x in act])
+
+
+class TestBucketPriorityQueue(TestHeapPriorityQueue):
+    def test_no_public_attrs(self):
+        self.assertPublicAttrs(BucketPriorityQueue(len), [])
+
+    def test_is_priority_queue(self):
+        self.assertIsInstance(BucketPriorityQueue(len), Container)
+
+    def test_add_with_tie(self):
+        pq = BucketPriorityQueue(len, reverse=True)
+        seq = [[1], [1, 2], [2], [2, 3]]
+        pq.add_many(seq)
+        self.assertEqual([[1, 2], [2, 3], [1], [2]], self.remove_pq(pq))
+
+    def test_same_order_as_keyed(self):
+        for reverse in [False, True]:
+            seq = [[0] * random.randint(0, 5) + [i] for i in range(200)]
+            keyed_pq = KeyedPriorityQueue.from_iterable(seq, len, reverse)
+            bucket_pq = BucketPriorityQueue.from_iterable(seq, len, reverse)
+            self.assertEqual(self.remove_pq(keyed_pq),
+                             self.remove_pq(bucket_pq))
+
+    def test_rank(self):
+        seq = [[3, 'c'], [1, 'b'], [3, 'a'], [1, 'a']]
+        pq = BucketPriorityQueue.from_iterable(seq, lambda x: x[0],
+                                               rank=lambda x: x[1])
+        self.assertEqual([[1, 'a'], [1, 'b'], [3, 'a'], [3, 'c']],
+                         self.remove_pq(pq))
+
+    def test_random_updates_and_removes(self):
+        for reverse in [False, True]:
+            items = [[random.randint(0, 9)] for _ in range(60)]
+            bucket_pq = BucketPriorityQueue.from_iterable(
+                items, lambda x: x[0], reverse)
+            indexed_pq = IndexedPriorityQueue.from_iterable(
+                items, lambda x: x[0], reverse)
+            live = items[:]
+            for _ in range(300):
+                i = live.pop(random.randrange(len(live)))
+                if random.random() < 0.1:
+                    bucket_pq.remove(i)
+                    indexed_pq.remove(i)
+                    continue
+                live.append(i)
+                i[0] = random.randint(0, 9)
+                bucket_pq.update(i)
+                indexed_pq.update(i)
+                bound = random.randint(0, 10)
+                self.assertIs(indexed_pq.first_at_least(bound),
+                              bucket_pq.first_at_least(bound))
+            self.assertEqual(len(indexed_pq), len(bucket_pq))
+            exp = [id(x) for x in self.remove_pq(indexed_pq)]
+            self.assertEqual(exp, [id(x) for x in self.remove_pq(bucket_pq)])
+
+    def test_same_item_twice(self):
+        a, b = [1, 2], [3]
+        pq = BucketPriorityQueue.from_iterable([a, b, a], len)
+        self.assertEqual(3, len(pq))
+        self.assertEqual([b, a, a], self.remove_pq(pq))
+        self.assertTrue(pq.is_empty())
+        pq.add_many([a, b, a])
+        a.clear()
+        pq.update(a)
+        pq.remove(b)
+        self.assertEqual([a, a], self.remove_pq(pq))
+
+    def test_greedy_with_same_parcel_twice(self):
+        p = Parcel(1, 3, 'a', 'b')
+        trucks = [Truck(1, 10, 'a')]
+        config = {'parcel_priority': 'volume',
+                  'parcel_order': 'non-decreasing',
+                  'truck_order': 'non-decreasing'}
+        self.assertEqual([p], GreedyScheduler(config).schedule([p, p],
+                                                               trucks))
+        self.assertEqual([p], trucks[0].get_parcels())
+
+
+class TestConcurrentPriorityQueue(TestUtil):
+    def test_no_public_attrs(self):
+        self.assertPublicAttrs(ConcurrentPriorityQueue(lambda x, y: True), [])
+
+    def test_add_with_tie(self):
+        pq = ConcurrentPriorityQueue(lambda x, y: len(x) > len(y))
+        pq.add_many([[1], [1, 2], [2], [2, 3]])
+        act = [pq.remove() for _ in range(4)]
+        self.assertEqual([[1, 2], [2, 3], [1], [2]], act)
+        self.assertTrue(pq.is_empty())
+
+    def test_remove_timeout(self):
+        pq = ConcurrentPriorityQueue(lambda x, y: x < y)
+        with self.assertRaises(queue.Empty):
+            pq.remove(timeout=0.01)
+
+    def test_producers_and_consumer(self):
+        pq = ConcurrentPriorityQueue(lambda x, y: x < y)
+        producers = [threading.Thread(
+            target=lambda n=n: [pq.add(n * 1000 + i) for i in range(500)])
+            for n in range(4)]
+        act = []
+        consumer = threading.Thread(
+            target=lambda: [act.append(pq.remove(timeout=5))
+                            for _ in range(2000)])
+        consumer.start()
+        for t in producers:
+            t.start()
+        for t in producers:
+            t.join()
+        consumer.join()
+        self.assertCountEqual([n * 1000 + i for n in range(4)
+                               for i in range(500)], act)
+        self.assertTrue(pq.is_empty())
+
+
+class TestAsyncPriorityQueue(TestUtil):
+    def test_get_waits_for_put(self):
+        async def run():
+            pq = AsyncPriorityQueue(lambda x, y: len(x) > len(y))
+            getter = asyncio.ensure_future(pq.get())
+            await asyncio.sleep(0)
+            self.assertFalse(getter.done())
+            for i in [[1], [1, 2], [2], [2, 3]]:
+                await pq.put(i)
+            first = await getter
+            rest = [await pq.get() for _ in range(3)]
+            return [first] + rest
+
+        self.assertEqual([[1, 2], [2, 3], [1], [2]], asyncio.run(run()))
+
+
 class TestRandomScheduler(TestUtil):
     def setUp(self) -> None:
         self.scheduler = RandomScheduler()
@@ -991,6 +2294,127 @@ class TestGreedyScheduler(TestUtil):
         self.assertTruck(trucks, [100, 0, (6 / 7) * 100])
 
 
+def reference_greedy(config, parcels, trucks):
+    """Schedule <parcels> onto <trucks> the way GreedyScheduler is specified
+    to, by sorting everything again for each parcel."""
+    reverse = config['parcel_order'] == 'non-increasing'
+    if config['parcel_priority'] == 'volume':
+        key = Parcel.get_volume
+    else:
+        key = Parcel.get_destination
+    order = sorted(parcels, key=key, reverse=reverse)
+    sign = -1 if config['truck_order'] == 'non-increasing' else 1
+    unscheduled = []
+    for p in order:
+        fits = [t for t in trucks
+                if t.get_capacity() - t.total_volume() >= p.get_volume()]
+        fits.sort(key=lambda t: sign * (t.get_capacity() - t.total_volume()))
+        same = [t for t in fits if t.get_routes()[-1] == p.get_destination()]
+        if same:
+            same[0].pack(p)
+        elif fits:
+            fits[0].pack(p)
+        else:
+            unscheduled.append(p)
+    return unscheduled
+
+
+def random_problem(num_parcels, num_trucks, cities=5):
+    parcels = [Parcel(i, random.randint(1, 10), 'a',
+                      'c' + str(random.randint(1, cities)))
+               for i in range(num_parcels)]
+    trucks = [Truck(i, random.randint(5, 30), 'depot')
+              for i in range(num_trucks)]
+    return parcels, trucks
+
+
+class TestGreedySchedulerReference(TestUtil):
+    def test_same_as_reference(self):
+        for _ in range(30):
+            for priority in ['volume', 'destination']:
+                for p_order in ['non-decreasing', 'non-increasing']:
+                    for t_order in ['non-decreasing', 'non-increasing']:
+                        config = {'parcel_priority': priority,
+                                  'parcel_order': p_order,
+                                  'truck_order': t_order}
+                        parcels, trucks = random_problem(40, 6)
+                        fleet, exp_fleet = Fleet(), Fleet()
+                        for t in trucks:
+                            fleet.add_truck(t)
+                            exp_fleet.add_truck(Truck(t.get_id(),
+                                                      t.get_capacity(),
+                                                      t.get_depot()))
+                        act = GreedyScheduler(config).schedule(parcels,
+                                                               trucks)
+                        exp = reference_greedy(config, parcels,
+                                               exp_fleet.trucks)
+                        self.assertEqual(exp, act)
+                        self.assertEqual(exp_fleet.parcel_allocations(),
+                                         fleet.parcel_allocations())
+
+    def test_parcel_table(self):
+        numpy = domain.numpy
+        for use_numpy in [True, False]:
+            domain.numpy = numpy if use_numpy else None
+            try:
+                for priority in ['volume', 'destination']:
+                    for p_order in ['non-decreasing', 'non-increasing']:
+                        config = {'parcel_priority': priority,
+                                  'parcel_order': p_order,
+                                  'truck_order': 'non-decreasing'}
+                        parcels, trucks = random_problem(60, 6)
+                        exp_fleet, fleet = Fleet(), Fleet()
+                        for t in trucks:
+                            exp_fleet.add_truck(t)
+                            fleet.add_truck(Truck(t.get_id(),
+                                                  t.get_capacity(),
+                                                  t.get_depot()))
+                        exp = GreedyScheduler(config).schedule(parcels,
+                                                               trucks)
+                        act = GreedyScheduler(config).schedule(
+                            ParcelTable.from_parcels(parcels), fleet.trucks)
+                        self.assertEqual([p.get_id() for p in exp],
+                                         [p.get_id() for p in act])
+                        self.assertEqual(exp_fleet.parcel_allocations(),
+                                         fleet.parcel_allocations())
+            finally:
+                domain.numpy = numpy
+
+
+class TestOnlineScheduler(TestUtil):
+    def test_same_as_reference(self):
+        for _ in range(30):
+            for priority, key in [('volume', Parcel.get_volume),
+                                  ('destination', Parcel.get_destination)]:
+                for t_order in ['non-decreasing', 'non-increasing']:
+                    config = {'parcel_priority': priority,
+                              'parcel_order': 'non-increasing',
+                              'truck_order': t_order}
+                    parcels, trucks = random_problem(40, 6)
+                    exp_trucks = [Truck(t.get_id(), t.get_capacity(),
+                                        t.get_depot()) for t in trucks]
+                    exp = reference_greedy(config, parcels, exp_trucks)
+                    online = OnlineScheduler(trucks, config)
+                    for p in sorted(parcels, key=key, reverse=True):
+                        truck = online.offer(p)
+                        if truck is not None:
+                            self.assertIs(p, truck.get_parcels()[-1])
+                    self.assertEqual(exp, online.flush())
+                    self.assertEqual([t.get_parcels() for t in exp_trucks],
+                                     [t.get_parcels() for t in trucks])
+
+    def test_flush(self):
+        t = Truck(1, 10, 'Toronto')
+        online = OnlineScheduler([t], {'truck_order': 'non-increasing'})
+        p1, p2 = Parcel(1, 8, 'a', 'b'), Parcel(2, 5, 'a', 'b')
+        self.assertIs(t, online.offer(p1))
+        self.assertIsNone(online.offer(p2))
+        self.assertIsNone(online.offer(Parcel(1, 1, 'a', 'c')))
+        self.assertEqual([2, 1], [p.get_id() for p in online.flush()])
+        self.assertEqual([], online.flush())
+        self.assertEqual([p1], t.get_parcels())
+
+
 class TestExperiment(TestUtil):
     def setUp(self) -> None:
 
@@ -17,10 +17,25 @@ Sophia Huynh, Maryam Majedi, and Jaisie Sin.
 
 ===== Module Description =====
 
-This module contains the Container and PriorityQueue classes.
+This module contains the Container and PriorityQueue classes, as well as
+HeapPriorityQueue, a faster PriorityQueue backed by a binary heap,
+KeyedPriorityQueue, which orders items by a key function,
+IndexedPriorityQueue, whose items can be updated after they are added, and
+BucketPriorityQueue, which groups items with the same integer key.
+
+ConcurrentPriorityQueue and AsyncPriorityQueue can be shared between
+threads and between asyncio tasks, respectively.
 """
 
-from typing import Any, List, Callable
+from typing import Any, List, Callable, Tuple, Dict, Iterable, Iterator, \
+    Optional
+from functools import cmp_to_key
+import asyncio
+import bisect
+import heapq
+import itertools
+import queue
+import threading
 
 
 class Container:
@@ -44,6 +59,12 @@ class Container:
         """
         raise NotImplementedError
 
+    def add_many(self, items: Iterable[Any]) -> None:
+        """Add every item in <items> to this Container, in order.
+        """
+        for item in items:
+            self.add(item)
+
 
 # Used in the doctest examples for PriorityQueue
 def _shorter(a: str, b: str) -> bool:
@@ -178,12 +199,1033 @@ class PriorityQueue(Container):
         """
         return not self._queue
 
+    @classmethod
+    def from_iterable(cls, items: Iterable[Any],
+                      higher_priority: Callable[[Any, Any], bool]
+                      ) -> 'PriorityQueue':
+        """Return a new queue of this class that contains <items> and uses
+        <higher_priority>.  Items are removed in the same order as if they
+        had been added one at a time, in order.
+
+        >>> pq = PriorityQueue.from_iterable(['fred', 'arju', 'hat'], _shorter)
+        >>> pq._queue
+        ['arju', 'fred', 'hat']
+        """
+        pq = cls(higher_priority)
+        pq.add_many(items)
+        return pq
+
+    def add_many(self, items: Iterable[Any]) -> None:
+        """Add every item in <items> to this PriorityQueue, in order.
+
+        This sorts all of the items once, in O(n log n) time, instead of
+        inserting them one at a time.
+
+        >>> pq = PriorityQueue(_shorter)
+        >>> pq.add('fred')
+        >>> pq.add_many(['arju', 'monalisa', 'hat'])
+        >>> pq._queue
+        ['monalisa', 'arju', 'fred', 'hat']
+        """
+        # The sort is stable, so items with the same priority stay in the
+        # order they were added, after the items already in the queue.
+        in_order = self._queue[::-1]
+        in_order.extend(items)
+        in_order.sort(key=cmp_to_key(self._compare))
+        in_order.reverse()
+        self._queue = in_order
+
+    def _compare(self, x: Any, y: Any) -> int:
+        """Return a negative number if <x> has higher priority than <y>,
+        a positive number if <y> has higher priority than <x>, and 0
+        otherwise.
+        """
+        if self._higher_priority(x, y):
+            return -1
+        if self._higher_priority(y, x):
+            return 1
+        return 0
+
+
+class _HeapEntry:
+    """An item stored in a HeapPriorityQueue.
+
+    === Public Attributes ===
+    item:
+      The item that was added to the queue.
+    order:
+      The number of items added to the queue before <item>; used to break
+      ties in FIFO order.
+    higher_priority:
+      The priority function of the queue that <item> was added to.
+    """
+    __slots__ = ('item', 'order', 'higher_priority')
+    item: Any
+    order: int
+    higher_priority: Callable[[Any, Any], bool]
+
+    def __init__(self, item: Any, order: int,
+                 higher_priority: Callable[[Any, Any], bool]) -> None:
+        """Initialize a new entry for <item>, the <order>-th item added."""
+        self.item = item
+        self.order = order
+        self.higher_priority = higher_priority
+
+    def __lt__(self, other: '_HeapEntry') -> bool:
+        """Return True iff this entry should be removed before <other>."""
+        if self.higher_priority(self.item, other.item):
+            return True
+        if self.higher_priority(other.item, self.item):
+            return False
+        return self.order < other.order
+
+
+class HeapPriorityQueue(PriorityQueue):
+    """A PriorityQueue that stores its items in a binary heap.
+
+    Items are removed in exactly the same order as from a PriorityQueue with
+    the same <higher_priority> function, including FIFO order for ties, but
+    add and remove both take O(log n) time instead of O(n).
+
+    === Private Attributes ===
+    _heap:
+      A binary min-heap of entries, as maintained by module heapq.  The entry
+      at index 0 holds the next item to be removed.
+    _count:
+      The number of items that have ever been added to this queue.
+
+    === Representation Invariants ===
+    - <_heap> satisfies the heap invariant with respect to _HeapEntry.__lt__.
+    - the <order> of every entry in <_heap> is unique and less than <_count>.
+    """
+    _heap: List[_HeapEntry]
+    _count: int
+
+    def __init__(self, higher_priority: Callable[[Any, Any], bool]) -> None:
+        """Initialize this to an empty HeapPriorityQueue.  For any two elements
+        x and y of the queue, if <higher_priority>(x, y) is true, then x has
+        higher priority than y.
+
+        >>> pq = HeapPriorityQueue(str.__lt__)
+        >>> pq.is_empty()
+        True
+        """
+        self._higher_priority = higher_priority
+        self._heap = []
+        self._count = 0
+
+    def add(self, item: Any) -> None:
+        """Add <item> to this HeapPriorityQueue.
+
+        >>> pq = HeapPriorityQueue(_shorter)
+        >>> pq.add('fred')
+        >>> pq.add('arju')
+        >>> pq.add('monalisa')
+        >>> pq.add('hat')
+        >>> pq.remove()
+        'hat'
+        """
+        heapq.heappush(self._heap,
+                       _HeapEntry(item, self._count, self._higher_priority))
+        self._count += 1
+
+    def remove(self) -> Any:
+        """Remove and return the next item from this HeapPriorityQueue.
+
+        Precondition: this priority queue is non-empty.
+
+        >>> pq = HeapPriorityQueue(_shorter)
+        >>> pq.add('fred')
+        >>> pq.add('arju')
+        >>> pq.add('monalisa')
+        >>> pq.add('hat')
+        >>> [pq.remove() for _ in range(4)]
+        ['hat', 'fred', 'arju', 'monalisa']
+        """
+        return heapq.heappop(self._heap).item
+
+    def is_empty(self) -> bool:
+        """Return True iff this HeapPriorityQueue is empty.
+
+        >>> pq = HeapPriorityQueue(str.__lt__)
+        >>> pq.is_empty()
+        True
+        >>> pq.add('fred')
+        >>> pq.is_empty()
+        False
+        """
+        return not self._heap
+
+    def add_many(self, items: Iterable[Any]) -> None:
+        """Add every item in <items> to this HeapPriorityQueue, in order.
+
+        This takes O(n) time to restore the heap, instead of O(n log n) time
+        to add the items one at a time.
+
+        >>> pq = HeapPriorityQueue.from_iterable(['fred', 'arju', 'hat'],
+        ...                                      _shorter)
+        >>> [pq.remove() for _ in range(3)]
+        ['hat', 'fred', 'arju']
+        """
+        for item in items:
+            self._heap.append(_HeapEntry(item, self._count,
+                                         self._higher_priority))
+            self._count += 1
+        heapq.heapify(self._heap)
+
+
+class _Reversed:
+    """A wrapper that reverses the ordering of the key it holds.
+
+    === Public Attributes ===
+    key:
+      The wrapped key.
+    """
+    __slots__ = ('key',)
+    key: Any
+
+    def __init__(self, key: Any) -> None:
+        """Initialize a new wrapper around <key>."""
+        self.key = key
+
+    def __lt__(self, other: '_Reversed') -> bool:
+        """Return True iff the wrapped key is greater than <other>'s."""
+        return other.key < self.key
+
+    def __eq__(self, other: Any) -> bool:
+        """Return True iff <other> wraps an equal key."""
+        return isinstance(other, _Reversed) and self.key == other.key
+
+
+class KeyedPriorityQueue(Container):
+    """A queue of items that operates in FIFO-priority order, where the
+    priority of each item is given by a key function.
+
+    Items with smaller keys are removed first, or items with larger keys if
+    the queue is reversed.  Ties are resolved in FIFO order.
+
+    The key of an item is computed exactly once, when it is added, so the key
+    of an item must not change while it is in the queue.  Ordering decisions
+    compare the cached keys directly instead of calling back into a
+    <higher_priority> function.
+
+    === Private Attributes ===
+    _heap:
+      A binary min-heap, as maintained by module heapq, of tuples
+      (key, order, item).  <order> is the number of items added before
+      <item>, so no two tuples compare equal and items are never compared.
+    _key:
+      The function that computes the key of an item.
+    _reverse:
+      True iff items with larger keys are removed first.
+    _count:
+      The number of items that have ever been added to this queue.
+
+    === Representation Invariants ===
+    - <_heap> satisfies the heap invariant.
+    - if <_reverse> is True, every key stored in <_heap> is either the
+      negated key of a number or a _Reversed key.
+    """
+    _heap: List[Tuple[Any, int, Any]]
+    _key: Callable[[Any], Any]
+    _reverse: bool
+    _count: int
+
+    def __init__(self, key: Callable[[Any], Any],
+                 reverse: bool = False) -> None:
+        """Initialize this to an empty KeyedPriorityQueue that orders items by
+        <key>, with larger keys first iff <reverse> is True.
+
+        >>> pq = KeyedPriorityQueue(len)
+        >>> pq.is_empty()
+        True
+        """
+        self._heap = []
+        self._key = key
+        self._reverse = reverse
+        self._count = 0
+
+    def add(self, item: Any) -> None:
+        """Add <item> to this KeyedPriorityQueue.
+
+        >>> pq = KeyedPriorityQueue(len, reverse=True)
+        >>> pq.add('fred')
+        >>> pq.add('arju')
+        >>> pq.add('monalisa')
+        >>> pq.add('hat')
+        >>> pq.remove()
+        'monalisa'
+        """
+        heapq.heappush(self._heap,
+                       (self._sort_key(self._key(item)), self._count, item))
+        self._count += 1
+
+    def remove(self) -> Any:
+        """Remove and return the next item from this KeyedPriorityQueue.
+
+        Precondition: this priority queue is non-empty.
+
+        >>> pq = KeyedPriorityQueue(len)
+        >>> pq.add('fred')
+        >>> pq.add('arju')
+        >>> pq.add('monalisa')
+        >>> pq.add('hat')
+        >>> [pq.remove() for _ in range(4)]
+        ['hat', 'fred', 'arju', 'monalisa']
+        """
+        return heapq.heappop(self._heap)[2]
+
+    def is_empty(self) -> bool:
+        """Return True iff this KeyedPriorityQueue is empty.
+
+        >>> pq = KeyedPriorityQueue(len)
+        >>> pq.is_empty()
+        True
+        >>> pq.add('fred')
+        >>> pq.is_empty()
+        False
+        """
+        return not self._heap
+
+    @classmethod
+    def from_iterable(cls, items: Iterable[Any], key: Callable[[Any], Any],
+                      reverse: bool = False) -> 'KeyedPriorityQueue':
+        """Return a new queue of this class that contains <items> and orders
+        them by <key>, with larger keys first iff <reverse> is True.  Items
+        are removed in the same order as if they had been added one at a
+        time, in order.
+
+        >>> pq = KeyedPriorityQueue.from_iterable(['fred', 'arju', 'hat'],
+        ...                                       len)
+        >>> [pq.remove() for _ in range(3)]
+        ['hat', 'fred', 'arju']
+        """
+        pq = cls(key, reverse)
+        pq.add_many(items)
+        return pq
+
+    def add_many(self, items: Iterable[Any]) -> None:
+        """Add every item in <items> to this KeyedPriorityQueue, in order.
+
+        This takes O(n) time to restore the heap, instead of O(n log n) time
+        to add the items one at a time.
+        """
+        heap = self._heap
+        for item in items:
+            heap.append((self._sort_key(self._key(item)), self._count, item))
+            self._count += 1
+        heapq.heapify(heap)
+
+    def _sort_key(self, key: Any) -> Any:
+        """Return the value that <key> is ordered by in this queue's heap."""
+        if not self._reverse:
+            return key
+        if isinstance(key, (int, float)):
+            return -key
+        return _Reversed(key)
+
+
+class IndexedPriorityQueue(KeyedPriorityQueue):
+    """A KeyedPriorityQueue whose items can be repositioned or removed after
+    they have been added.
+
+    When the key of an item changes, call update so that the item moves to
+    its new place in the queue.  An item keeps its original place in FIFO
+    order when it is updated.
+
+    === Private Attributes ===
+    _heap:
+      A binary min-heap of tuples (sort key, order, key, item), where <order>
+      is the number of items added before <item> and <sort key> is <key>,
+      reversed if this queue is reversed.
+    _index:
+      Maps the id of each item in this queue to its position in <_heap>.
+
+    === Representation Invariants ===
+    - <_heap> satisfies the heap invariant.
+    - <_index>[id(item)] == i iff <_heap>[i] holds <item>.
+    - no item occurs in <_heap> more than once.
+    """
+    _heap: List[Tuple[Any, int, Any, Any]]
+    _index: Dict[int, int]
+
+    def __init__(self, key: Callable[[Any], Any],
+                 reverse: bool = False) -> None:
+        """Initialize this to an empty IndexedPriorityQueue that orders items
+        by <key>, with larger keys first iff <reverse> is True.
+
+        >>> pq = IndexedPriorityQueue(len)
+        >>> pq.is_empty()
+        True
+        """
+        KeyedPriorityQueue.__init__(self, key, reverse)
+        self._index = {}
+
+    def __len__(self) -> int:
+        """Return the number of items in this IndexedPriorityQueue."""
+        return len(self._heap)
+
+    def __contains__(self, item: Any) -> bool:
+        """Return True iff <item> is in this IndexedPriorityQueue."""
+        return id(item) in self._index
+
+    def add(self, item: Any) -> None:
+        """Add <item> to this IndexedPriorityQueue.
+
+        Precondition: <item> is not already in this queue.
+
+        >>> pq = IndexedPriorityQueue(len)
+        >>> pq.add('fred')
+        >>> pq.add('hat')
+        >>> pq.peek()
+        'hat'
+        """
+        key = self._key(item)
+        self._heap.append((self._sort_key(key), self._count, key, item))
+        self._count += 1
+        self._index[id(item)] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def remove(self, item: Any = None) -> Any:
+        """Remove and return <item> from this IndexedPriorityQueue, or the
+        next item if <item> is None.
+
+        Precondition: this priority queue is non-empty, and <item> is either
+        None or in this queue.
+
+        >>> pq = IndexedPriorityQueue(len)
+        >>> for s in ['fred', 'arju', 'monalisa', 'hat']:
+        ...     pq.add(s)
+        >>> pq.remove('arju')
+        'arju'
+        >>> [pq.remove() for _ in range(3)]
+        ['hat', 'fred', 'monalisa']
+        """
+        i = 0 if item is None else self._index[id(item)]
+        entry = self._heap[i]
+        last = self._heap.pop()
+        del self._index[id(entry[3])]
+        if i < len(self._heap):
+            self._heap[i] = last
+            self._index[id(last[3])] = i
+            self._sift_up(i)
+            self._sift_down(self._index[id(last[3])])
+        return entry[3]
+
+    def is_empty(self) -> bool:
+        """Return True iff this IndexedPriorityQueue is empty.
+
+        >>> pq = IndexedPriorityQueue(len)
+        >>> pq.is_empty()
+        True
+        >>> pq.add('fred')
+        >>> pq.is_empty()
+        False
+        """
+        return not self._heap
+
+    def add_many(self, items: Iterable[Any]) -> None:
+        """Add every item in <items> to this IndexedPriorityQueue, in order.
+
+        Precondition: no item in <items> is already in this queue, and no
+        item occurs in <items> more than once.
+
+        >>> pq = IndexedPriorityQueue.from_iterable(['fred', 'arju', 'hat'],
+        ...                                         len)
+        >>> pq.remove('arju')
+        'arju'
+        >>> [pq.remove() for _ in range(2)]
+        ['hat', 'fred']
+        """
+        heap = self._heap
+        for item in items:
+            key = self._key(item)
+            self._index[id(item)] = len(heap)
+            heap.append((self._sort_key(key), self._count, key, item))
+            self._count += 1
+        for i in range(len(heap) // 2 - 1, -1, -1):
+            self._sift_down(i)
+
+    def peek(self) -> Any:
+        """Return the next item in this IndexedPriorityQueue without removing
+        it.
+
+        Precondition: this priority queue is non-empty.
+        """
+        return self._heap[0][3]
+
+    def update(self, item: Any) -> None:
+        """Recompute the key of <item> and move it to its new place in this
+        IndexedPriorityQueue.
+
+        Precondition: <item> is in this queue.
+
+        >>> pq = IndexedPriorityQueue(len)
+        >>> words = [['a'], ['b', 'b'], ['c', 'c', 'c']]
+        >>> for w in words:
+        ...     pq.add(w)
+        >>> words[2].clear()
+        >>> pq.update(words[2])
+        >>> pq.remove()
+        []
+        """
+        i = self._index[id(item)]
+        _, order, _, _ = self._heap[i]
+        key = self._key(item)
+        self._heap[i] = (self._sort_key(key), order, key, item)
+        self._sift_up(i)
+        self._sift_down(self._index[id(item)])
+
+    def first_at_least(self, bound: Any) -> Any:
+        """Return the item that would be removed first from among the items
+        whose key is at least <bound>, without removing it.  Return None if
+        there is no such item.
+
+        >>> pq = IndexedPriorityQueue(len)
+        >>> for s in ['fred', 'arju', 'monalisa', 'hat']:
+        ...     pq.add(s)
+        >>> pq.first_at_least(4)
+        'fred'
+        >>> pq.first_at_least(9) is None
+        True
+        """
+        heap = self._heap
+        if not heap:
+            return None
+        if self._reverse:
+            # the next item has the largest key
+            return heap[0][3] if heap[0][2] >= bound else None
+        # Every item below an item with a large enough key comes after it,
+        # so only the subtrees of items with too small a key are searched.
+        best = None
+        stack = [0]
+        while stack:
+            i = stack.pop()
+            if heap[i][2] >= bound:
+                if best is None or heap[i] < best:
+                    best = heap[i]
+            else:
+                stack.extend(j for j in (2 * i + 1, 2 * i + 2)
+                             if j < len(heap))
+        return None if best is None else best[3]
+
+    def _sift_up(self, i: int) -> None:
+        """Move the entry at position <i> of <_heap> up to its place."""
+        heap, index = self._heap, self._index
+        entry = heap[i]
+        while i > 0:
+            parent = (i - 1) // 2
+            if not entry < heap[parent]:
+                break
+            heap[i] = heap[parent]
+            index[id(heap[i][3])] = i
+            i = parent
+        heap[i] = entry
+        index[id(entry[3])] = i
+
+    def _sift_down(self, i: int) -> None:
+        """Move the entry at position <i> of <_heap> down to its place."""
+        heap, index = self._heap, self._index
+        entry = heap[i]
+        n = len(heap)
+        while 2 * i + 1 < n:
+            child = 2 * i + 1
+            if child + 1 < n and heap[child + 1] < heap[child]:
+                child += 1
+            if not heap[child] < entry:
+                break
+            heap[i] = heap[child]
+            index[id(heap[i][3])] = i
+            i = child
+        heap[i] = entry
+        index[id(entry[3])] = i
+
+
+class _Bucket:
+    """The items with the same key in a BucketPriorityQueue.
+
+    === Public Attributes ===
+    entries:
+      Tuples (rank, token, item), sorted by rank.  Entries before <head>
+      have already been removed, and entries whose token is out of date
+      belong to items that were removed or moved to another bucket.
+    head:
+      The index in <entries> of the first entry that may still be current.
+    size:
+      The number of current entries.
+    """
+    __slots__ = ('entries', 'head', 'size')
+    entries: List[Tuple[Any, int, Any]]
+    head: int
+    size: int
+
+    def __init__(self) -> None:
+        """Initialize an empty bucket."""
+        self.entries = []
+        self.head = 0
+        self.size = 0
+
+
+class BucketPriorityQueue(Container):
+    """A queue of items that operates in FIFO-priority order, where the
+    priority of each item is an integer given by a key function.
+
+    Items with the same key are kept together in a bucket.  Items with
+    smaller keys are removed first, or items with larger keys if the queue
+    is reversed.  Within a bucket, items are removed in FIFO order, or in
+    increasing order of <rank> if a rank function is given.
+
+    Adding and removing items takes O(1) amortized time when items are
+    added in FIFO (or rank) order, plus O(k) time whenever a bucket is
+    created or emptied, where k is the number of distinct keys in the queue.
+    It is meant for keys from a small range, such as parcel volumes or the
+    available space in trucks.
+
+    Like IndexedPriorityQueue, items can be updated or removed after they
+    have been added.  An item keeps its rank when it is updated.  The same
+    item may be added more than once, and each copy is removed separately.
+
+    === Private Attributes ===
+    _key:
+      The function that computes the key of an item.
+    _reverse:
+      True iff items with larger keys are removed first.
+    _rank:
+      The function that orders items with the same key, or None for FIFO
+      order.
+    _buckets:
+      Maps each key to the bucket of items with that key.
+    _keys:
+      The keys of <_buckets>, in increasing order.
+    _where:
+      Maps the id of each item in this queue to a dictionary that maps the
+      token of each current entry for a copy of that item to (key, rank),
+      oldest copy first.
+    _size:
+      The number of copies of items in this queue.
+    _count:
+      The number of items that have ever been added to this queue.
+    _tokens:
+      The number of entries that have ever been placed in a bucket.
+
+    === Representation Invariants ===
+    - every bucket in <_buckets> has a positive size.
+    - the size of each bucket is the number of copies in <_where> with its
+      key.
+    """
+    _key: Callable[[Any], int]
+    _reverse: bool
+    _rank: Optional[Callable[[Any], Any]]
+    _buckets: Dict[int, _Bucket]
+    _keys: List[int]
+    _where: Dict[int, Dict[int, Tuple[int, Any]]]
+    _size: int
+    _count: int
+    _tokens: int
+
+    def __init__(self, key: Callable[[Any], int], reverse: bool = False,
+                 rank: Optional[Callable[[Any], Any]] = None) -> None:
+        """Initialize this to an empty BucketPriorityQueue that orders items
+        by <key>, with larger keys first iff <reverse> is True.  Items with
+        the same key are ordered by <rank> if it is given, and in FIFO order
+        otherwise.
+
+        >>> pq = BucketPriorityQueue(len)
+        >>> pq.is_empty()
+        True
+        """
+        self._key = key
+        self._reverse = reverse
+        self._rank = rank
+        self._buckets = {}
+        self._keys = []
+        self._where = {}
+        self._size = 0
+        self._count = 0
+        self._tokens = 0
+
+    def __len__(self) -> int:
+        """Return the number of items in this BucketPriorityQueue, counting
+        each copy of an item."""
+        return self._size
+
+    def __contains__(self, item: Any) -> bool:
+        """Return True iff <item> is in this BucketPriorityQueue."""
+        return id(item) in self._where
+
+    @classmethod
+    def from_iterable(cls, items: Iterable[Any], key: Callable[[Any], int],
+                      reverse: bool = False,
+                      rank: Optional[Callable[[Any], Any]] = None
+                      ) -> 'BucketPriorityQueue':
+        """Return a new BucketPriorityQueue that contains <items>, ordered by
+        <key>, <reverse> and <rank> as in the initializer.
+
+        >>> pq = BucketPriorityQueue.from_iterable(['fred', 'arju', 'hat'],
+        ...                                        len)
+        >>> [pq.remove() for _ in range(3)]
+        ['hat', 'fred', 'arju']
+        """
+        pq = cls(key, reverse, rank)
+        pq.add_many(items)
+        return pq
+
+    def add(self, item: Any) -> None:
+        """Add <item> to this BucketPriorityQueue.  If <item> is already in
+        this queue, another copy of it is added.
+
+        >>> pq = BucketPriorityQueue(len, reverse=True)
+        >>> pq.add('fred')
+        >>> pq.add('arju')
+        >>> pq.add('monalisa')
+        >>> pq.add('hat')
+        >>> [pq.remove() for _ in range(4)]
+        ['monalisa', 'fred', 'arju', 'hat']
+        """
+        rank = self._count if self._rank is None else self._rank(item)
+        self._count += 1
+        self._place(item, self._key(item), rank)
+
+    def remove(self, item: Any = None) -> Any:
+        """Remove and return <item> from this BucketPriorityQueue, or the
+        next item if <item> is None.
+
+        If there is more than one copy of <item>, the oldest is removed.
+
+        Precondition: this priority queue is non-empty, and <item> is either
+        None or in this queue.
+
+        >>> pq = BucketPriorityQueue(len)
+        >>> for s in ['fred', 'arju', 'monalisa', 'hat']:
+        ...     pq.add(s)
+        >>> pq.remove('fred')
+        'fred'
+        >>> [pq.remove() for _ in range(3)]
+        ['hat', 'arju', 'monalisa']
+        """
+        if item is None:
+            _, token, item = self._front_entry(
+                self._keys[-1] if self._reverse else self._keys[0])
+        else:
+            token = next(iter(self._where[id(item)]))
+        self._unplace(item, token)
+        return item
+
+    def is_empty(self) -> bool:
+        """Return True iff this BucketPriorityQueue is empty.
+
+        >>> pq = BucketPriorityQueue(len)
+        >>> pq.is_empty()
+        True
+        >>> pq.add('fred')
+        >>> pq.is_empty()
+        False
+        """
+        return not self._size
+
+    def peek(self) -> Any:
+        """Return the next item in this BucketPriorityQueue without removing
+        it.
+
+        Precondition: this priority queue is non-empty.
+        """
+        return self._front(self._keys[-1] if self._reverse else self._keys[0])
+
+    def update(self, item: Any) -> None:
+        """Recompute the key of <item> and move every copy of it to its new
+        place in this BucketPriorityQueue.
+
+        Precondition: <item> is in this queue.
+
+        >>> pq = BucketPriorityQueue(len)
+        >>> words = [['a'], ['b', 'b'], ['c', 'c', 'c']]
+        >>> for w in words:
+        ...     pq.add(w)
+        >>> words[2].clear()
+        >>> pq.update(words[2])
+        >>> pq.remove()
+        []
+        """
+        new_key = self._key(item)
+        for token, (key, rank) in list(self._where[id(item)].items()):
+            if new_key != key:
+                self._unplace(item, token)
+                self._place(item, new_key, rank)
+
+    def first_at_least(self, bound: int) -> Any:
+        """Return the item that would be removed first from among the items
+        whose key is at least <bound>, without removing it.  Return None if
+        there is no such item.
+
+        >>> pq = BucketPriorityQueue(len)
+        >>> for s in ['fred', 'arju', 'monalisa', 'hat']:
+        ...     pq.add(s)
+        >>> pq.first_at_least(4)
+        'fred'
+        >>> pq.first_at_least(9) is None
+        True
+        """
+        keys = self._keys
+        if self._reverse:
+            if keys and keys[-1] >= bound:
+                return self._front(keys[-1])
+            return None
+        i = bisect.bisect_left(keys, bound)
+        return self._front(keys[i]) if i < len(keys) else None
+
+    def _front(self, key: int) -> Any:
+        """Return the first current item in the bucket for <key>."""
+        return self._front_entry(key)[2]
+
+    def _front_entry(self, key: int) -> Tuple[Any, int, Any]:
+        """Return the first current entry in the bucket for <key>."""
+        bucket = self._buckets[key]
+        entries = bucket.entries
+        where = self._where
+        while True:
+            entry = entries[bucket.head]
+            copies = where.get(id(entry[2]))
+            if copies is not None and entry[1] in copies:
+                return entry
+            bucket.head += 1
+
+    def _place(self, item: Any, key: int, rank: Any) -> None:
+        """Put <item> in the bucket for <key>, in order of <rank>."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = _Bucket()
+            self._buckets[key] = bucket
+            bisect.insort(self._keys, key)
+        entry = (rank, self._tokens, item)
+        entries = bucket.entries
+        if bucket.head == len(entries) or entries[-1][0] <= rank:
+            entries.append(entry)
+        else:
+            bisect.insort(entries, entry, bucket.head)
+        bucket.size += 1
+        self._where.setdefault(id(item), {})[self._tokens] = (key, rank)
+        self._size += 1
+        self._tokens += 1
+
+    def _unplace(self, item: Any, token: int) -> None:
+        """Take the copy of <item> with entry <token> out of its bucket.  Its
+        entry is left in place, and is skipped once it is out of date."""
+        copies = self._where[id(item)]
+        key, _ = copies.pop(token)
+        if not copies:
+            del self._where[id(item)]
+        self._size -= 1
+        bucket = self._buckets[key]
+        bucket.size -= 1
+        if bucket.size == 0:
+            del self._buckets[key]
+            del self._keys[bisect.bisect_left(self._keys, key)]
+        elif bucket.head > 32 and 2 * bucket.head > len(bucket.entries):
+            del bucket.entries[:bucket.head]
+            bucket.head = 0
+
+
+class ConcurrentPriorityQueue(Container):
+    """A HeapPriorityQueue that can be shared between threads.
+
+    Items are removed in the same FIFO-priority order as from a
+    PriorityQueue with the same <higher_priority> function.  The lock is
+    only held while the heap itself is changed, and remove can wait for an
+    item to be added by another thread.
+
+    === Private Attributes ===
+    _heap:
+      A binary min-heap of entries, as in HeapPriorityQueue.
+    _higher_priority:
+      A function that compares two items by their priority.
+    _counter:
+      Produces the order of each entry.  Taking the next value is atomic.
+    _not_empty:
+      The condition that threads waiting in remove are notified of when an
+      item is added.  Its lock protects <_heap>.
+    """
+    _heap: List[_HeapEntry]
+    _higher_priority: Callable[[Any, Any], bool]
+    _counter: Iterator[int]
+    _not_empty: threading.Condition
+
+    def __init__(self, higher_priority: Callable[[Any, Any], bool]) -> None:
+        """Initialize this to an empty ConcurrentPriorityQueue.  For any two
+        elements x and y of the queue, if <higher_priority>(x, y) is true,
+        then x has higher priority than y.
+
+        >>> pq = ConcurrentPriorityQueue(str.__lt__)
+        >>> pq.is_empty()
+        True
+        """
+        self._heap = []
+        self._higher_priority = higher_priority
+        self._counter = itertools.count()
+        self._not_empty = threading.Condition(threading.Lock())
+
+    def __len__(self) -> int:
+        """Return the number of items in this ConcurrentPriorityQueue."""
+        return len(self._heap)
+
+    def add(self, item: Any) -> None:
+        """Add <item> to this ConcurrentPriorityQueue, and wake up one thread
+        that is waiting to remove an item.
+
+        >>> pq = ConcurrentPriorityQueue(_shorter)
+        >>> pq.add('fred')
+        >>> pq.add('hat')
+        >>> pq.remove()
+        'hat'
+        """
+        entry = _HeapEntry(item, next(self._counter), self._higher_priority)
+        with self._not_empty:
+            heapq.heappush(self._heap, entry)
+            self._not_empty.notify()
+
+    def add_many(self, items: Iterable[Any]) -> None:
+        """Add every item in <items> to this ConcurrentPriorityQueue, in
+        order, and wake up the threads that are waiting to remove them.
+        """
+        entries = [_HeapEntry(item, next(self._counter),
+                              self._higher_priority) for item in items]
+        with self._not_empty:
+            for entry in entries:
+                heapq.heappush(self._heap, entry)
+            self._not_empty.notify(len(entries))
+
+    def remove(self, timeout: Optional[float] = None) -> Any:
+        """Remove and return the next item from this ConcurrentPriorityQueue.
+
+        If the queue is empty, wait until another thread adds an item, for
+        at most <timeout> seconds if <timeout> is not None.  Raise
+        queue.Empty if no item was added in time.
+
+        >>> pq = ConcurrentPriorityQueue(_shorter)
+        >>> pq.add_many(['fred', 'arju', 'hat'])
+        >>> [pq.remove() for _ in range(3)]
+        ['hat', 'fred', 'arju']
+        >>> pq.remove(timeout=0)
+        Traceback (most recent call last):
+        ...
+        _queue.Empty
+        """
+        with self._not_empty:
+            if not self._not_empty.wait_for(lambda: self._heap, timeout):
+                raise queue.Empty
+            return heapq.heappop(self._heap).item
+
+    def is_empty(self) -> bool:
+        """Return True iff this ConcurrentPriorityQueue is empty.
+
+        Another thread may add or remove items at any time, so the answer
+        can be out of date by the time it is used.
+
+        >>> pq = ConcurrentPriorityQueue(str.__lt__)
+        >>> pq.is_empty()
+        True
+        >>> pq.add('fred')
+        >>> pq.is_empty()
+        False
+        """
+        return not self._heap
+
+
+class AsyncPriorityQueue:
+    """A priority queue for asyncio tasks.
+
+    Items are removed in the same FIFO-priority order as from a
+    PriorityQueue with the same <higher_priority> function.  get waits
+    until an item is available.
+
+    This class is not thread-safe; use ConcurrentPriorityQueue to share a
+    queue between threads.
+
+    === Private Attributes ===
+    _heap:
+      A binary min-heap of entries, as in HeapPriorityQueue.
+    _higher_priority:
+      A function that compares two items by their priority.
+    _count:
+      The number of items that have ever been added to this queue.
+    _not_empty:
+      The condition that tasks waiting in get are notified of when an item
+      is added, or None until the queue is first used in an event loop.
+    """
+    _heap: List[_HeapEntry]
+    _higher_priority: Callable[[Any, Any], bool]
+    _count: int
+    _not_empty: Optional[asyncio.Condition]
+
+    def __init__(self, higher_priority: Callable[[Any, Any], bool]) -> None:
+        """Initialize this to an empty AsyncPriorityQueue.  For any two
+        elements x and y of the queue, if <higher_priority>(x, y) is true,
+        then x has higher priority than y.
+
+        >>> pq = AsyncPriorityQueue(str.__lt__)
+        >>> pq.is_empty()
+        True
+        """
+        self._heap = []
+        self._higher_priority = higher_priority
+        self._count = 0
+        self._not_empty = None
+
+    def __len__(self) -> int:
+        """Return the number of items in this AsyncPriorityQueue."""
+        return len(self._heap)
+
+    def _condition(self) -> asyncio.Condition:
+        """Return the condition for this queue, creating it in the running
+        event loop if needed."""
+        if self._not_empty is None:
+            self._not_empty = asyncio.Condition()
+        return self._not_empty
+
+    async def put(self, item: Any) -> None:
+        """Add <item> to this AsyncPriorityQueue, and wake up one task that is
+        waiting to get an item.
+
+        >>> async def demo():
+        ...     pq = AsyncPriorityQueue(_shorter)
+        ...     for s in ['fred', 'arju', 'hat']:
+        ...         await pq.put(s)
+        ...     return [await pq.get() for _ in range(3)]
+        >>> asyncio.run(demo())
+        ['hat', 'fred', 'arju']
+        """
+        not_empty = self._condition()
+        async with not_empty:
+            heapq.heappush(self._heap, _HeapEntry(item, self._count,
+                                                  self._higher_priority))
+            self._count += 1
+            not_empty.notify()
+
+    async def get(self) -> Any:
+        """Remove and return the next item from this AsyncPriorityQueue,
+        waiting until an item is added if the queue is empty.
+        """
+        not_empty = self._condition()
+        async with not_empty:
+            await not_empty.wait_for(lambda: self._heap)
+            return heapq.heappop(self._heap).item
+
+    def is_empty(self) -> bool:
+        """Return True iff this AsyncPriorityQueue is empty.
+
+        >>> pq = AsyncPriorityQueue(str.__lt__)
+        >>> pq.is_empty()
+        True
+        """
+        return not self._heap
+
 
 if __name__ == '__main__':
     import python_ta
 
     python_ta.check_all(config={
-        'allowed-import-modules': ['doctest', 'python_ta', 'typing'],
+        'allowed-import-modules': ['doctest', 'python_ta', 'typing',
+                                   'asyncio', 'bisect', 'functools', 'heapq',
+                                   'itertools', 'queue', 'threading'],
         'disable': ['E1136'],
         'max-attributes': 15,
     })
@@ -22,8 +22,52 @@ and look up distances between cities. This class does not read distances
 from the map file. (All reading from files is done in module experiment.)
 Instead, it provides public methods that can be called to store and look up
 distances.
+
+MatrixDistanceMap is a DistanceMap that stores distances in a dense matrix
+indexed by city, for maps with many cities.  It can be saved in a binary
+format that is read without parsing.  It can also complete a map that
+only lists direct roads, by computing the shortest paths between all cities.
+NumPy is used to compute them if it is installed.
+
+SparseDistanceMap is a DistanceMap for road networks that are too large to
+complete.  It finds shortest paths on demand and caches the recent ones.
+
+CoordinateDistanceMap is a DistanceMap that computes distances from the
+latitude and longitude of each city, so no distances need to be listed.
+
+FrozenDistanceMap is a read-only MatrixDistanceMap, made by freezing any
+distance map.  It can be shared between processes without copying it.
 """
-from typing import Dict
+from typing import Any, Dict, List, Optional, Tuple, Union
+from array import array
+from collections import OrderedDict
+from multiprocessing import shared_memory
+import bisect
+import heapq
+import math
+import struct
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The type of the ints that MatrixDistanceMap stores distances in.
+_TYPECODE = 'i'
+
+# The binary format of MatrixDistanceMap.to_bytes: a header holding MAGIC,
+# the format version, the number of cities and the offset of the matrix,
+# followed by the size and UTF-8 name of each city, then the matrix.  All of
+# it is little-endian, whatever the byte order of the host.
+MAGIC = b'DMAP'
+_VERSION = 1
+_HEADER = struct.Struct('<4sIIQ')
+_NAME_SIZE = struct.Struct('<I')
+_ALIGNMENT = 8
+
+# The mean radius of the Earth, in kilometres.
+_EARTH_RADIUS = 6371.0
 
 
 class DistanceMap:
@@ -34,15 +78,31 @@ class DistanceMap:
        sub-dictionary as values. Each key for the sub-dictionary is name of
        end location, the distance from start location to end
        location as value.
+       _neighbours: maps the name of a city to the other cities that have
+       a distance from it, closest first.  A city is only in here once
+       nearest has been called for it, and is removed again when distances
+       from it change.
+       _version: the number of times that distances in this map have
+       changed.
+       _changed: maps the name of a city to the version at which distances
+       to or from it last changed.  If the key None is present, it maps to
+       the version at which every distance last changed.
 
        === Representation Invariants ===
        - We do not need to get the distance between 2 same locations (?
+       - every version in <_changed> is at most <_version>.
        """
     _distance_map: Dict[str, Dict[str, int]]
+    _neighbours: Dict[str, List[str]]
+    _version: int
+    _changed: Dict[Optional[str], int]
 
     def __init__(self) -> None:
         """Initialize a distance map"""
         self._distance_map = {}
+        self._neighbours = {}
+        self._version = 0
+        self._changed = {}
 
     def add_distance(self, loc1: str, loc2: str, d1: int, d2: int = -1) -> None:
         """Add distance between <loc1> and <loc2> to self._distance_map.
@@ -60,6 +120,7 @@ class DistanceMap:
         else:
             dict_[loc1][loc2] = d1
             dict_[loc2][loc1] = d2
+        self._touch(loc1, loc2)
 
     def distance(self, loc1: str, loc2: str) -> int:
         """Return the distance from <loc1> to <loc2>.
@@ -69,12 +130,1033 @@ class DistanceMap:
             return self._distance_map[loc1][loc2]
         return -1
 
+    def route_distances(self, routes: List[List[str]]) -> List[int]:
+        """Return the total distance of each route in <routes>, including
+        the distance from the last city of the route back to its first city.
+        As with distance, each missing distance counts as -1.
+
+        Maps that store their distances in bulk override this to compute
+        all of the routes together.
+
+        Precondition: no route in <routes> is empty.
+
+        >>> m = DistanceMap()
+        >>> m.add_distance('Toronto', 'Hamilton', 9)
+        >>> m.add_distance('Hamilton', 'London', 20, 25)
+        >>> m.add_distance('London', 'Toronto', 30)
+        >>> m.route_distances([['Toronto', 'Hamilton', 'London'],
+        ...                    ['Toronto', 'Hamilton']])
+        [59, 18]
+        """
+        return [sum(self.distance(route[k], route[k + 1 - len(route)])
+                    for k in range(len(route))) for route in routes]
+
+    def nearest(self, city: str, k: int) -> List[str]:
+        """Return the <k> cities closest to <city>, closest first.  Cities
+        at the same distance are in alphabetical order.  Only cities that
+        have a distance from <city> are returned, so there may be fewer
+        than <k> of them.
+
+        The cities are sorted by distance the first time they are needed,
+        and stay sorted until a distance from <city> changes, so later
+        calls take O(k) time.
+
+        >>> m = DistanceMap()
+        >>> m.add_distance('Toronto', 'Hamilton', 9)
+        >>> m.add_distance('Toronto', 'London', 30)
+        >>> m.add_distance('Toronto', 'Barrie', 9)
+        >>> m.nearest('Toronto', 2)
+        ['Barrie', 'Hamilton']
+        >>> m.add_distance('Toronto', 'London', 5)
+        >>> m.nearest('Toronto', 2)
+        ['London', 'Barrie']
+        """
+        neighbours = self._neighbours.get(city)
+        if neighbours is None:
+            neighbours = [other for _, other in
+                          sorted(self._candidates(city))]
+            self._neighbours[city] = neighbours
+        return neighbours[:k]
+
+    def get_version(self) -> int:
+        """Return the version of this map, which increases every time that
+        distances in this map change.
+
+        >>> m = DistanceMap()
+        >>> m.get_version()
+        0
+        >>> m.add_distance('Toronto', 'Hamilton', 9)
+        >>> m.get_version()
+        1
+        """
+        return self._version
+
+    def changed_since(self, version: int, cities: List[str]) -> bool:
+        """Return True iff a distance to or from any of <cities> has changed
+        since this map was at <version>.
+
+        A value computed from distances between <cities> can be stored with
+        the version of the map, and reused for as long as this returns
+        False.
+
+        >>> m = DistanceMap()
+        >>> m.add_distance('Toronto', 'Hamilton', 9)
+        >>> version = m.get_version()
+        >>> m.add_distance('London', 'Barrie', 30)
+        >>> m.changed_since(version, ['Toronto', 'Hamilton'])
+        False
+        >>> m.add_distance('Toronto', 'Barrie', 25)
+        >>> m.changed_since(version, ['Toronto', 'Hamilton'])
+        True
+        """
+        if version >= self._version:
+            # nothing has changed, so <cities> need not be looked at
+            return False
+        changed = self._changed
+        if changed.get(None, 0) > version:
+            return True
+        return any(changed.get(city, 0) > version for city in cities)
+
+    def freeze(self) -> 'FrozenDistanceMap':
+        """Return a read-only copy of this map, whose distances are stored
+        in one flat buffer.
+
+        The copy can be read from several threads at once, and shared with
+        other processes through shared memory without being copied.  See
+        FrozenDistanceMap.
+
+        >>> m = DistanceMap()
+        >>> m.add_distance('Toronto', 'Hamilton', 9, 10)
+        >>> m.freeze().distance('Hamilton', 'Toronto')
+        10
+        """
+        return MatrixDistanceMap.from_distance_map(self).freeze()
+
+    def _touch(self, *cities: str) -> None:
+        """Record that distances to or from <cities> have changed, or that
+        every distance has changed if no cities are given."""
+        self._version += 1
+        if not cities:
+            # older per-city versions can no longer matter
+            self._changed = {None: self._version}
+            self._neighbours.clear()
+        for city in cities:
+            self._changed[city] = self._version
+            self._neighbours.pop(city, None)
+
+    def _candidates(self, city: str) -> List[Tuple[int, str]]:
+        """Return (distance, other city) for every city other than <city>
+        that has a distance from <city>."""
+        return [(d, other) for other, d in self._row(city).items()
+                if other != city and d >= 0]
+
+    def _city_names(self) -> List[str]:
+        """Return the names of all of the cities in this map."""
+        return list(self._distance_map)
+
+    def _row(self, city: str) -> Dict[str, int]:
+        """Return a dictionary that maps each city that has a distance from
+        <city> to that distance.  The dictionary must not be mutated."""
+        return self._distance_map.get(city, {})
+
+
+class MatrixDistanceMap(DistanceMap):
+    """ A distance map that stores its distances in a dense matrix.
+
+    Each city is given an integer index, in the order in which cities are
+    first added, and the distance from city i to city j is stored in one
+    flat array of ints.  Besides the usual lookups by city name, distances
+    can be looked up by index, which avoids hashing strings in hot loops.
+
+    After complete is called, the map looks up shortest-path distances
+    instead of only the distances that were added.
+
+       === Private Attributes ===
+       _index: maps the name of each city to its index.
+       _cities: the names of the cities, in order of index.
+       _matrix: the distances that are looked up, row by row.  The distance
+       from city i to city j is at position i * _stride + j, and is -1 if
+       not stored.  This is a memoryview if the map was read from a buffer.
+       _stride: the length of each row of <_matrix>.
+       _direct: None if complete has never been called.  Otherwise, the
+       distances that were added, laid out like <_matrix>, while <_matrix>
+       holds the shortest-path distances between cities.
+       _stale: True iff distances were added to <_direct> since <_matrix>
+       was last completed.
+
+       === Representation Invariants ===
+       - len(_cities) <= _stride
+       - len(_matrix) == _stride * _stride
+       - _index[_cities[i]] == i for every index i
+       - _direct is None or len(_direct) == len(_matrix)
+       - _stale is False if _direct is None
+       """
+    _index: Dict[str, int]
+    _cities: List[str]
+    _matrix: Union[array, memoryview]
+    _stride: int
+    _direct: Optional[Union[array, memoryview]]
+    _stale: bool
+
+    def __init__(self) -> None:
+        """Initialize a distance map with no cities.
+
+        >>> m = MatrixDistanceMap()
+        >>> m.distance('Toronto', 'Hamilton')
+        -1
+        """
+        self._index = {}
+        self._cities = []
+        self._matrix = array(_TYPECODE)
+        self._stride = 0
+        self._direct = None
+        self._stale = False
+        self._neighbours = {}
+        self._version = 0
+        self._changed = {}
+
+    @classmethod
+    def from_distance_map(cls, d_map: DistanceMap) -> 'MatrixDistanceMap':
+        """Return a new MatrixDistanceMap with the same distances as <d_map>.
+
+        >>> m = DistanceMap()
+        >>> m.add_distance('Toronto', 'Hamilton', 9, 10)
+        >>> MatrixDistanceMap.from_distance_map(m).distance('Hamilton',
+        ...                                                 'Toronto')
+        10
+        """
+        matrix_map = MatrixDistanceMap()
+        for loc1 in d_map._city_names():
+            matrix_map._add_city(loc1)
+            for loc2, d in d_map._row(loc1).items():
+                matrix_map._set(loc1, loc2, d)
+        if cls is not MatrixDistanceMap:
+            return cls.from_buffer(matrix_map.to_bytes())
+        return matrix_map
+
+    @classmethod
+    def from_buffer(cls, buffer: Any) -> 'MatrixDistanceMap':
+        """Return a new MatrixDistanceMap whose distances are read directly
+        from <buffer>, without copying them.
+
+        Raise a ValueError if <buffer> does not hold exactly one map in the
+        format returned by to_bytes.  On a big-endian host the distances are
+        copied, since they are stored little-endian.
+
+        Precondition: <buffer> supports the buffer protocol.  If <buffer> is
+        read-only, no distances are added to the new map.
+
+        >>> m = MatrixDistanceMap()
+        >>> m.add_distance('Toronto', 'Hamilton', 9, 10)
+        >>> copy = MatrixDistanceMap.from_buffer(m.to_bytes())
+        >>> copy.cities(), copy.distance('Hamilton', 'Toronto')
+        (['Toronto', 'Hamilton'], 10)
+        """
+        view = memoryview(buffer).cast('B')
+        if len(view) != _map_size(view):
+            raise ValueError('truncated or oversized binary distance map')
+        _, _, n, offset = _HEADER.unpack_from(view)
+        matrix_map = cls()
+        pos = _HEADER.size
+        for _ in range(n):
+            if pos + _NAME_SIZE.size > offset:
+                raise ValueError('truncated binary distance map')
+            size, = _NAME_SIZE.unpack_from(view, pos)
+            pos += _NAME_SIZE.size
+            city = sys.intern(str(view[pos:pos + size], 'utf-8'))
+            pos += size
+            matrix_map._index[city] = len(matrix_map._cities)
+            matrix_map._cities.append(city)
+        if pos > offset:
+            raise ValueError('truncated binary distance map')
+        body = view[offset:]
+        if sys.byteorder == 'little':
+            matrix_map._matrix = body.cast(_TYPECODE)
+        else:
+            matrix_map._matrix = array(_TYPECODE, body.tobytes())
+            matrix_map._matrix.byteswap()
+        matrix_map._stride = n
+        return matrix_map
+
+    def to_bytes(self) -> bytes:
+        """Return this map in a binary format that from_buffer can read.
+
+        The format is a header, then the names of the cities in order of
+        index, then the distances as a matrix of fixed-width little-endian
+        ints, aligned so that it can be used directly from a memory-mapped
+        file.
+        """
+        n = len(self._cities)
+        names = bytearray()
+        for city in self._cities:
+            name = city.encode('utf-8')
+            names += _NAME_SIZE.pack(len(name)) + name
+        offset = _HEADER.size + len(names)
+        offset += -offset % _ALIGNMENT
+        if self._stale:
+            self.complete()
+        matrix = _restride(self._matrix, n, self._stride, n)
+        if sys.byteorder != 'little':
+            matrix.byteswap()
+        return b''.join([_HEADER.pack(MAGIC, _VERSION, n, offset), names,
+                         bytes(offset - _HEADER.size - len(names)),
+                         matrix.tobytes()])
+
+    def add_distance(self, loc1: str, loc2: str, d1: int, d2: int = -1) -> None:
+        """Add distance between <loc1> and <loc2> to self._matrix.
+        Return None.
+
+        >>> m = MatrixDistanceMap()
+        >>> m.add_distance('Toronto', 'Hamilton', 9, 10)
+        >>> m.distance('Toronto', 'Hamilton'), m.distance('Hamilton', 'Toronto')
+        (9, 10)
+        """
+        self._set(loc1, loc2, d1)
+        self._set(loc2, loc1, d1 if d2 == -1 else d2)
+
+    def distance(self, loc1: str, loc2: str) -> int:
+        """Return the distance from <loc1> to <loc2>.
+        Return -1 if distance not stored."""
+        i = self._index.get(loc1)
+        j = self._index.get(loc2)
+        if i is None or j is None:
+            return -1
+        if self._stale:
+            self.complete()
+        return self._matrix[i * self._stride + j]
+
+    def index(self, city: str) -> int:
+        """Return the index of <city>, or -1 if it is not in this map.
+
+        >>> m = MatrixDistanceMap()
+        >>> m.add_distance('Toronto', 'Hamilton', 9)
+        >>> m.index('Hamilton'), m.index('Ottawa')
+        (1, -1)
+        """
+        return self._index.get(city, -1)
+
+    def index_distance(self, i: int, j: int) -> int:
+        """Return the distance from the city with index <i> to the city with
+        index <j>.  Return -1 if distance not stored.
+
+        Precondition: <i> and <j> are indexes of cities in this map.
+
+        >>> m = MatrixDistanceMap()
+        >>> m.add_distance('Toronto', 'Hamilton', 9)
+        >>> m.index_distance(m.index('Toronto'), m.index('Hamilton'))
+        9
+        """
+        if self._stale:
+            self.complete()
+        return self._matrix[i * self._stride + j]
+
+    def cities(self) -> List[str]:
+        """Return the names of the cities in this map, in order of index."""
+        return self._cities[:]
+
+    def route_distances(self, routes: List[List[str]]) -> List[int]:
+        """Return the total distance of each route in <routes>, including
+        the distance from the last city of the route back to its first city.
+        As with distance, each missing distance counts as -1.
+
+        Every route is turned into indexes once, and with NumPy all of the
+        distances are then looked up and summed in one vectorized pass.
+
+        Precondition: no route in <routes> is empty.
+
+        >>> m = MatrixDistanceMap()
+        >>> m.add_distance('Toronto', 'Hamilton', 9)
+        >>> m.add_distance('Hamilton', 'London', 20, 25)
+        >>> m.add_distance('London', 'Toronto', 30)
+        >>> m.route_distances([['Toronto', 'Hamilton', 'London'],
+        ...                    ['Toronto', 'Hamilton']])
+        [59, 18]
+        """
+        if self._stale:
+            self.complete()
+        index = self._index
+        stops = [index.get(city, -1) for route in routes for city in route]
+        if numpy is None:
+            return self._python_route_distances(routes, stops)
+        if not stops:
+            return []
+        lengths = numpy.fromiter((len(route) for route in routes),
+                                 dtype=numpy.intp, count=len(routes))
+        starts = numpy.cumsum(lengths) - lengths
+        ends = starts + lengths - 1
+        here = numpy.array(stops, dtype=numpy.intp)
+        there = numpy.empty_like(here)
+        there[:-1] = here[1:]
+        there[ends] = here[starts]
+        known = (here >= 0) & (there >= 0)
+        matrix = numpy.frombuffer(self._matrix, dtype=_TYPECODE)
+        hops = numpy.full(len(here), -1, dtype=numpy.int64)
+        hops[known] = matrix[here[known] * self._stride + there[known]]
+        return numpy.add.reduceat(hops, starts).tolist()
+
+    def freeze(self) -> 'FrozenDistanceMap':
+        """Return a read-only copy of this map, whose distances are stored
+        in one flat buffer.  See FrozenDistanceMap."""
+        return FrozenDistanceMap.from_buffer(self.to_bytes())
+
+    def _city_names(self) -> List[str]:
+        """Return the names of all of the cities in this map."""
+        return self._cities[:]
+
+    def _row(self, city: str) -> Dict[str, int]:
+        """Return a dictionary that maps each city that has a distance from
+        <city> to that distance."""
+        i = self._index.get(city)
+        if i is None:
+            return {}
+        if self._stale:
+            self.complete()
+        row = self._matrix[i * self._stride:
+                           i * self._stride + len(self._cities)]
+        return {other: d for other, d in zip(self._cities, row) if d >= 0}
+
+    def _python_route_distances(self, routes: List[List[str]],
+                                stops: List[int]) -> List[int]:
+        """Return route_distances(<routes>), given the index of each city in
+        <routes>, one route after another, without using NumPy."""
+        matrix, stride = self._matrix, self._stride
+        distances = []
+        start = 0
+        for route in routes:
+            end = start + len(route)
+            d = 0
+            for k in range(start, end):
+                i, j = stops[k], stops[k + 1 if k + 1 < end else start]
+                d += matrix[i * stride + j] if i >= 0 and j >= 0 else -1
+            distances.append(d)
+            start = end
+        return distances
+
+    def complete(self) -> None:
+        """Replace every distance in this map with the length of the shortest
+        path between the two cities, going through any other cities.  The
+        distance from a city to itself becomes 0.
+
+        The shortest paths are computed once, and looked up in O(1) time
+        afterwards.  If more distances are added later, the shortest paths
+        are computed again the next time a distance is looked up.
+
+        >>> m = MatrixDistanceMap()
+        >>> m.add_distance('Toronto', 'Hamilton', 9)
+        >>> m.add_distance('Hamilton', 'London', 20)
+        >>> m.distance('Toronto', 'London')
+        -1
+        >>> m.complete()
+        >>> m.distance('Toronto', 'London')
+        29
+        >>> m.add_distance('Toronto', 'London', 25)
+        >>> m.distance('London', 'Toronto')
+        25
+        """
+        if self._direct is None:
+            self._direct = self._matrix
+            self._touch()
+        elif not self._stale:
+            return
+        self._matrix = _shortest_paths(self._direct, len(self._cities),
+                                       self._stride)
+        self._stale = False
+
+    def _set(self, loc1: str, loc2: str, d: int) -> None:
+        """Store <d> as the distance from <loc1> to <loc2>."""
+        i = self._add_city(loc1)
+        j = self._add_city(loc2)
+        if self._direct is None:
+            self._matrix[i * self._stride + j] = d
+            self._touch(loc1, loc2)
+        else:
+            # every shortest path may change
+            self._direct[i * self._stride + j] = d
+            self._stale = True
+            self._touch()
+
+    def _add_city(self, city: str) -> int:
+        """Return the index of <city>, adding it to this map if needed."""
+        i = self._index.get(city)
+        if i is not None:
+            return i
+        i = len(self._cities)
+        if i == self._stride:
+            self._resize(max(2 * self._stride, 8))
+        self._index[city] = i
+        self._cities.append(city)
+        if self._direct is not None:
+            # the new city is not connected to the others yet
+            self._stale = True
+        return i
+
+    def _resize(self, stride: int) -> None:
+        """Copy <_matrix> and <_direct> into larger matrices whose rows have
+        length <stride>."""
+        self._matrix = _restride(self._matrix, len(self._cities),
+                                 self._stride, stride)
+        if self._direct is not None:
+            self._direct = _restride(self._direct, len(self._cities),
+                                     self._stride, stride)
+        self._stride = stride
+
+
+class SparseDistanceMap(DistanceMap):
+    """ A distance map for very large road networks.
+
+    The roads are stored in compressed sparse row (CSR) form: compact arrays
+    that list, for each city, the cities it has a road to and how long each
+    road is.  The distance between two cities with a road between them is
+    the length of that road.  The distance between any other two cities is
+    the length of the shortest path between them, found with Dijkstra's
+    algorithm.
+
+    All of the shortest paths from one city form a tree.  The most recently
+    used trees are cached, up to a number of trees and a number of bytes, so
+    looking up several distances from the same city only runs Dijkstra's
+    algorithm once.
+
+       === Private Attributes ===
+       _index: maps the name of each city to its index.
+       _cities: the names of the cities, in order of index.
+       _offsets, _targets, _weights: the roads in CSR form.  The roads out of
+       city i go to cities _targets[_offsets[i]:_offsets[i + 1]], in
+       increasing order of index, and have the same lengths in <_weights>.
+       _added: roads that were added since the CSR arrays were built, as
+       parallel arrays of (source, target, length).
+       _trees: maps the index of a city to the lengths of the shortest paths
+       from it to every city, most recently used last.
+       _max_trees: the largest number of trees that are cached.
+       _max_bytes: the largest number of bytes that cached trees may use.
+
+       === Representation Invariants ===
+       - _index[_cities[i]] == i for every index i
+       - _trees is empty if <_added> is not empty
+       """
+    _index: Dict[str, int]
+    _cities: List[str]
+    _offsets: array
+    _targets: array
+    _weights: array
+    _added: Tuple[array, array, array]
+    _trees: 'OrderedDict[int, array]'
+    _max_trees: int
+    _max_bytes: int
+
+    def __init__(self, max_trees: int = 64,
+                 max_bytes: int = 64 * 1024 * 1024) -> None:
+        """Initialize a distance map with no cities, which caches at most
+        <max_trees> shortest-path trees using at most <max_bytes> bytes.
+
+        >>> m = SparseDistanceMap()
+        >>> m.distance('Toronto', 'Hamilton')
+        -1
+        """
+        self._index = {}
+        self._cities = []
+        self._offsets = array('l', [0])
+        self._targets = array('l')
+        self._weights = array(_TYPECODE)
+        self._added = (array('l'), array('l'), array(_TYPECODE))
+        self._trees = OrderedDict()
+        self._max_trees = max_trees
+        self._max_bytes = max_bytes
+        self._neighbours = {}
+        self._version = 0
+        self._changed = {}
+
+    def add_distance(self, loc1: str, loc2: str, d1: int, d2: int = -1) -> None:
+        """Add distance between <loc1> and <loc2> to this map.
+        Return None.
+
+        >>> m = SparseDistanceMap()
+        >>> m.add_distance('Toronto', 'Hamilton', 9, 10)
+        >>> m.distance('Toronto', 'Hamilton'), m.distance('Hamilton', 'Toronto')
+        (9, 10)
+        """
+        i = self._add_city(loc1)
+        j = self._add_city(loc2)
+        sources, targets, weights = self._added
+        sources.extend((i, j))
+        targets.extend((j, i))
+        weights.extend((d1, d1 if d2 == -1 else d2))
+        self._trees.clear()
+        # every shortest path may change
+        self._touch()
+
+    def distance(self, loc1: str, loc2: str) -> int:
+        """Return the distance from <loc1> to <loc2>: the length of the road
+        between them if there is one, and the length of the shortest path
+        between them otherwise.
+        Return -1 if there is no path.
+
+        >>> m = SparseDistanceMap()
+        >>> m.add_distance('Toronto', 'Hamilton', 9)
+        >>> m.add_distance('Hamilton', 'London', 20)
+        >>> m.distance('Toronto', 'London')
+        29
+        """
+        i = self._index.get(loc1)
+        j = self._index.get(loc2)
+        if i is None or j is None:
+            return -1
+        if self._added[0]:
+            self._build()
+        lo, hi = self._offsets[i], self._offsets[i + 1]
+        e = bisect.bisect_left(self._targets, j, lo, hi)
+        if e < hi and self._targets[e] == j:
+            return self._weights[e]
+        return self._tree(i)[j]
+
+    def _city_names(self) -> List[str]:
+        """Return the names of all of the cities in this map."""
+        return self._cities[:]
+
+    def _row(self, city: str) -> Dict[str, int]:
+        """Return a dictionary that maps each city that has a distance from
+        <city> to that distance."""
+        i = self._index.get(city)
+        if i is None:
+            return {}
+        if self._added[0]:
+            self._build()
+        distances = self._tree(i).tolist()
+        for e in range(self._offsets[i], self._offsets[i + 1]):
+            # roads are used even where a shorter path exists
+            distances[self._targets[e]] = self._weights[e]
+        return {other: d for other, d in zip(self._cities, distances)
+                if d >= 0}
+
+    def _add_city(self, city: str) -> int:
+        """Return the index of <city>, adding it to this map if needed."""
+        i = self._index.get(city)
+        if i is None:
+            i = len(self._cities)
+            self._index[city] = i
+            self._cities.append(city)
+        return i
+
+    def _build(self) -> None:
+        """Merge the roads in <_added> into the CSR arrays."""
+        roads = {}
+        for i in range(len(self._offsets) - 1):
+            for e in range(self._offsets[i], self._offsets[i + 1]):
+                roads[i, self._targets[e]] = self._weights[e]
+        # roads that were added later replace earlier ones
+        roads.update(zip(zip(self._added[0], self._added[1]),
+                         self._added[2]))
+        self._added = (array('l'), array('l'), array(_TYPECODE))
+        self._offsets = array('l', [0]) * (len(self._cities) + 1)
+        self._targets = array('l')
+        self._weights = array(_TYPECODE)
+        for (i, j), d in sorted(roads.items()):
+            self._offsets[i + 1] += 1
+            self._targets.append(j)
+            self._weights.append(d)
+        for i in range(len(self._cities)):
+            self._offsets[i + 1] += self._offsets[i]
+
+    def _tree(self, i: int) -> array:
+        """Return the lengths of the shortest paths from city <i> to every
+        city, from the cache if possible."""
+        tree = self._trees.get(i)
+        if tree is not None:
+            self._trees.move_to_end(i)
+            return tree
+        tree = _dijkstra(self._offsets, self._targets, self._weights, i)
+        self._trees[i] = tree
+        size = tree.itemsize * len(tree)
+        while self._trees and (len(self._trees) > self._max_trees or
+                               size * len(self._trees) > self._max_bytes):
+            self._trees.popitem(last=False)
+        return tree
+
+
+class CoordinateDistanceMap(DistanceMap):
+    """ A distance map that computes distances from the latitude and
+    longitude of each city.
+
+    The distance between two cities is the great-circle distance between
+    them, in kilometres, multiplied by a road factor to account for roads
+    not being straight, and rounded to the nearest integer.  Distances that
+    are added with add_distance take precedence over computed ones.
+
+    Computed distances are kept in a bounded cache, and the distances along
+    many routes can be computed together in one vectorized batch.
+
+       === Private Attributes ===
+       _distance_map: the distances that were added, as in DistanceMap.
+       _index: maps the name of each city with coordinates to its index.
+       _latitudes, _longitudes: the coordinates of each city, in radians,
+       in order of index.
+       _road_factor: the number that great-circle distances are
+       multiplied by.
+       _cache: maps pairs of city indexes to the distance between them,
+       most recently used last.
+       _cache_size: the largest number of distances in <_cache>.
+       """
+    _index: Dict[str, int]
+    _latitudes: array
+    _longitudes: array
+    _road_factor: float
+    _cache: 'OrderedDict[Tuple[int, int], int]'
+    _cache_size: int
+
+    def __init__(self, road_factor: float = 1.0,
+                 cache_size: int = 1 << 16) -> None:
+        """Initialize a distance map with no cities, which multiplies
+        great-circle distances by <road_factor> and caches at most
+        <cache_size> of them.
+
+        >>> m = CoordinateDistanceMap()
+        >>> m.distance('Toronto', 'Hamilton')
+        -1
+        """
+        DistanceMap.__init__(self)
+        self._index = {}
+        self._latitudes = array('d')
+        self._longitudes = array('d')
+        self._road_factor = road_factor
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+
+    def add_city(self, city: str, latitude: float, longitude: float) -> None:
+        """Record that <city> is at <latitude> and <longitude>, in degrees.
+
+        >>> m = CoordinateDistanceMap(road_factor=1.2)
+        >>> m.add_city('Toronto', 43.65, -79.38)
+        >>> m.add_city('Hamilton', 43.26, -79.87)
+        >>> m.distance('Toronto', 'Hamilton')
+        70
+        >>> m.add_distance('Toronto', 'Hamilton', 68)
+        >>> m.distance('Hamilton', 'Toronto')
+        68
+        """
+        i = self._index.get(city)
+        if i is None:
+            self._index[city] = len(self._latitudes)
+            self._latitudes.append(math.radians(latitude))
+            self._longitudes.append(math.radians(longitude))
+        else:
+            self._latitudes[i] = math.radians(latitude)
+            self._longitudes[i] = math.radians(longitude)
+            self._cache.clear()
+        self._touch(city)
+        # <city> may now be among the nearest cities to any city
+        self._neighbours.clear()
+
+    def distance(self, loc1: str, loc2: str) -> int:
+        """Return the distance from <loc1> to <loc2>.
+        Return -1 if distance not stored and either city has no
+        coordinates."""
+        d = DistanceMap.distance(self, loc1, loc2)
+        if d != -1:
+            return d
+        i = self._index.get(loc1)
+        j = self._index.get(loc2)
+        if i is None or j is None:
+            return -1
+        d = self._cache.get((i, j))
+        if d is None:
+            lat, lon = self._latitudes, self._longitudes
+            d = _great_circle(lat[i], lon[i], lat[j], lon[j],
+                              self._road_factor)
+            self._cache[i, j] = d
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end((i, j))
+        return d
+
+    def _city_names(self) -> List[str]:
+        """Return the names of all of the cities in this map."""
+        return list(self._index) + [city for city in self._distance_map
+                                    if city not in self._index]
+
+    def _row(self, city: str) -> Dict[str, int]:
+        """Return a dictionary that maps each city that has a distance from
+        <city> to that distance.
+
+        The distances are computed directly rather than through the cache,
+        so that computing a whole row does not evict it.
+        """
+        distances = {}
+        i = self._index.get(city)
+        if i is not None:
+            lat, lon = self._latitudes, self._longitudes
+            if numpy is None:
+                for other, j in self._index.items():
+                    distances[other] = _great_circle(lat[i], lon[i], lat[j],
+                                                     lon[j], self._road_factor)
+            else:
+                lat = numpy.frombuffer(lat, dtype=float)
+                lon = numpy.frombuffer(lon, dtype=float)
+                # the cities in <_index> are in order of index
+                distances = dict(zip(self._index, _great_circle(
+                    lat, lon, lat[i], lon[i], self._road_factor).tolist()))
+        distances.update(self._distance_map.get(city, {}))
+        return distances
+
+    def route_distances(self, routes: List[List[str]]) -> List[int]:
+        """Return the total distance of each route in <routes>, including
+        the distance from the last city of the route back to its first city.
+        As with distance, each missing distance counts as -1.
+
+        With NumPy, the great-circle distances of all hops are computed in
+        one vectorized pass.
+
+        Precondition: no route in <routes> is empty.
+
+        >>> m = CoordinateDistanceMap()
+        >>> m.add_city('Toronto', 43.65, -79.38)
+        >>> m.add_city('Hamilton', 43.26, -79.87)
+        >>> m.route_distances([['Toronto', 'Hamilton'], ['Toronto']])
+        [118, 0]
+        """
+        if numpy is None or not routes:
+            return DistanceMap.route_distances(self, routes)
+        here = [city for route in routes for city in route]
+        there = [route[k + 1 - len(route)] for route in routes
+                 for k in range(len(route))]
+        index = self._index
+        i = numpy.array([index.get(city, -1) for city in here])
+        j = numpy.array([index.get(city, -1) for city in there])
+        lat = numpy.frombuffer(self._latitudes, dtype=float)
+        lon = numpy.frombuffer(self._longitudes, dtype=float)
+        hops = numpy.full(len(here), -1, dtype=numpy.int64)
+        known = (i >= 0) & (j >= 0)
+        i, j = i[known], j[known]
+        hops[known] = _great_circle(lat[i], lon[i], lat[j], lon[j],
+                                    self._road_factor)
+        if self._distance_map:
+            for k, city in enumerate(here):
+                d = DistanceMap.distance(self, city, there[k])
+                if d != -1:
+                    hops[k] = d
+        lengths = numpy.fromiter((len(route) for route in routes),
+                                 dtype=numpy.intp, count=len(routes))
+        return numpy.add.reduceat(hops, numpy.cumsum(lengths) - lengths
+                                  ).tolist()
+
+
+class FrozenDistanceMap(MatrixDistanceMap):
+    """ A read-only distance map, whose distances are stored in one flat
+    buffer in the format of MatrixDistanceMap.to_bytes.
+
+    Looking up a distance only reads the buffer, so a frozen map can be
+    read from several threads at once.  The buffer can be placed in shared
+    memory and attached to by other processes without copying it, and
+    after a fork, reading the map does not touch the reference counts of
+    objects in the buffer, so its pages stay shared.
+
+    A frozen map is pickled as the name of its shared memory block if it
+    has one, and as its bytes otherwise, so it can be sent to the workers
+    of a multiprocessing pool.
+
+       === Private Attributes ===
+       _memory: the shared memory block that holds the buffer, or None if
+       the buffer is not in shared memory.  This keeps the block open for
+       as long as the map is in use.
+       """
+    _memory: Optional[shared_memory.SharedMemory]
+
+    def __init__(self) -> None:
+        """Initialize a frozen distance map with no cities.
+
+        Use freeze, from_buffer or attach to make a frozen map with cities.
+        """
+        MatrixDistanceMap.__init__(self)
+        self._memory = None
+
+    def __reduce__(self) -> Tuple[Any, Tuple[Any]]:
+        """Return how to pickle this map."""
+        if self._memory is not None:
+            return FrozenDistanceMap.attach, (self._memory.name,)
+        return FrozenDistanceMap.from_buffer, (self.to_bytes(),)
+
+    @classmethod
+    def attach(cls, name: str) -> 'FrozenDistanceMap':
+        """Return the frozen map in the shared memory block called <name>.
+
+        Precondition: the block was made by to_shared_memory, and is still
+        open in some process.
+        """
+        memory = shared_memory.SharedMemory(name=name)
+        # the block may have been rounded up to a whole number of pages
+        frozen = cls.from_buffer(memory.buf[:_map_size(memory.buf)])
+        frozen._memory = memory
+        return frozen
+
+    def to_shared_memory(self) -> shared_memory.SharedMemory:
+        """Return a new shared memory block holding this map, which any
+        process can attach to by the name of the block.
+
+        The caller owns the block, and must close and unlink it once no
+        process needs the map any more.
+
+        >>> m = DistanceMap()
+        >>> m.add_distance('Toronto', 'Hamilton', 9, 10)
+        >>> memory = m.freeze().to_shared_memory()
+        >>> FrozenDistanceMap.attach(memory.name).distance('Hamilton',
+        ...                                                'Toronto')
+        10
+        >>> memory.close()
+        >>> memory.unlink()
+        """
+        data = self.to_bytes()
+        memory = shared_memory.SharedMemory(create=True, size=len(data))
+        memory.buf[:len(data)] = data
+        return memory
+
+    def freeze(self) -> 'FrozenDistanceMap':
+        """Return this map, which is already frozen."""
+        return self
+
+    def add_distance(self, loc1: str, loc2: str, d1: int, d2: int = -1) -> None:
+        """Raise a TypeError, since a frozen map cannot be changed.
+
+        >>> m = DistanceMap().freeze()
+        >>> m.add_distance('Toronto', 'Hamilton', 9)
+        Traceback (most recent call last):
+        ...
+        TypeError: a frozen distance map cannot be changed
+        """
+        raise TypeError('a frozen distance map cannot be changed')
+
+    def complete(self) -> None:
+        """Raise a TypeError, since a frozen map cannot be changed.  Freeze
+        a map after completing it instead."""
+        raise TypeError('a frozen distance map cannot be changed')
+
+
+def _map_size(view: memoryview) -> int:
+    """Return the size in bytes of the binary distance map at the start of
+    <view>, according to its header.
+
+    Raise a ValueError if <view> does not start with the header of a map.
+    """
+    if len(view) < _HEADER.size:
+        raise ValueError('truncated binary distance map')
+    magic, version, n, offset = _HEADER.unpack_from(view)
+    if magic != MAGIC or version != _VERSION:
+        raise ValueError('not a binary distance map')
+    return offset + n * n * array(_TYPECODE).itemsize
+
+
+def _restride(matrix: array, n: int, old: int, new: int) -> array:
+    """Return a copy of the first <n> rows and columns of <matrix>, whose rows
+    have length <old>, as a matrix whose rows have length <new>.  Any new
+    entries are -1.
+    """
+    if not isinstance(matrix, array):
+        # a view of a buffer, such as a memory-mapped file
+        matrix = array(_TYPECODE, matrix.tobytes())
+    result = array(_TYPECODE, [-1]) * (new * new)
+    for i in range(n):
+        result[i * new:i * new + n] = matrix[i * old:i * old + n]
+    return result
+
+
+def _shortest_paths(matrix: array, n: int, stride: int) -> array:
+    """Return a matrix laid out like <matrix> whose entries are the lengths
+    of the shortest paths between the first <n> cities of <matrix>, or -1
+    where there is no path.
+
+    >>> m = array(_TYPECODE, [-1, 4, -1, -1, -1, 3, 1, -1, -1])
+    >>> list(_shortest_paths(m, 3, 3))
+    [0, 4, 7, 4, 0, 3, 1, 5, 0]
+    """
+    if numpy is not None:
+        # Floyd-Warshall, one vectorized relaxation for each city
+        dist = numpy.frombuffer(matrix, dtype=_TYPECODE).reshape(
+            stride, stride)[:n, :n].astype(float)
+        dist[dist < 0] = numpy.inf
+        numpy.fill_diagonal(dist, 0)
+        for k in range(n):
+            numpy.minimum(dist, dist[:, k, None] + dist[None, k, :], out=dist)
+        dist[numpy.isinf(dist)] = -1
+        result = numpy.full((stride, stride), -1, dtype=_TYPECODE)
+        result[:n, :n] = dist
+        return array(_TYPECODE, result.tobytes())
+    # otherwise, Dijkstra's algorithm from each city, over the roads
+    offsets, targets, weights = _csr(matrix, n, stride)
+    result = array(_TYPECODE, [-1]) * (stride * stride)
+    for i in range(n):
+        result[i * stride:i * stride + n] = _dijkstra(offsets, targets,
+                                                      weights, i)
+    return result
+
+
+def _csr(matrix: array, n: int, stride: int) -> Tuple[array, array, array]:
+    """Return the non-negative entries of <matrix> in compressed sparse row
+    form: arrays (offsets, targets, weights) such that the roads out of city
+    i go to targets[offsets[i]:offsets[i + 1]], with the same weights.
+    """
+    offsets = array('l', [0])
+    targets = array('l')
+    weights = array(_TYPECODE)
+    for i in range(n):
+        row = i * stride
+        for j in range(n):
+            d = matrix[row + j]
+            if d >= 0 and i != j:
+                targets.append(j)
+                weights.append(d)
+        offsets.append(len(targets))
+    return offsets, targets, weights
+
+
+def _dijkstra(offsets: array, targets: array, weights: array,
+              source: int) -> array:
+    """Return the lengths of the shortest paths from <source> to every city
+    of the graph (offsets, targets, weights), in compressed sparse row form,
+    or -1 for cities with no path.
+    """
+    dist = array(_TYPECODE, [-1]) * (len(offsets) - 1)
+    dist[source] = 0
+    heap = [(0, source)]
+    while heap:
+        d, i = heapq.heappop(heap)
+        if d > dist[i]:
+            continue
+        for e in range(offsets[i], offsets[i + 1]):
+            j = targets[e]
+            new = d + weights[e]
+            if dist[j] < 0 or new < dist[j]:
+                dist[j] = new
+                heapq.heappush(heap, (new, j))
+    return dist
+
+
+def _great_circle(lat1: Any, lon1: Any, lat2: Any, lon2: Any,
+                  road_factor: float) -> Any:
+    """Return the great-circle distance in kilometres between the points at
+    (<lat1>, <lon1>) and (<lat2>, <lon2>), in radians, multiplied by
+    <road_factor> and rounded to the nearest integer.  The coordinates may
+    be floats, or NumPy arrays of the same shape.
+
+    >>> _great_circle(0.0, 0.0, 0.0, math.pi, 1.0)
+    20015
+    """
+    if numpy is not None and isinstance(lat1, numpy.ndarray):
+        a = numpy.sin((lat2 - lat1) / 2) ** 2 + numpy.cos(lat1) * \
+            numpy.cos(lat2) * numpy.sin((lon2 - lon1) / 2) ** 2
+        d = 2 * _EARTH_RADIUS * numpy.arcsin(numpy.sqrt(numpy.minimum(a, 1)))
+        return numpy.rint(d * road_factor).astype(numpy.int64)
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * \
+        math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    d = 2 * _EARTH_RADIUS * math.asin(math.sqrt(min(a, 1)))
+    return int(round(d * road_factor))
+
 
 if __name__ == '__main__':
     import python_ta
 
     python_ta.check_all(config={
-        'allowed-import-modules': ['doctest', 'python_ta', 'typing'],
+        'allowed-import-modules': ['doctest', 'python_ta', 'typing', 'array',
+                                   'bisect', 'collections', 'heapq',
+                                   'math', 'multiprocessing', 'numpy',
+                                   'struct', 'sys'],
         'disable': ['E1136'],
         'max-attributes': 15,
     })
@@ -19,10 +19,21 @@ Sophia Huynh, Maryam Majedi, and Jaisie Sin.
 
 This module contains the classes required to represent the entities
 in the simulation: Parcel, Truck and Fleet.
+
+ParcelTable stores many parcels column by column, for batches too large to
+keep one Parcel object per parcel.
 """
-from typing import List, Dict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, \
+    Sequence, Set, Tuple, Union
+from array import array
+from weakref import WeakSet
 from distance_map import DistanceMap
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class Parcel:
     # It must be consistent with the Fleet class docstring examples below.
@@ -39,6 +50,8 @@ class Parcel:
     - _volume is a positive integer.
     - No parcels have the depot as destination
     """
+    # Parcels are created by the million, so they have no __dict__.
+    __slots__ = ('_id', '_source', '_destination', '_volume')
     _id: int
     _source: str
     _destination: str
@@ -78,6 +91,211 @@ class Parcel:
         return self._volume
 
 
+class ParcelTable:
+    """ A table of parcels, stored column by column.
+
+    Instead of one Parcel object for each parcel, the ids, volumes, sources
+    and destinations of all of the parcels are kept in parallel arrays of
+    ints.  Each city name is stored once, and the sources and destinations
+    refer to it by an integer code.
+
+    Slicing a table gives a table that shares its arrays, without copying
+    them.  Indexing or iterating over a table gives Parcel objects, which
+    are only created when they are needed.
+
+    >>> table = ParcelTable()
+    >>> table.append(1, 5, 'Toronto', 'Hamilton')
+    >>> table.append(2, 3, 'Toronto', 'London')
+    >>> table.append(3, 8, 'Hamilton', 'Barrie')
+    >>> len(table), table[1].get_destination()
+    (3, 'London')
+    >>> [p.get_id() for p in table.sorted_by('volume', reverse=True)]
+    [3, 1, 2]
+    >>> [p.get_id() for p in table[1:].sorted_by('destination')]
+    [3, 2]
+
+    === Private Attributes ===
+    _ids: the id of each parcel, in order.
+    _volumes: the volume of each parcel, in order.
+    _sources: the code of the source city of each parcel, in order.
+    _destinations: the code of the destination city of each parcel, in
+    order.
+    _cities: the name of the city with each code.  This list is shared by
+    every table that was sliced or sorted from the same table.
+    _codes: maps the name of each city to its code, and is shared like
+    <_cities>.
+
+    === Representation Invariants ===
+    - _ids, _volumes, _sources and _destinations have the same length.
+    - _codes[_cities[c]] == c for every code c.
+    - the columns are arrays, unless this table was sliced from another.
+    """
+    _ids: Union[array, memoryview]
+    _volumes: Union[array, memoryview]
+    _sources: Union[array, memoryview]
+    _destinations: Union[array, memoryview]
+    _cities: List[str]
+    _codes: Dict[str, int]
+
+    def __init__(self) -> None:
+        """Initialize an empty table."""
+        self._ids = array('q')
+        self._volumes = array('i')
+        self._sources = array('i')
+        self._destinations = array('i')
+        self._cities = []
+        self._codes = {}
+
+    @classmethod
+    def from_parcels(cls, parcels: Iterable[Parcel]) -> 'ParcelTable':
+        """Return a new table holding <parcels>, in order."""
+        table = cls()
+        for p in parcels:
+            table.append(p.get_id(), p.get_volume(), p.get_source(),
+                         p.get_destination())
+        return table
+
+    def append(self, id_: int, volume: int, source: str, d: str) -> None:
+        """Add the parcel with id <id_>, <volume>, <source> and destination
+        <d> to the end of this table.
+
+        Raise a BufferError, and leave this table unchanged, if a slice of
+        this table or a view returned by ids, volumes, source_codes or
+        destination_codes is still in use, since arrays cannot grow while
+        they are viewed.
+
+        Precondition: this table was not sliced from another table.
+        """
+        columns = self._columns()
+        values = [id_, volume, self._code(source), self._code(d)]
+        appended = 0
+        try:
+            for column, value in zip(columns, values):
+                column.append(value)
+                appended += 1
+        except BufferError:
+            for column in columns[:appended]:
+                column.pop()
+            raise
+
+    def __len__(self) -> int:
+        """Return the number of parcels in this table."""
+        return len(self._ids)
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[Parcel,
+                                                         'ParcelTable']:
+        """Return the parcel at index <i>, or if <i> is a slice, a table of
+        the parcels in it that shares the arrays of this table."""
+        if isinstance(i, slice):
+            return self._with_columns([memoryview(column)[i] for column in
+                                       self._columns()])
+        cities = self._cities
+        return Parcel(self._ids[i], self._volumes[i],
+                      cities[self._sources[i]], cities[self._destinations[i]])
+
+    def __iter__(self) -> Iterator[Parcel]:
+        """Return an iterator over the parcels in this table, in order."""
+        cities = self._cities
+        for id_, volume, source, d in zip(*self._columns()):
+            yield Parcel(id_, volume, cities[source], cities[d])
+
+    def ids(self) -> memoryview:
+        """Return a read-only view of the ids of the parcels.  No parcels
+        can be appended to this table until the view is released."""
+        return memoryview(self._ids).toreadonly()
+
+    def volumes(self) -> memoryview:
+        """Return a read-only view of the volumes of the parcels.  No
+        parcels can be appended to this table until the view is released."""
+        return memoryview(self._volumes).toreadonly()
+
+    def source_codes(self) -> memoryview:
+        """Return a read-only view of the codes of the source cities of the
+        parcels.  No parcels can be appended to this table until the view
+        is released."""
+        return memoryview(self._sources).toreadonly()
+
+    def destination_codes(self) -> memoryview:
+        """Return a read-only view of the codes of the destination cities of
+        the parcels.  No parcels can be appended to this table until the
+        view is released."""
+        return memoryview(self._destinations).toreadonly()
+
+    def cities(self) -> List[str]:
+        """Return the name of the city with each code."""
+        return self._cities[:]
+
+    def take(self, rows: Sequence[int]) -> 'ParcelTable':
+        """Return a new table of the parcels at the indexes in <rows>, in
+        that order.  This can be used to filter or reorder a table.
+
+        >>> table = ParcelTable()
+        >>> table.append(1, 5, 'Toronto', 'Hamilton')
+        >>> table.append(2, 3, 'Toronto', 'London')
+        >>> [p.get_id() for p in table.take([1, 1, 0])]
+        [2, 2, 1]
+        """
+        if numpy is None:
+            return self._with_columns([array(_typecode(column),
+                                             [column[i] for i in rows])
+                                       for column in self._columns()])
+        rows = numpy.asarray(rows, dtype=numpy.intp)
+        return self._with_columns([
+            array(_typecode(column), numpy.asarray(column)[rows].tobytes())
+            for column in self._columns()])
+
+    def sorted_by(self, priority: str, reverse: bool = False) -> 'ParcelTable':
+        """Return a new table of the parcels in this table sorted by volume
+        if <priority> is 'volume', or by the name of their destination if it
+        is 'destination'.  If <reverse> is True, the largest come first.
+        Parcels that tie stay in the order they are in this table.
+
+        With NumPy, the parcels are sorted in one vectorized pass.
+
+        Precondition: <priority> is 'volume' or 'destination'.
+        """
+        if priority == 'volume':
+            keys = self._volumes
+        else:
+            # destinations sort by name, so codes are sorted by name first
+            by_name = sorted(range(len(self._cities)),
+                             key=self._cities.__getitem__)
+            rank = array('i', [0]) * len(by_name)
+            for r, code in enumerate(by_name):
+                rank[code] = r
+            keys = [rank[code] for code in self._destinations]
+        if numpy is None:
+            rows = sorted(range(len(keys)), key=keys.__getitem__,
+                          reverse=reverse)
+        else:
+            keys = numpy.asarray(keys, dtype=numpy.int64)
+            rows = numpy.argsort(-keys if reverse else keys, kind='stable')
+        return self.take(rows)
+
+    def _code(self, city: str) -> int:
+        """Return the code of <city>, giving it a new code if needed."""
+        code = self._codes.get(city)
+        if code is None:
+            code = len(self._cities)
+            self._codes[city] = code
+            self._cities.append(city)
+        return code
+
+    def _columns(self) -> List[Union[array, memoryview]]:
+        """Return the ids, volumes, sources and destinations columns."""
+        return [self._ids, self._volumes, self._sources, self._destinations]
+
+    def _with_columns(self, columns: List[Any]) -> 'ParcelTable':
+        """Return a new table with <columns> as its ids, volumes, sources and
+        destinations, and the same cities as this table."""
+        table = ParcelTable()
+        table._ids, table._volumes, table._sources, table._destinations = \
+            columns
+        table._cities = self._cities
+        table._codes = self._codes
+        return table
+
+
 class Truck:
     # It must be consistent with the Fleet class docstring examples below.
     """ A truck that stores parcel.
@@ -85,34 +303,62 @@ class Truck:
     === Private Attributes ===
     _id: ID of a truck.
     _capacity: _volume _capacity of a truck.
-    # _load: current truck load of parcels (0 if no load)
+    _load: current truck load of parcels (0 if no load)
     _depot: the _depot of the truck.
     _parcels: _parcels stored in this truck.
     _routes: _routes of a truck.
+    _route_memo: None, or the distance map that the distance of <_routes>
+    was last computed with, the version of that map when it was computed,
+    and the distance.
+    _fleets: the fleets this truck is in, which are told whenever it is
+    packed or unpacked, and are checked for duplicate parcels.  The fleets
+    are held weakly, so a fleet that is no longer used elsewhere is
+    dropped, and stops checking the packs of this truck.  A fleet also
+    drops a truck that it finds is no longer in its trucks.
+    _stops: maps each city in <_routes> other than the _depot to the number
+    of parcels in <_parcels> going there.
+    _parcel_ids: the IDs of the parcels in <_parcels>.
+    _visits: maps each city in <_routes> other than the first to the
+    positions in <_routes> where it is, in increasing order.
 
     === Representation Invariants ===
     - each truck has a unique ID.
     - _capacity is a positive integer.
+    - _load is the total volume of the parcels in <_parcels>.
+    - no two cities next to each other in <_routes> are the same.
     - All parcels have been shipped from their source city to the depot
     - No parcels have the depot as destination
     """
+    __slots__ = ('_id', '_capacity', '_load', '_depot', '_parcels',
+                 '_routes', '_route_memo', '_fleets', '_stops',
+                 '_parcel_ids', '_visits')
     _id: int
     _capacity: int
-    # _load: int
+    _load: int
     _depot: str
     _parcels: List[Parcel]
     _routes: List[str]
+    _route_memo: Optional[Tuple[DistanceMap, int, int]]
+    _fleets: WeakSet
+    _stops: Dict[str, int]
+    _parcel_ids: Set[int]
+    _visits: Dict[str, List[int]]
 
     def __init__(self, id_: int, capacity: int, depot: str) -> None:
         """Initialize this truck.
 
         Precondition: <_capacity> is positive."""
         self._id = id_
-        # self._load = 0
+        self._load = 0
         self._capacity = capacity
         self._depot = depot
         self._parcels = []
         self._routes = [depot]
+        self._route_memo = None
+        self._fleets = WeakSet()
+        self._stops = {}
+        self._parcel_ids = set()
+        self._visits = {}
 
     def __str__(self) -> str:
         """Return a string representing this Truck."""
@@ -130,9 +376,20 @@ class Truck:
         """Return the <_capacity> of this Truck"""
         return self._capacity
 
-    # def get_load(self) -> int:
-    #     """Return the <_load> of this Truck"""
-    #     return self._load
+    def get_load(self) -> int:
+        """Return the <_load> of this Truck"""
+        return self._load
+
+    def available_space(self) -> int:
+        """Return the volume that can still be packed onto this Truck
+
+        >>> t = Truck(1423, 10, 'Toronto')
+        >>> t.pack(Parcel(1, 4, 'Toronto', 'Hamilton'))
+        True
+        >>> t.available_space()
+        6
+        """
+        return self._capacity - self._load
 
     def get_depot(self) -> str:
         """Return the <_depot> of this Truck"""
@@ -148,42 +405,230 @@ class Truck:
 
     def total_volume(self) -> int:
         """Return the total _volume of _parcels in <self._parcels>"""
-        v = 0
-        for p in self._parcels:
-            v += p.get_volume()
-        return v
+        return self._load
+
+    def num_parcels_to(self, city: str) -> int:
+        """Return the number of parcels on this Truck going to <city>.
+
+        >>> t = Truck(1423, 10, 'Toronto')
+        >>> t.pack(Parcel(1, 2, 'Toronto', 'Hamilton'))
+        True
+        >>> t.num_parcels_to('Hamilton'), t.num_parcels_to('London')
+        (1, 0)
+        """
+        return self._stops.get(city, 0)
+
+    def stop_positions(self, city: str) -> List[int]:
+        """Return the positions in <self._routes>, after the first, where
+        this Truck stops at <city>, in increasing order.
+
+        >>> t = Truck(1423, 10, 'Toronto')
+        >>> for i, city in enumerate(['Hamilton', 'London', 'Hamilton']):
+        ...     t.pack(Parcel(i, 1, 'Toronto', city))
+        True
+        True
+        True
+        >>> t.stop_positions('Hamilton'), t.stop_positions('Barrie')
+        ([1, 3], [])
+        """
+        return self._visits.get(city, [])[:]
+
+    def _index_routes(self) -> None:
+        """Recompute <self._visits> from <self._routes>."""
+        visits = {}
+        for i in range(1, len(self._routes)):
+            visits.setdefault(self._routes[i], []).append(i)
+        self._visits = visits
 
     def pack(self, p: Parcel) -> bool:
         """Pack <p> to <self._parcels>, update <self._routes> if possible.
 
-        Precondition: No parcel with the same ID as <p> has already been
-        added to this truck.
-
-        - If <p> has the same ID as a parcel in <self._parcels> do not pack it.
+        - If <p> has the same ID as a parcel in <self._parcels>, or on any
+        truck in a fleet this truck is in, do not pack it.
         - If by packing <p> the total _volume of _parcels exceed the _capacity
         of this truck do not pack <p>.
         - If the last _destination of the _routes is the same as the
         _destination of <p>, pack the package but not update the _routes.
 
         Return True if packed successfully; return False otherwise.
-        """
-        # Piazza @1130: You may assume parcel IDs are unique (i.e. we won't try
-        # to pack the same parcel onto your Truck twice in our tests).
 
-        # for parcel in self._parcels:
-        #     if p._id == parcel._id:
-        #         return False
-
-        if p.get_volume() + self.total_volume() > self._capacity:
+        >>> f = Fleet()
+        >>> t1 = Truck(1423, 10, 'Toronto')
+        >>> t2 = Truck(1333, 10, 'Toronto')
+        >>> f.add_truck(t1)
+        >>> f.add_truck(t2)
+        >>> t1.pack(Parcel(1, 5, 'Toronto', 'Hamilton'))
+        True
+        >>> t2.pack(Parcel(1, 5, 'Toronto', 'Hamilton'))
+        False
+        """
+        # duplicates are found with sets rather than by scanning parcels
+        pid = p.get_id()
+        # a fleet may drop this truck from <self._fleets> while it is checked
+        if pid in self._parcel_ids or \
+                any(fleet._has_parcel(pid) for fleet in list(self._fleets)):
+            return False
+        if p.get_volume() + self._load > self._capacity:
             return False
 
+        old_load, was_empty = self._load, not self._parcels
+        old_end = self._routes[-1]
         self._parcels.append(p)
-        # self._load += p.get_volume()
-        if self._routes[-1] != p.get_destination():
+        self._load += p.get_volume()
+        d = p.get_destination()
+        self._stops[d] = self._stops.get(d, 0) + 1
+        route_added = self._routes[-1] != d
+        if route_added:
             # if the last location in _routes is not the same
-            self._routes.append(p.get_destination())
+            self._routes.append(d)
+            self._visits.setdefault(d, []).append(len(self._routes) - 1)
+            self._route_memo = None
+        self._parcel_ids.add(pid)
+        self._notify(old_load, was_empty, old_end,
+                     (self._undo_pack, (p, route_added)), p, True)
         return True
 
+    def unpack(self, p: Parcel) -> bool:
+        """Remove <p> from <self._parcels>.
+
+        If no other parcel on this truck goes to the destination of <p>,
+        that city is also removed from <self._routes>, and any stops on
+        either side of it that are now the same city are merged into one.
+
+        Return True if unpacked successfully; return False if <p> is not on
+        this truck.
+
+        >>> t = Truck(1423, 10, 'Toronto')
+        >>> p1 = Parcel(1, 2, 'Toronto', 'Hamilton')
+        >>> p2 = Parcel(2, 3, 'Toronto', 'London')
+        >>> p3 = Parcel(3, 4, 'Toronto', 'Hamilton')
+        >>> t.pack(p1) and t.pack(p2) and t.pack(p3)
+        True
+        >>> t.get_routes()
+        ['Toronto', 'Hamilton', 'London', 'Hamilton']
+        >>> t.unpack(p2)
+        True
+        >>> t.get_routes(), t.get_load()
+        (['Toronto', 'Hamilton'], 6)
+        >>> t.unpack(p2)
+        False
+        """
+        for i in range(len(self._parcels) - 1, -1, -1):
+            if self._parcels[i] is p:
+                break
+        else:
+            return False
+        old_load, old_end = self._load, self._routes[-1]
+        self._parcels.pop(i)
+        self._parcel_ids.discard(p.get_id())
+        self._load -= p.get_volume()
+        d = p.get_destination()
+        self._stops[d] -= 1
+        old_routes = None
+        if self._stops[d] == 0:
+            del self._stops[d]
+            old_routes = self._routes[:]
+            routes = [self._depot]
+            for city in old_routes[1:]:
+                if city != d and city != routes[-1]:
+                    routes.append(city)
+            self._routes[:] = routes
+            self._index_routes()
+            self._route_memo = None
+        self._notify(old_load, False, old_end,
+                     (self._undo_unpack, (p, i, old_routes)), p, False)
+        return True
+
+    def reorder_route(self, routes: List[str]) -> None:
+        """Replace <self._routes> with <routes>, which visits the same cities
+        in a different order.
+
+        Raise a ValueError if <routes> does not start at the _depot, does
+        not visit exactly the destinations of the parcels on this truck, or
+        has the same city twice in a row.
+
+        >>> t = Truck(1423, 10, 'Toronto')
+        >>> t.pack(Parcel(1, 2, 'Toronto', 'Hamilton'))
+        True
+        >>> t.pack(Parcel(2, 3, 'Toronto', 'London'))
+        True
+        >>> t.reorder_route(['Toronto', 'London', 'Hamilton'])
+        >>> t.get_routes()
+        ['Toronto', 'London', 'Hamilton']
+        """
+        if not routes or routes[0] != self._depot or \
+                set(routes[1:]) != set(self._stops) or \
+                any(a == b for a, b in zip(routes, routes[1:])):
+            raise ValueError('not a route for the parcels on this truck')
+        old_routes, old_end = self._routes[:], self._routes[-1]
+        self._routes[:] = routes
+        self._index_routes()
+        self._route_memo = None
+        self._notify(self._load, not self._parcels, old_end,
+                     (self._undo_reorder, (old_routes,)))
+
+    def _undo_reorder(self, old_routes: List[str]) -> None:
+        """Undo reordering the routes of this truck, which were
+        <old_routes> before."""
+        old_end = self._routes[-1]
+        self._routes[:] = old_routes
+        self._index_routes()
+        self._route_memo = None
+        self._notify(self._load, not self._parcels, old_end, None)
+
+    def _undo_pack(self, p: Parcel, route_added: bool) -> None:
+        """Undo packing <p>, which was the last parcel packed.  <route_added>
+        is True iff packing it added its destination to <self._routes>."""
+        old_load, old_end = self._load, self._routes[-1]
+        self._parcels.pop()
+        self._parcel_ids.discard(p.get_id())
+        self._load -= p.get_volume()
+        d = p.get_destination()
+        self._stops[d] -= 1
+        if self._stops[d] == 0:
+            del self._stops[d]
+        if route_added:
+            self._routes.pop()
+            visits = self._visits[d]
+            visits.pop()
+            if not visits:
+                del self._visits[d]
+            self._route_memo = None
+        self._notify(old_load, False, old_end, None, p, False)
+
+    def _undo_unpack(self, p: Parcel, i: int,
+                     old_routes: Optional[List[str]]) -> None:
+        """Undo unpacking <p>, which was at index <i> of <self._parcels>.
+        <old_routes> is the _routes before unpacking it, or None if they
+        did not change."""
+        old_load, was_empty = self._load, not self._parcels
+        old_end = self._routes[-1]
+        self._parcels.insert(i, p)
+        self._parcel_ids.add(p.get_id())
+        self._load += p.get_volume()
+        d = p.get_destination()
+        self._stops[d] = self._stops.get(d, 0) + 1
+        if old_routes is not None:
+            self._routes[:] = old_routes
+            self._index_routes()
+            self._route_memo = None
+        self._notify(old_load, was_empty, old_end, None, p, True)
+
+    def _notify(self, old_load: int, was_empty: bool, old_end: str,
+                undo: Optional[Tuple[Callable[..., None], tuple]],
+                p: Optional[Parcel] = None, packed: bool = False) -> None:
+        """Tell the fleets of this truck that it was just changed: that <p>
+        was packed onto it if <packed> is True, or unpacked from it
+        otherwise, or that only its routes changed if <p> is None.  The
+        truck had <old_load> and its routes ended at <old_end> before, and
+        <was_empty> is True iff it was empty.  <undo> is a method and its
+        arguments that undo the change, or None if the change was itself an
+        undo."""
+        for fleet in self._fleets:
+            fleet._truck_changed(self, old_load, was_empty, old_end, undo)
+            if p is not None:
+                fleet._parcel_moved(self, p, packed)
+
     # def is_full(self) -> bool:
     #     """Return whether this truck is full"""
     #     return self._load == self._capacity
@@ -191,10 +636,7 @@ class Truck:
     def fullness(self) -> float:
         """Return the percentage fullness of the truck
         """
-        load = 0
-        for p in self._parcels:
-            load += p.get_volume()
-        return load / self._capacity * 100
+        return self._load / self._capacity * 100
 
     def is_empty(self) -> bool:
         """Return True if this truck is empty.
@@ -205,8 +647,25 @@ class Truck:
     def route_distance(self, d_map: DistanceMap) -> int:
         """Return the total distance of the _routes of this truck.
         Including the distance between last location and the _depot.
-        """
 
+        The distance is remembered, and only computed again once the routes
+        change or <d_map> changes a distance to or from a city on them.
+
+        >>> t = Truck(1423, 10, 'Toronto')
+        >>> t.pack(Parcel(1, 5, 'Toronto', 'Hamilton'))
+        True
+        >>> m = DistanceMap()
+        >>> m.add_distance('Toronto', 'Hamilton', 9)
+        >>> t.route_distance(m)
+        18
+        >>> m.add_distance('Toronto', 'Hamilton', 10)
+        >>> t.route_distance(m)
+        20
+        """
+        d = self._memoized_distance(d_map)
+        if d is not None:
+            return d
+        version = d_map.get_version()
         d = 0
         loc = 0
         p_lst = self._routes
@@ -214,17 +673,92 @@ class Truck:
             # distance between the last loc and curr loc
             d += d_map.distance(p_lst[loc], p_lst[loc + 1])
             loc += 1
-        return d + d_map.distance(p_lst[-1], self._depot)
+        d += d_map.distance(p_lst[-1], self._depot)
+        self._route_memo = (d_map, version, d)
+        return d
+
+    def _memoized_distance(self, d_map: DistanceMap) -> Optional[int]:
+        """Return the remembered distance of the _routes of this truck
+        according to <d_map>, or None if it must be computed again."""
+        memo = self._route_memo
+        if memo is None or memo[0] is not d_map or \
+                d_map.changed_since(memo[1], self._routes):
+            return None
+        return memo[2]
 
 
 class Fleet:
     """ A fleet of trucks for making deliveries.
 
+    The fleet keeps its statistics up to date as trucks are added and
+    packed, so reading them takes O(1) time instead of a pass over every
+    truck.
+
     ===== Public Attributes =====
     trucks:
       List of all Truck objects in this fleet.
+
+    === Private Attributes ===
+    _synced:
+      The list that <trucks> was when the statistics below were computed.
+    _count:
+      The number of trucks in <trucks> that the statistics below include.
+    _nonempty:
+      The number of non-empty trucks.
+    _unused_space:
+      The total available space in the non-empty trucks.
+    _loads:
+      Maps each truck capacity to the total load of the trucks with that
+      capacity.
+    _travel_map:
+      The distance map that <_travelled> was computed with, or None.
+    _travel_version:
+      The version of <_travel_map> when <_travelled> was computed.
+    _travelled:
+      Maps the id of each truck to the distance it travels.
+    _travel_total:
+      The sum of the distances in <_travelled>.
+    _dirty:
+      Maps the id of each truck that was packed since <_travelled> was
+      computed to that truck.
+    _by_id:
+      Maps the ID of each truck to that truck.
+    _by_depot:
+      Maps each depot to the trucks at that depot, in the order they were
+      added.
+    _by_route_end:
+      Maps each city to the trucks whose routes currently end there, keyed
+      by id(truck), in the order they came to end there.
+    _log:
+      None if there is no checkpoint, because checkpoint has never been
+      called or release was called after it.  Otherwise, how to undo each
+      change to the trucks since the last checkpoint, oldest first.
+    _parcels:
+      Maps the ID of each parcel on a truck in this fleet to that truck.
+
+    === Representation Invariants ===
+    - <trucks> is only changed with add_truck, by appending to it, or by
+      replacing it with another list.
+    - _travelled is correct for every truck that is not in <_dirty>,
+      while <_travel_map> is still at <_travel_version>.
+    - no list or dictionary in <_by_depot> or <_by_route_end> is empty.
     """
     trucks: List[Truck]
+    _synced: List[Truck]
+    _count: int
+    _nonempty: int
+    _unused_space: int
+    _loads: Dict[int, int]
+    _travel_map: Optional[DistanceMap]
+    _travel_version: int
+    _travelled: Dict[int, int]
+    _travel_total: int
+    _dirty: Dict[int, Truck]
+    _by_id: Dict[int, Truck]
+    _by_depot: Dict[str, List[Truck]]
+    _by_route_end: Dict[str, Dict[int, Truck]]
+    _log: Optional[List[Tuple[Callable[..., None], tuple]]]
+    _parcels: Dict[int, Truck]
 
     def __init__(self) -> None:
         """Create a Fleet with no trucks.
@@ -234,6 +768,21 @@ class Fleet:
         0
         """
         self.trucks = []
+        self._synced = self.trucks
+        self._count = 0
+        self._nonempty = 0
+        self._unused_space = 0
+        self._loads = {}
+        self._travel_map = None
+        self._travel_version = 0
+        self._travelled = {}
+        self._travel_total = 0
+        self._dirty = {}
+        self._by_id = {}
+        self._by_depot = {}
+        self._by_route_end = {}
+        self._log = None
+        self._parcels = {}
 
     def add_truck(self, truck: Truck) -> None:
         """Add <truck> to this fleet.
@@ -247,7 +796,206 @@ class Fleet:
         >>> f.num_trucks()
         1
         """
+        self._sync()
         self.trucks.append(truck)
+        self._include(truck)
+
+    def _include(self, truck: Truck) -> None:
+        """Include <truck>, the last truck in <self.trucks>, in the
+        statistics of this fleet."""
+        truck._fleets.add(self)
+        self._count += 1
+        self._by_id[truck.get_id()] = truck
+        self._by_depot.setdefault(truck.get_depot(), []).append(truck)
+        self._by_route_end.setdefault(truck.get_routes()[-1], {})[
+            id(truck)] = truck
+        for p in truck.get_parcels():
+            self._parcels[p.get_id()] = truck
+        self._truck_changed(truck, 0, True, truck.get_routes()[-1])
+
+    def _sync(self) -> None:
+        """Recompute the statistics of this fleet from scratch if trucks
+        were appended to <self.trucks> without add_truck, or <self.trucks>
+        was replaced with another list.
+
+        Trucks that are no longer in <self.trucks> stop notifying this
+        fleet when they are packed.
+        """
+        if self.trucks is self._synced and self._count == len(self.trucks):
+            return
+        members = {id(truck) for truck in self.trucks}
+        for truck in self._by_id.values():
+            if id(truck) not in members:
+                truck._fleets.discard(self)
+        self._synced = self.trucks
+        self._count = 0
+        self._nonempty = 0
+        self._unused_space = 0
+        self._loads = {}
+        self._travel_map = None
+        self._by_id = {}
+        self._by_depot = {}
+        self._by_route_end = {}
+        self._parcels = {}
+        for truck in self.trucks:
+            self._include(truck)
+
+    def checkpoint(self) -> None:
+        """Remember the current parcels and routes of every truck in this
+        fleet, so that rollback can restore them.
+
+        Only the changes made after this call are recorded, so taking a
+        checkpoint takes O(1) time.  Taking a checkpoint discards the changes
+        recorded since the previous one.  Changes are recorded until release
+        is called, so call it once the checkpoint is no longer needed.
+        Trucks added after a checkpoint are not removed by rollback.
+
+        Precondition: the trucks in this fleet are in no other fleet that is
+        also rolled back.
+        """
+        self._log = []
+
+    def release(self) -> None:
+        """Forget the last checkpoint, and stop recording changes to the
+        trucks in this fleet, so that their undo records can be freed.
+        rollback does nothing until checkpoint is called again.
+
+        >>> f = Fleet()
+        >>> t = Truck(1423, 10, 'Toronto')
+        >>> f.add_truck(t)
+        >>> f.checkpoint()
+        >>> t.pack(Parcel(1, 5, 'Toronto', 'Hamilton'))
+        True
+        >>> f.release()
+        >>> f.rollback()
+        >>> t.get_routes()
+        ['Toronto', 'Hamilton']
+        """
+        self._log = None
+
+    def rollback(self) -> None:
+        """Undo every pack, unpack and reorder_route of the trucks in this
+        fleet since the last checkpoint, in time proportional to the number
+        of changes.  The checkpoint remains, so it can be rolled back to
+        again.
+
+        Precondition: checkpoint has been called.
+
+        >>> f = Fleet()
+        >>> t = Truck(1423, 10, 'Toronto')
+        >>> f.add_truck(t)
+        >>> p1 = Parcel(1, 5, 'Toronto', 'Hamilton')
+        >>> t.pack(p1)
+        True
+        >>> f.checkpoint()
+        >>> t.unpack(p1)
+        True
+        >>> t.pack(Parcel(2, 2, 'Toronto', 'London'))
+        True
+        >>> f.rollback()
+        >>> t.get_routes(), f.total_unused_space()
+        (['Toronto', 'Hamilton'], 5)
+        """
+        log = self._log
+        while log:
+            undo, args = log.pop()
+            undo(*args)
+
+    def _has_parcel(self, parcel_id: int) -> bool:
+        """Return True iff the parcel with ID <parcel_id> is on a truck in
+        this fleet."""
+        self._sync()
+        return parcel_id in self._parcels
+
+    def _parcel_moved(self, truck: Truck, p: Parcel, packed: bool) -> None:
+        """Record that <p> was packed onto <truck> if <packed> is True, or
+        unpacked from it otherwise.  Ignore <truck> if it is no longer in
+        this fleet."""
+        if self._by_id.get(truck.get_id()) is not truck:
+            return
+        if packed:
+            self._parcels[p.get_id()] = truck
+        elif self._parcels.get(p.get_id()) is truck:
+            del self._parcels[p.get_id()]
+
+    def _truck_changed(self, truck: Truck, old_load: int,
+                       was_empty: bool, old_end: str,
+                       undo: Optional[Tuple[Callable[..., None], tuple]] = None
+                       ) -> None:
+        """Update the statistics and indexes of this fleet after parcels
+        were packed onto or unpacked from <truck>, whose load was <old_load>
+        and whose routes ended at <old_end> before.  <was_empty> is True iff
+        it was empty before.  Record <undo> if a checkpoint was taken.
+
+        Ignore <truck> if it is no longer in this fleet.
+        """
+        if self._by_id.get(truck.get_id()) is not truck:
+            return
+        if undo is not None and self._log is not None:
+            self._log.append(undo)
+        end = truck.get_routes()[-1]
+        if end != old_end:
+            ending = self._by_route_end[old_end]
+            del ending[id(truck)]
+            if not ending:
+                del self._by_route_end[old_end]
+            self._by_route_end.setdefault(end, {})[id(truck)] = truck
+        capacity = truck.get_capacity()
+        if not was_empty:
+            self._nonempty -= 1
+            self._unused_space -= capacity - old_load
+        if not truck.is_empty():
+            self._nonempty += 1
+            self._unused_space += truck.available_space()
+        self._loads[capacity] = self._loads.get(capacity, 0) + \
+            truck.get_load() - old_load
+        self._dirty[id(truck)] = truck
+
+    def get_truck(self, id_: int) -> Optional[Truck]:
+        """Return the truck in this fleet with ID <id_>, or None if there is
+        no such truck.
+
+        >>> f = Fleet()
+        >>> t = Truck(1423, 1000, 'Toronto')
+        >>> f.add_truck(t)
+        >>> f.get_truck(1423) is t, f.get_truck(1)
+        (True, None)
+        """
+        self._sync()
+        return self._by_id.get(id_)
+
+    def truck_with_parcel(self, parcel_id: int) -> Optional[Truck]:
+        """Return the truck in this fleet that the parcel with ID
+        <parcel_id> is packed onto, or None if it is on no truck.
+        """
+        self._sync()
+        return self._parcels.get(parcel_id)
+
+    def trucks_at_depot(self, depot: str) -> List[Truck]:
+        """Return the trucks in this fleet whose depot is <depot>, in the
+        order they were added.
+        """
+        self._sync()
+        return self._by_depot.get(depot, [])[:]
+
+    def trucks_ending_at(self, city: str) -> List[Truck]:
+        """Return the trucks in this fleet whose routes currently end at
+        <city>, in the order they came to end there.
+
+        >>> f = Fleet()
+        >>> t1 = Truck(1423, 10, 'Toronto')
+        >>> t2 = Truck(1333, 10, 'Toronto')
+        >>> f.add_truck(t1)
+        >>> f.add_truck(t2)
+        >>> t2.pack(Parcel(1, 5, 'Toronto', 'Hamilton'))
+        True
+        >>> [t.get_id() for t in f.trucks_ending_at('Hamilton')]
+        [1333]
+        >>> [t.get_id() for t in f.trucks_ending_at('Toronto')]
+        [1423]
+        """
+        self._sync()
+        return list(self._by_route_end.get(city, {}).values())
 
     # We will not test the format of the string that you return -- it is up
     # to you.
@@ -296,11 +1044,8 @@ class Fleet:
         >>> f.num_nonempty_trucks()
         2
         """
-        n = 0
-        for t in self.trucks:
-            if not t.is_empty():
-                n += 1
-        return n
+        self._sync()
+        return self._nonempty
 
     def parcel_allocations(self) -> Dict[int, List[int]]:
         """Return a dictionary in which each key is the ID of a truck in this
@@ -348,11 +1093,8 @@ class Fleet:
         >>> f.total_unused_space()
         995
         """
-        space = 0
-        for truck in self.trucks:
-            if not truck.is_empty():
-                space += truck.get_capacity() - truck.total_volume()
-        return space
+        self._sync()
+        return self._unused_space
 
     def _total_fullness(self) -> float:
         """Return the sum of truck.fullness() for each non-empty truck in the
@@ -371,10 +1113,11 @@ class Fleet:
         >>> f._total_fullness()
         50.0
         """
+        self._sync()
+        # empty trucks have no load, so they add nothing
         per = 0.0
-        for truck in self.trucks:
-            if not truck.is_empty():
-                per += truck.fullness()
+        for capacity, load in self._loads.items():
+            per += load / capacity * 100
         return per
 
     def average_fullness(self) -> float:
@@ -417,11 +1160,58 @@ class Fleet:
         >>> f.total_distance_travelled(m)
         36
         """
-        d = 0
-        for truck in self.trucks:
-            if not truck.is_empty():
-                d += truck.route_distance(d_map)
-        return d
+        self._sync()
+        version = d_map.get_version()
+        if d_map is not self._travel_map or version != self._travel_version:
+            distances, total = self.route_distances(d_map)
+            self._travelled = dict(zip(map(id, self.trucks), distances))
+            self._travel_total = total
+            self._travel_map = d_map
+            self._travel_version = version
+        else:
+            # only the trucks packed since then can travel differently
+            for key, truck in self._dirty.items():
+                d = 0 if truck.is_empty() else truck.route_distance(d_map)
+                self._travel_total += d - self._travelled.get(key, 0)
+                self._travelled[key] = d
+        self._dirty.clear()
+        return self._travel_total
+
+    def route_distances(self, d_map: DistanceMap) -> Tuple[List[int], int]:
+        """Return the distance travelled by each truck in this fleet, in the
+        same order as <self.trucks>, and the total distance travelled by the
+        fleet, according to the distances in <d_map>.  Empty trucks do not
+        travel.
+
+        Only the trucks whose routes or distances changed since their
+        distances were last computed are computed again, together in one
+        call to <d_map>.route_distances.
+
+        >>> f = Fleet()
+        >>> t1 = Truck(1423, 10, 'Toronto')
+        >>> p1 = Parcel(1, 5, 'Toronto', 'Hamilton')
+        >>> t1.pack(p1)
+        True
+        >>> f.add_truck(t1)
+        >>> f.add_truck(Truck(1333, 10, 'Toronto'))
+        >>> from distance_map import MatrixDistanceMap
+        >>> m = MatrixDistanceMap()
+        >>> m.add_distance('Toronto', 'Hamilton', 9)
+        >>> f.route_distances(m)
+        ([18, 0], 18)
+        """
+        nonempty = [t for t in self.trucks if not t.is_empty()]
+        travelled = [t._memoized_distance(d_map) for t in nonempty]
+        stale = [t for t, d in zip(nonempty, travelled) if d is None]
+        version = d_map.get_version()
+        computed = d_map.route_distances([t.get_routes() for t in stale])
+        for t, d in zip(stale, computed):
+            t._route_memo = (d_map, version, d)
+        computed.reverse()
+        travelled = [computed.pop() if d is None else d for d in travelled]
+        by_truck = dict(zip(map(id, nonempty), travelled))
+        distances = [by_truck.get(id(t), 0) for t in self.trucks]
+        return distances, sum(travelled)
 
     def average_distance_travelled(self, d_map: DistanceMap) -> float:
         """Return the average distance travelled by the trucks in this fleet,
@@ -457,12 +1247,20 @@ class Fleet:
         return self.total_distance_travelled(d_map) / self.num_nonempty_trucks()
 
 
+def _typecode(column: Union[array, memoryview]) -> str:
+    """Return the type code of the ints in <column>."""
+    if isinstance(column, memoryview):
+        return column.format
+    return column.typecode
+
+
 if __name__ == '__main__':
     import python_ta
 
     python_ta.check_all(config={
         'allowed-import-modules': ['doctest', 'python_ta', 'typing',
-                                   'distance_map'],
+                                   'array', 'weakref', 'distance_map',
+                                   'numpy'],
         'disable': ['E1136'],
         'max-attributes': 15,
     })
@@ -24,11 +24,15 @@ run the experiment, generate statistics as the result of the experiment, and
 
 This module is responsible for all the reading of data from the data files.
 """
-from typing import List, Dict, Union
+from typing import List, Dict, Optional, Union
 import json
+import mmap
+import sys
 from scheduler import RandomScheduler, GreedyScheduler, Scheduler
-from domain import Parcel, Truck, Fleet
-from distance_map import DistanceMap
+from local_search import RouteOptimizer, FleetOptimizer
+from domain import Parcel, ParcelTable, Truck, Fleet
+from distance_map import DistanceMap, MatrixDistanceMap, SparseDistanceMap, \
+    CoordinateDistanceMap, MAGIC
 
 
 class SchedulingExperiment:
@@ -64,6 +68,12 @@ class SchedulingExperiment:
       A list of _parcels. <_unscheduled>'s value is undefined until <self>.run
       is called, at which point it contains the list of _parcels that could
       not be scheduled in the experiment.
+    _fleet_optimizer:
+      The optimizer that moves parcels between trucks after they are
+      scheduled, or None if the parcels stay where they were scheduled.
+    _optimizer:
+      The optimizer that shortens the routes of the trucks after they are
+      scheduled, or None if the routes are left as scheduled.
 
     === Representation Invariants ===
     - <fleet> contains at least one truck
@@ -73,11 +83,13 @@ class SchedulingExperiment:
     """
     verbose: bool
     scheduler: Scheduler
-    parcels: List[Parcel]
+    parcels: Union[List[Parcel], ParcelTable]
     fleet: Fleet
     d_map: DistanceMap
     _stats: Dict[str, Union[int, float]]
     _unscheduled: List[Parcel]
+    _fleet_optimizer: Optional[FleetOptimizer]
+    _optimizer: Optional[RouteOptimizer]
 
     def __init__(self, config: Dict[str, Union[str, bool]]) -> None:
         """Initialize a new experiment with the configuration specified in
@@ -95,10 +107,33 @@ class SchedulingExperiment:
         elif 'random' == schedule_str:
             self.scheduler = RandomScheduler()
 
-        self.parcels = read_parcels(config['parcel_file'])
+        if config.get('parcel_table', False):
+            self.parcels = read_parcel_table(config['parcel_file'])
+        else:
+            self.parcels = read_parcels(config['parcel_file'])
         self.fleet = read_trucks(config['truck_file'],
                                  config['depot_location'])
-        self.d_map = read_distance_map(config['map_file'])
+        if config.get('map_backend') == 'coordinates':
+            self.d_map = read_coordinates(config['map_file'],
+                                          config.get('road_factor', 1.0))
+        else:
+            self.d_map = read_distance_map(config['map_file'],
+                                           config.get('map_backend', 'dict'),
+                                           config.get('complete_map', False))
+
+        if config.get('optimize_fleet', False):
+            self._fleet_optimizer = FleetOptimizer(
+                self.d_map, config.get('fleet_moves'),
+                config.get('fleet_time_limit'),
+                truck_cost=config.get('truck_cost', 0))
+        else:
+            self._fleet_optimizer = None
+        if config.get('optimize_routes', False):
+            self._optimizer = RouteOptimizer(self.d_map,
+                                             config.get('route_moves'),
+                                             config.get('route_time_limit'))
+        else:
+            self._optimizer = None
 
         self._stats = {}
         self._unscheduled = []
@@ -119,6 +154,10 @@ class SchedulingExperiment:
         # TO DO: Save the unscheduled _parcels in self._unscheduled.
         self._unscheduled = self.scheduler.schedule(self.parcels,
                                                     self.fleet.trucks)
+        if self._fleet_optimizer is not None:
+            self._fleet_optimizer.optimize(self.fleet)
+        if self._optimizer is not None:
+            self._optimizer.optimize(self.fleet.trucks)
         self._compute_stats()
         if report:
             self._print_report()
@@ -173,8 +212,9 @@ def read_parcels(parcel_file: str) -> List[Parcel]:
         for line in file:
             tokens = line.strip().split(',')
             pid = int(tokens[0].strip())
-            source = tokens[1].strip()
-            destination = tokens[2].strip()
+            # each city name is stored once, however many parcels use it
+            source = sys.intern(tokens[1].strip())
+            destination = sys.intern(tokens[2].strip())
             volume = int(tokens[3].strip())
             # TO DO: Do something with pid, _source, _destination and _volume.
             parcels.append(Parcel(pid, volume, source, destination))
@@ -182,29 +222,112 @@ def read_parcels(parcel_file: str) -> List[Parcel]:
     return parcels
 
 
-def read_distance_map(distance_map_file: str) -> DistanceMap:
+def read_parcel_table(parcel_file: str) -> ParcelTable:
+    """Read parcel data from <parcel_file> and return it as a ParcelTable.
+
+    Precondition: <parcel_file> is the path to a file containing parcel data in
+                  the form specified in Assignment 1.
+    """
+    parcels = ParcelTable()
+    with open(parcel_file, 'r') as file:
+        for line in file:
+            tokens = line.strip().split(',')
+            parcels.append(int(tokens[0].strip()), int(tokens[3].strip()),
+                           sys.intern(tokens[1].strip()),
+                           sys.intern(tokens[2].strip()))
+    return parcels
+
+
+def read_distance_map(distance_map_file: str, backend: str = 'dict',
+                      complete: bool = False) -> DistanceMap:
     """Read distance data from <distance_map_file> and return a DistanceMap
     that records it.
 
+    If <backend> is 'matrix' or <complete> is True, return a MatrixDistanceMap
+    instead.  If <complete> is True, the map is completed with the shortest
+    distances between all cities.  If <backend> is 'sparse', return a
+    SparseDistanceMap, which finds shortest distances when they are needed.
+
+    If <distance_map_file> was written by write_distance_map, it is memory
+    mapped instead of read, and a MatrixDistanceMap is returned whatever the
+    <backend>.
+
     Precondition: <distance_map_file> is the path to a file containing distance
-                  data in the form specified in Assignment 1.
+                  data in the form specified in Assignment 1, or written by
+                  write_distance_map.
     """
+    with open(distance_map_file, 'rb') as file:
+        if file.read(len(MAGIC)) == MAGIC:
+            # Map the file into memory instead of parsing it.  Pages are
+            # shared with other processes that map the same file, and any
+            # distances added later are only changed in this process.
+            distance_map = MatrixDistanceMap.from_buffer(
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY))
+            if complete:
+                distance_map.complete()
+            return distance_map
     # TO DO: Initialize any variable(s) as needed.
-    distance_map = DistanceMap()
+    if backend == 'matrix' or complete:
+        distance_map = MatrixDistanceMap()
+    elif backend == 'sparse':
+        distance_map = SparseDistanceMap()
+    else:
+        distance_map = DistanceMap()
     with open(distance_map_file, 'r') as file:
         for line in file:
             tokens = line.strip().split(',')
-            c1 = tokens[0].strip()
-            c2 = tokens[1].strip()
+            c1 = sys.intern(tokens[0].strip())
+            c2 = sys.intern(tokens[1].strip())
             distance1 = int(tokens[2].strip())
             distance2 = int(tokens[3].strip()) if len(tokens) == 4 \
                 else distance1
             # TO DO: Do something with c1, c2, distance1, and distance2
             distance_map.add_distance(c1, c2, distance1, distance2)
+    if complete:
+        distance_map.complete()
     # TO DO: Return something.
     return distance_map
 
 
+def read_coordinates(coordinates_file: str,
+                     road_factor: float = 1.0) -> CoordinateDistanceMap:
+    """Read city coordinates from <coordinates_file> and return a
+    CoordinateDistanceMap that computes distances from them, multiplied by
+    <road_factor>.
+
+    Precondition: each line of <coordinates_file> has the form
+                  'city, latitude, longitude', in degrees.
+    """
+    distance_map = CoordinateDistanceMap(road_factor)
+    with open(coordinates_file, 'r') as file:
+        for line in file:
+            tokens = line.strip().split(',')
+            city = sys.intern(tokens[0].strip())
+            latitude = float(tokens[1].strip())
+            longitude = float(tokens[2].strip())
+            distance_map.add_city(city, latitude, longitude)
+    return distance_map
+
+
+def write_distance_map(d_map: MatrixDistanceMap,
+                       distance_map_file: str) -> None:
+    """Write <d_map> to <distance_map_file> in a binary format that
+    read_distance_map can memory map without parsing it.
+    """
+    with open(distance_map_file, 'wb') as file:
+        file.write(d_map.to_bytes())
+
+
+def convert_distance_map(text_file: str, binary_file: str) -> None:
+    """Convert the distance data in <text_file> to the binary format of
+    write_distance_map, and save it in <binary_file>.
+
+    Precondition: <text_file> is the path to a file containing distance
+                  data in the form specified in Assignment 1.
+    """
+    write_distance_map(read_distance_map(text_file, 'matrix'), binary_file)
+
+
 def read_trucks(truck_file: str, depot_location: str) -> Fleet:
     """Read truck data from <truck_file> and return a Fleet containing these
     trucks, with each truck starting at the <depot_location>.
@@ -214,6 +337,7 @@ def read_trucks(truck_file: str, depot_location: str) -> Fleet:
     """
     # TO DO: Initialize any variable(s) as needed.
     fleet = Fleet()
+    depot_location = sys.intern(depot_location)
     with open(truck_file, 'r') as file:
         for line in file:
             tokens = line.strip().split(',')
@@ -244,11 +368,13 @@ def simple_check(config_file: str) -> None:
 if __name__ == '__main__':
     import python_ta
     python_ta.check_all(config={
-        'allowed-io': ['read_parcels', 'read_distance_map', 'read_trucks',
+        'allowed-io': ['read_parcels', 'read_parcel_table',
+                       'read_distance_map', 'read_trucks',
+                       'read_coordinates', 'write_distance_map',
                        '_print_report', 'simple_check'],
         'allowed-import-modules': ['doctest', 'python_ta', 'typing',
-                                   'json', 'scheduler', 'domain',
-                                   'distance_map'],
+                                   'json', 'mmap', 'sys', 'scheduler',
+                                   'local_search', 'domain', 'distance_map'],
         'disable': ['E1136'],
         'max-attributes': 15,
     })
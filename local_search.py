@@ -0,0 +1,437 @@
+"""Assignment 1 - Local search
+
+CSC148, Winter 2021
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, Ian Berlott-Atwell, Jonathan Calver,
+Sophia Huynh, Maryam Majedi, and Jaisie Sin.
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) 2021 Diane Horton, Ian Berlott-Atwell, Jonathan Calver,
+Sophia Huynh, Maryam Majedi, and Jaisie Sin.
+
+===== Module Description =====
+
+This module contains the RouteOptimizer class, which shortens the routes of
+trucks after their parcels have been scheduled, by changing the order in
+which each truck visits its stops, and the FleetOptimizer class, which
+shortens them by moving and swapping parcels between trucks.
+"""
+from typing import Dict, Iterator, List, Optional, Tuple
+import time
+from distance_map import DistanceMap
+from domain import Parcel, Truck, Fleet
+
+# The cost of a distance that is not stored.  It is larger than any real
+# route, so moves never add missing distances, and remove them if they can.
+_MISSING = 10 ** 12
+
+
+class _LocalSearch:
+    """A local search that makes moves until no move improves, or its budget
+    runs out.
+
+    This is an abstract class.  Only child classes should be instantiated.
+
+    === Private Attributes ===
+    _d_map: the distances between cities.
+    _max_moves: the largest number of moves that one call to optimize
+    makes, or None if there is no limit.
+    _time_limit: the longest time, in seconds, that one call to optimize
+    takes, or None if there is no limit.
+    _moves_left: the number of moves that the current call to optimize may
+    still make, or None if there is no limit.
+    _deadline: the time at which the current call to optimize stops, from
+    time.perf_counter, or None if there is no limit.
+    """
+    _d_map: DistanceMap
+    _max_moves: Optional[int]
+    _time_limit: Optional[float]
+    _moves_left: Optional[int]
+    _deadline: Optional[float]
+
+    def __init__(self, d_map: DistanceMap, max_moves: Optional[int] = None,
+                 time_limit: Optional[float] = None) -> None:
+        """Initialize a search that uses the distances in <d_map>, and makes
+        at most <max_moves> moves in at most <time_limit> seconds each time
+        optimize is called.
+        """
+        self._d_map = d_map
+        self._max_moves = max_moves
+        self._time_limit = time_limit
+        self._moves_left = max_moves
+        self._deadline = None
+
+    def _start(self) -> None:
+        """Start the budget of a call to optimize."""
+        self._moves_left = self._max_moves
+        if self._time_limit is None:
+            self._deadline = None
+        else:
+            self._deadline = time.perf_counter() + self._time_limit
+
+    def _moved(self) -> None:
+        """Charge one move to the budget."""
+        if self._moves_left is not None:
+            self._moves_left -= 1
+
+    def _cost(self, loc1: str, loc2: str) -> int:
+        """Return the distance from <loc1> to <loc2>, or _MISSING if it is
+        not stored."""
+        if loc1 == loc2:
+            # the same city twice in a row is one stop
+            return 0
+        d = self._d_map.distance(loc1, loc2)
+        return d if d >= 0 else _MISSING
+
+    def _out_of_budget(self) -> bool:
+        """Return True iff the current call to optimize must stop."""
+        if self._moves_left is not None and self._moves_left <= 0:
+            return True
+        return self._deadline is not None and \
+            time.perf_counter() >= self._deadline
+
+
+class RouteOptimizer(_LocalSearch):
+    """ A route optimizer, which improves the route of each truck with 2-opt
+    and Or-opt moves.
+
+    A 2-opt move reverses a run of stops in a route.  An Or-opt move moves a
+    run of one to three stops to somewhere else in the route.  The change in
+    distance of a move is found in O(1) time from the few distances that it
+    adds and removes, and from running sums of the distances along the route
+    in each direction, which also account for reversing a run of stops when
+    distances differ by direction.  Moves that shorten a route are made
+    until no move does, or the budget runs out.
+    """
+
+    def optimize(self, trucks: List[Truck]) -> int:
+        """Reorder the route of each truck in <trucks> to make it shorter,
+        and return the total distance saved.
+
+        A new order is only kept if route_distance of the truck does not
+        grow, so the distance saved is never negative, even when some
+        distances are missing from the map.
+
+        >>> from distance_map import DistanceMap
+        >>> from domain import Parcel
+        >>> m = DistanceMap()
+        >>> m.add_distance('Toronto', 'Hamilton', 5)
+        >>> m.add_distance('Toronto', 'London', 10)
+        >>> m.add_distance('Toronto', 'Barrie', 10)
+        >>> m.add_distance('Hamilton', 'London', 6)
+        >>> m.add_distance('Hamilton', 'Barrie', 12)
+        >>> m.add_distance('London', 'Barrie', 20)
+        >>> t = Truck(1423, 10, 'Toronto')
+        >>> for i, city in enumerate(['London', 'Barrie', 'Hamilton']):
+        ...     t.pack(Parcel(i, 1, 'Toronto', city))
+        True
+        True
+        True
+        >>> t.route_distance(m)
+        47
+        >>> RouteOptimizer(m).optimize([t])
+        9
+        >>> t.get_routes()
+        ['Toronto', 'Barrie', 'Hamilton', 'London']
+        """
+        self._start()
+        saved = 0
+        for truck in trucks:
+            if self._out_of_budget():
+                break
+            routes = truck.get_routes()
+            if len(routes) < 3:
+                # there is only one order for fewer than two stops
+                continue
+            before = truck.route_distance(self._d_map)
+            tour = self._improve(routes + [truck.get_depot()])
+            if tour[:-1] != routes:
+                old_routes = routes[:]
+                truck.reorder_route(tour[:-1])
+                after = truck.route_distance(self._d_map)
+                if after > before:
+                    # route_distance counts a missing distance as -1, so
+                    # replacing one with a stored distance can look longer
+                    truck.reorder_route(old_routes)
+                else:
+                    saved += before - after
+        return saved
+
+    def _improve(self, tour: List[str]) -> List[str]:
+        """Return <tour>, a route that ends back where it starts, after
+        making moves that shorten it.  <tour> may be mutated."""
+        while not self._out_of_budget():
+            if not (self._two_opt(tour) or self._or_opt(tour)):
+                break
+            self._moved()
+        # a move may leave the same city twice in a row, which is one stop
+        collapsed = tour[:1]
+        for city in tour[1:]:
+            if city != collapsed[-1]:
+                collapsed.append(city)
+        return collapsed
+
+    def _two_opt(self, tour: List[str]) -> bool:
+        """Make the first 2-opt move that shortens <tour>, and return True,
+        or return False if there is none."""
+        cost = self._cost
+        n = len(tour)
+        # forward[k] and backward[k] are the distances along tour[:k + 1]
+        # going forward, and going backward
+        forward, backward = [0], [0]
+        for k in range(n - 1):
+            forward.append(forward[-1] + cost(tour[k], tour[k + 1]))
+            backward.append(backward[-1] + cost(tour[k + 1], tour[k]))
+        for i in range(1, n - 2):
+            if self._out_of_budget():
+                return False
+            a, b = tour[i - 1], tour[i]
+            for j in range(i + 1, n - 1):
+                c, d = tour[j], tour[j + 1]
+                delta = cost(a, c) + cost(b, d) - cost(a, b) - cost(c, d) + \
+                    (backward[j] - backward[i]) - (forward[j] - forward[i])
+                if delta < 0:
+                    tour[i:j + 1] = tour[j:i - 1:-1]
+                    return True
+        return False
+
+    def _or_opt(self, tour: List[str]) -> bool:
+        """Make the first Or-opt move that shortens <tour>, and return True,
+        or return False if there is none."""
+        cost = self._cost
+        n = len(tour)
+        for length in range(1, 4):
+            for i in range(1, n - length):
+                if self._out_of_budget():
+                    return False
+                first, last = tour[i], tour[i + length - 1]
+                before, after = tour[i - 1], tour[i + length]
+                removed = cost(before, first) + cost(last, after) - \
+                    cost(before, after)
+                for k in range(n - 1):
+                    if i - 1 <= k < i + length:
+                        continue
+                    x, y = tour[k], tour[k + 1]
+                    if cost(x, first) + cost(last, y) - cost(x, y) < removed:
+                        run = tour[i:i + length]
+                        del tour[i:i + length]
+                        at = k + 1 if k < i else k + 1 - length
+                        tour[at:at] = run
+                        return True
+        return False
+
+
+class FleetOptimizer(_LocalSearch):
+    """ A fleet optimizer, which shortens the routes of the trucks in a fleet
+    by moving parcels from one truck to another, and by swapping parcels
+    between two trucks, without going over the capacity of any truck.
+
+    A parcel is only moved onto trucks whose routes end at its destination,
+    or at one of the cities nearest to it, which the fleet and the distance
+    map keep indexed.  The change in distance of a move is found with O(1)
+    distance lookups, from the route length that is cached for each truck,
+    and the available space, number of parcels for each city and positions
+    of each stop that each truck keeps.  The lightest trucks are emptied
+    first, and emptying a truck is worth <_truck_cost>, so that leaving a
+    truck unused can be preferred to a slightly shorter total distance.
+
+    === Private Attributes ===
+    _neighbours: the number of cities near the destination of a parcel
+    whose trucks the parcel may be moved onto.
+    _truck_cost: the distance that emptying a truck is worth.
+    _lengths: maps the id of each truck to the length of its route, counting
+    _MISSING for each distance that is not stored.
+    """
+    _neighbours: int
+    _truck_cost: int
+    _lengths: Dict[int, int]
+
+    def __init__(self, d_map: DistanceMap, max_moves: Optional[int] = None,
+                 time_limit: Optional[float] = None, neighbours: int = 5,
+                 truck_cost: int = 0) -> None:
+        """Initialize an optimizer that uses the distances in <d_map>, and
+        makes at most <max_moves> moves in at most <time_limit> seconds each
+        time optimize is called.  Parcels may be moved onto trucks whose
+        routes end at their destinations or at the <neighbours> cities
+        nearest to them, and emptying a truck is worth <truck_cost>.
+        """
+        _LocalSearch.__init__(self, d_map, max_moves, time_limit)
+        self._neighbours = neighbours
+        self._truck_cost = truck_cost
+        self._lengths = {}
+
+    def optimize(self, fleet: Fleet) -> int:
+        """Move and swap parcels between the trucks in <fleet> to make their
+        routes shorter, and return the total distance saved.
+
+        >>> from distance_map import DistanceMap
+        >>> m = DistanceMap()
+        >>> m.add_distance('Toronto', 'Hamilton', 5)
+        >>> f = Fleet()
+        >>> t1 = Truck(1423, 10, 'Toronto')
+        >>> t2 = Truck(1333, 10, 'Toronto')
+        >>> f.add_truck(t1)
+        >>> f.add_truck(t2)
+        >>> t1.pack(Parcel(1, 5, 'Toronto', 'Hamilton'))
+        True
+        >>> t2.pack(Parcel(2, 3, 'Toronto', 'Hamilton'))
+        True
+        >>> FleetOptimizer(m).optimize(f)
+        10
+        >>> f.num_nonempty_trucks()
+        1
+        """
+        self._start()
+        before = fleet.total_distance_travelled(self._d_map)
+        trucks = fleet.trucks
+        self._lengths = {id(t): self._length(t.get_routes(), t.get_depot())
+                         for t in trucks}
+        improved = True
+        while improved and not self._out_of_budget():
+            improved = False
+            # the lightest trucks are the easiest to empty
+            for truck in sorted(trucks, key=Truck.total_volume):
+                for p in truck.get_parcels()[:]:
+                    if self._out_of_budget():
+                        break
+                    if self._relocate(fleet, truck, p) or \
+                            self._exchange(fleet, truck, p):
+                        self._moved()
+                        improved = True
+        return before - fleet.total_distance_travelled(self._d_map)
+
+    def _relocate(self, fleet: Fleet, truck: Truck, p: Parcel) -> bool:
+        """Move <p> from <truck> onto the truck in <fleet> that saves the
+        most, and return True, or return False if no truck saves anything.
+        """
+        d, volume = p.get_destination(), p.get_volume()
+        removed, _ = self._removal(truck, d)
+        emptied = self._truck_cost if len(truck.get_parcels()) == 1 else 0
+        best, best_gain = None, 0
+        for other in self._candidates(fleet, d):
+            if other is truck or other.available_space() < volume:
+                continue
+            gain = emptied - removed - \
+                self._addition(other, other.get_routes()[-1], d)
+            if other.is_empty():
+                gain -= self._truck_cost
+            if gain > best_gain:
+                best, best_gain = other, gain
+        if best is None:
+            return False
+        self._lengths[id(best)] += \
+            self._addition(best, best.get_routes()[-1], d)
+        self._lengths[id(truck)] += removed
+        truck.unpack(p)
+        best.pack(p)
+        return True
+
+    def _exchange(self, fleet: Fleet, truck: Truck, p: Parcel) -> bool:
+        """Swap <p> with the parcel on another truck in <fleet> that saves
+        the most, and return True, or return False if no swap saves anything.
+        """
+        d, volume = p.get_destination(), p.get_volume()
+        removed, last = self._removal(truck, d)
+        space = truck.available_space() + volume
+        best, best_gain, best_changes = None, 0, (0, 0)
+        for other in self._candidates(fleet, d):
+            if other is truck:
+                continue
+            other_space = other.available_space()
+            # the saving only depends on the destination of the other parcel
+            changes = {}
+            for q in other.get_parcels():
+                e = q.get_destination()
+                if e == d or q.get_volume() > space or \
+                        volume > other_space + q.get_volume():
+                    continue
+                if e not in changes:
+                    other_removed, other_last = self._removal(other, e)
+                    changes[e] = (
+                        removed + self._addition(truck, last, e),
+                        other_removed + self._addition(other, other_last, d))
+                gain = -sum(changes[e])
+                if gain > best_gain:
+                    best, best_gain, best_changes = q, gain, changes[e]
+        if best is None:
+            return False
+        other = fleet.truck_with_parcel(best.get_id())
+        self._lengths[id(truck)] += best_changes[0]
+        self._lengths[id(other)] += best_changes[1]
+        truck.unpack(p)
+        other.unpack(best)
+        truck.pack(best)
+        other.pack(p)
+        return True
+
+    def _candidates(self, fleet: Fleet, city: str) -> Iterator[Truck]:
+        """Yield the trucks in <fleet> whose routes end at <city>, then those
+        whose routes end at the cities nearest to <city>."""
+        yield from fleet.trucks_ending_at(city)
+        for near in self._d_map.nearest(city, self._neighbours):
+            yield from fleet.trucks_ending_at(near)
+
+    def _removal(self, truck: Truck, city: str) -> Tuple[int, str]:
+        """Return the change in the length of the route of <truck>, and the
+        last city of its route, after one parcel going to <city> is
+        unpacked from it."""
+        routes = truck.get_routes()
+        if truck.num_parcels_to(city) > 1:
+            return 0, routes[-1]
+        visits = truck.stop_positions(city)
+        if not visits:
+            # a parcel for the depot does not always add a stop
+            return 0, routes[-1]
+        if len(visits) > 1:
+            # rarely, the city is visited again after other parcels going
+            # there were unpacked, and the route is rebuilt the way
+            # Truck.unpack does
+            new = routes[:1]
+            for other in routes[1:]:
+                if other != city and other != new[-1]:
+                    new.append(other)
+            return self._length(new, truck.get_depot()) - \
+                self._lengths[id(truck)], new[-1]
+        i = visits[0]
+        before = routes[i - 1]
+        last = i == len(routes) - 1
+        after = truck.get_depot() if last else routes[i + 1]
+        change = self._cost(before, after) - self._cost(before, city) - \
+            self._cost(city, after)
+        return change, before if last else routes[-1]
+
+    def _addition(self, truck: Truck, last: str, city: str) -> int:
+        """Return the change in the length of the route of <truck>, which
+        ends at <last>, after a parcel going to <city> is packed onto it."""
+        if last == city:
+            return 0
+        depot = truck.get_depot()
+        return self._cost(last, city) + self._cost(city, depot) - \
+            self._cost(last, depot)
+
+    def _length(self, routes: List[str], depot: str) -> int:
+        """Return the length of <routes>, which end back at <depot>."""
+        return sum(self._cost(routes[i], routes[i + 1])
+                   for i in range(len(routes) - 1)) + \
+            self._cost(routes[-1], depot)
+
+
+if __name__ == '__main__':
+    import doctest
+
+    doctest.testmod()
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': ['doctest', 'python_ta', 'typing', 'time',
+                                   'distance_map', 'domain'],
+        'disable': ['E1136'],
+        'max-attributes': 15,
+    })
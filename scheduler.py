@@ -19,12 +19,13 @@ Sophia Huynh, Maryam Majedi, and Jaisie Sin.
 
 This module contains the abstract Scheduler class, as well as the two
 subclasses RandomScheduler and GreedyScheduler, which implement the two
-scheduling algorithms described in the handout.
+scheduling algorithms described in the handout, and the OnlineScheduler
+class, which schedules parcels one at a time as they arrive.
 """
-from typing import List, Dict, Union, Callable
+from typing import List, Dict, Union, Callable, Type
 from random import shuffle
-from container import PriorityQueue
-from domain import Parcel, Truck
+from container import KeyedPriorityQueue, BucketPriorityQueue
+from domain import Parcel, ParcelTable, Truck
 
 
 class Scheduler:
@@ -34,11 +35,12 @@ class Scheduler:
     This is an abstract class.  Only child classes should be instantiated.
     """
 
-    def schedule(self, parcels: List[Parcel], trucks: List[Truck],
+    def schedule(self, parcels: Union[List[Parcel], ParcelTable],
+                 trucks: List[Truck],
                  verbose: bool = False) -> List[Parcel]:
         """Schedule the given <_parcels> onto the given <trucks>, that is,
         decide which _parcels will go on which trucks, as well as the _routes
-        each truck will take.
+        each truck will take.  <_parcels> may be a list or a ParcelTable.
 
         Mutate the Truck objects in <trucks> so that they store information
         about which parcel objects they will deliver and what _routes they will
@@ -63,13 +65,14 @@ class RandomScheduler(Scheduler):
     order.
     """
 
-    def schedule(self, parcels: List[Parcel], trucks: List[Truck],
+    def schedule(self, parcels: Union[List[Parcel], ParcelTable],
+                 trucks: List[Truck],
                  verbose: bool = False) -> List[Parcel]:
         """ For each parcel, it will schedule it onto a randomly chosen truck
         (from among those trucks that have capacity to add that parcel).
         """
         p = 0  # index
-        p_copy = parcels[:]
+        p_copy = list(parcels)
         t_copy = trucks[:]
         shuffle(t_copy)
         shuffle(p_copy)
@@ -99,11 +102,18 @@ class GreedyScheduler(Scheduler):
         "greedy").
 
         === Private Attributes ===
-        _parcel_order: the sorted order of parcels
-        _truck_order: the sorted order of trucks
+        _parcel_priority: 'volume' or 'destination', whichever parcels are
+        sorted by
+        _parcel_key: the key that parcels are sorted by
+        _parcel_reverse: True iff parcels with larger keys go first
+        _parcel_queue: the kind of queue that parcels are sorted in
+        _truck_reverse: True iff trucks with more available space go first
         """
-    _parcel_order: Callable[[Parcel, Parcel], bool]
-    _truck_order: Callable[[Truck, Truck], bool]
+    _parcel_priority: str
+    _parcel_key: Callable[[Parcel], Union[int, str]]
+    _parcel_reverse: bool
+    _parcel_queue: Type[Union[KeyedPriorityQueue, BucketPriorityQueue]]
+    _truck_reverse: bool
 
     def __init__(self, config: Dict[str, Union[bool, str]]) -> None:
         """Initialize this GreedyScheduler
@@ -114,68 +124,24 @@ class GreedyScheduler(Scheduler):
         - truck_order must be either 'non-decreasing' or 'non-increasing'
         """
         parcel_priority = config['parcel_priority']
-        parcel_order = config['parcel_order']
-        truck_order = config['truck_order']
+        self._parcel_priority = parcel_priority
         if parcel_priority == 'volume':
-            if parcel_order == 'non-increasing':
-                self._parcel_order = _larger
-            elif parcel_order == 'non-decreasing':
-                self._parcel_order = _smaller
+            # volumes are small integers, so parcels can be bucketed
+            self._parcel_key = Parcel.get_volume
+            self._parcel_queue = BucketPriorityQueue
         elif parcel_priority == 'destination':
-            if parcel_order == 'non-increasing':
-                self._parcel_order = _alphabet_larger
-            elif parcel_order == 'non-decreasing':
-                self._parcel_order = _alphabet_smaller
-
-        if truck_order == 'non-increasing':
-            self._truck_order = _available_larger
-        elif truck_order == 'non-decreasing':
-            self._truck_order = _available_smaller
-
-    def _find(self, parcel: Parcel,
-              trucks: List[Truck]) -> Union[None, Truck]:
-        """Find the best truck for <parcel>. Do not add any parcels to any
-        trucks.
-        Return None if no trucks have enough capacity;
-        return the truck found if truck is eligible."""
-        truck_pq = PriorityQueue(self._truck_order)
-        for t in trucks:
-            truck_pq.add(t)
-        # for t in truck_pq._queue:
-        #     print(t.get_id(), t.get_capacity() - t.total_volume())
-        # print('\n')
-        new_truck_pq = PriorityQueue(self._truck_order)
-        while not truck_pq.is_empty():
-            truck = truck_pq.remove()  # truck with higher prio return first
-            volume_after = truck.total_volume() + parcel.get_volume()
-            if volume_after <= truck.get_capacity():
-                new_truck_pq.add(truck)
-
-        # truck_pq is now empty
-        # new_truck_pq contains all trucks eligible (have enough capacity)
-        first_truck, new_truck = None, None
-        # no add new_truck = None, then code below have problem
-        while not new_truck_pq.is_empty():
-            if first_truck is None:
-                first_truck = new_truck_pq.remove()
-                new_truck = first_truck
-            else:
-                new_truck = new_truck_pq.remove()
-
-            if new_truck.get_routes()[-1] == parcel.get_destination():
-                # return truck when found
-                return new_truck
-
-        # if new_truck_pq is empty ==> no truck with same dest
-        # ==> return first truck eligible # TO DO: ????
-        if new_truck_pq.is_empty():
-            return first_truck  # first truck is None or a Truck object
-
-    def schedule(self, parcels: List[Parcel], trucks: List[Truck],
+            self._parcel_key = Parcel.get_destination
+            self._parcel_queue = KeyedPriorityQueue
+        self._parcel_reverse = config['parcel_order'] == 'non-increasing'
+        self._truck_reverse = config['truck_order'] == 'non-increasing'
+
+    def schedule(self, parcels: Union[List[Parcel], ParcelTable],
+                 trucks: List[Truck],
                  verbose: bool = False) -> List[Parcel]:
         """Schedule the given <_parcels> onto the given <trucks> with a greedy
          schedule algorithm, that is, decide which _parcels will go on which
-         trucks, as well as the _routes each truck will take.
+         trucks, as well as the _routes each truck will take.  If <_parcels>
+         is a ParcelTable, it is sorted as a whole instead of being queued.
 
         Mutate the Truck objects in <trucks> so that they store information
         about which parcel objects they will deliver and what _routes they will
@@ -191,62 +157,189 @@ class GreedyScheduler(Scheduler):
         information is your choice; we will not test your code with <verbose>
         set to True.
         """
-        parcel_pq = PriorityQueue(self._parcel_order)
+        if isinstance(parcels, ParcelTable):
+            ordered = parcels.sorted_by(self._parcel_priority,
+                                        self._parcel_reverse)
+        else:
+            parcel_pq = self._parcel_queue.from_iterable(parcels,
+                                                         self._parcel_key,
+                                                         self._parcel_reverse)
+            ordered = (parcel_pq.remove() for _ in range(len(parcels)))
         parcels_not_packed = []
-        for p in parcels:
-            parcel_pq.add(p)
-        # Now parcels and trucks are sorted
-        while not parcel_pq.is_empty():
-            parcel = parcel_pq.remove()
-            # the helper will create a new truck_pq every time
-            truck_found = self._find(parcel, trucks)
-            if truck_found is None:
+        # the trucks stay sorted for the whole run
+        truck_queues = _TruckQueues(trucks, self._truck_reverse)
+        for parcel in ordered:
+            truck_found = truck_queues.find(parcel)
+            # a parcel with the id of a packed parcel is not packed either
+            if truck_found is None or \
+                    not truck_queues.pack(truck_found, parcel):
                 parcels_not_packed.append(parcel)
-            else:
-                truck_found.pack(parcel)
 
         return parcels_not_packed
 
 
-def _smaller(p1: Parcel, p2: Parcel) -> bool:
-    """Return true is <p1> has smaller volume than <p2>.
-    """
-    return p1.get_volume() < p2.get_volume()
-
-
-def _larger(p1: Parcel, p2: Parcel) -> bool:
-    """Return true is <p1> has larger volume than <p2>.
-    """
-    return p1.get_volume() > p2.get_volume()
-
-
-def _alphabet_smaller(p1: Parcel, p2: Parcel) -> bool:
-    """Return true is <p1> is alphabetically smaller than <p2>.
-    """
-    return p1.get_destination() < p2.get_destination()
-
-
-def _alphabet_larger(p1: Parcel, p2: Parcel) -> bool:
-    """Return true is <p1> is alphabetically larger than <p2>.
+class _TruckQueues:
+    """The trucks that a GreedyScheduler packs parcels onto, kept in truck
+    order for the whole run.
+
+    Trucks are ordered by available space, and trucks with the same
+    available space are ordered by their position in the list of trucks
+    given to the scheduler.  After a truck is packed only that truck is
+    repositioned.
+
+    === Private Attributes ===
+    _all:
+      All of the trucks.
+    _by_route_end:
+      Maps each city to the trucks whose routes currently end there.
+    _reverse:
+      True iff trucks with more available space come first.
+    _position:
+      Maps the id of each truck to its position in the list of trucks.
+
+    === Representation Invariants ===
+    - every truck is in <_all> and in exactly one queue of <_by_route_end>,
+      the one for the last city in its routes.
+    - no queue in <_by_route_end> is empty.
     """
-    return p1.get_destination() > p2.get_destination()
-
+    _all: BucketPriorityQueue
+    _by_route_end: Dict[str, BucketPriorityQueue]
+    _reverse: bool
+    _position: Dict[int, int]
+
+    def __init__(self, trucks: List[Truck], reverse: bool) -> None:
+        """Initialize the queues for <trucks>, with the trucks that have more
+        available space first iff <reverse> is True."""
+        self._reverse = reverse
+        self._position = {id(t): i for i, t in enumerate(trucks)}
+        self._all = self._new_queue(trucks)
+        by_route_end = {}
+        for t in trucks:
+            by_route_end.setdefault(t.get_routes()[-1], []).append(t)
+        self._by_route_end = {end: self._new_queue(ts)
+                              for end, ts in by_route_end.items()}
+
+    def _new_queue(self, trucks: List[Truck]) -> BucketPriorityQueue:
+        """Return a new queue of <trucks> in truck order."""
+        # available space is a small integer, so trucks are kept in buckets
+        return BucketPriorityQueue.from_iterable(trucks,
+                                                 Truck.available_space,
+                                                 self._reverse,
+                                                 self._rank)
+
+    def _rank(self, t: Truck) -> int:
+        """Return the position of <t> in the list of trucks."""
+        return self._position[id(t)]
+
+    def _enqueue(self, t: Truck) -> None:
+        """Add <t> to the queue for the last city in its routes."""
+        end = t.get_routes()[-1]
+        if end not in self._by_route_end:
+            self._by_route_end[end] = self._new_queue([t])
+        else:
+            self._by_route_end[end].add(t)
+
+    def find(self, parcel: Parcel) -> Union[None, Truck]:
+        """Find the best truck for <parcel>. Do not add any parcels to any
+        trucks.
 
-# Maybe add a method in Truck ? # TO DO
-def _available_smaller(t1: Truck, t2: Truck) -> bool:
-    """Return true is <t1> has less available space than <t2>.
+        The best truck is the first truck, in truck order, that has enough
+        available space and whose routes end at the destination of <parcel>;
+        if there is no such truck, it is the first truck with enough
+        available space.  Return None if no trucks have enough capacity.
+        """
+        bound = parcel.get_volume()
+        same_end = self._by_route_end.get(parcel.get_destination())
+        if same_end is not None:
+            truck = same_end.first_at_least(bound)
+            if truck is not None:
+                return truck
+        return self._all.first_at_least(bound)
+
+    def pack(self, truck: Truck, parcel: Parcel) -> bool:
+        """Pack <parcel> onto <truck> and reposition <truck>.
+
+        Return True if packed successfully; return False otherwise.
+        """
+        end = truck.get_routes()[-1]
+        if not truck.pack(parcel):
+            return False
+        self._all.update(truck)
+        queue = self._by_route_end[end]
+        if truck.get_routes()[-1] == end:
+            queue.update(truck)
+        else:
+            queue.remove(truck)
+            if queue.is_empty():
+                del self._by_route_end[end]
+            self._enqueue(truck)
+        return True
+
+
+class OnlineScheduler:
+    """ An online scheduler, which schedules parcels one at a time as they
+    arrive, instead of all at once.
+
+    Each parcel is packed onto the truck that a GreedyScheduler would pick
+    for it, so offering parcels in the order that a GreedyScheduler sorts
+    them schedules them the same way.  The trucks stay sorted between calls
+    to offer, so each parcel is placed in time that does not depend on the
+    number of parcels already placed.
+
+    Precondition: the trucks are only packed through this scheduler while
+    it is in use.
+
+    === Private Attributes ===
+    _queues: the trucks, in truck order.
+    _unplaced: the parcels that could not be placed since the last call to
+    flush, in the order they were offered.
     """
-    available1 = t1.get_capacity() - t1.total_volume()
-    available2 = t2.get_capacity() - t2.total_volume()
-    return available1 < available2
+    _queues: _TruckQueues
+    _unplaced: List[Parcel]
 
+    def __init__(self, trucks: List[Truck],
+                 config: Dict[str, Union[bool, str]]) -> None:
+        """Initialize this OnlineScheduler to schedule parcels onto <trucks>.
 
-def _available_larger(t1: Truck, t2: Truck) -> bool:
-    """Return true is <t1> has more available space than <t2>.
-    """
-    available1 = t1.get_capacity() - t1.total_volume()
-    available2 = t2.get_capacity() - t2.total_volume()
-    return available1 > available2
+        Precondition:
+        - truck_order must be either 'non-decreasing' or 'non-increasing'
+        """
+        self._queues = _TruckQueues(trucks,
+                                    config['truck_order'] == 'non-increasing')
+        self._unplaced = []
+
+    def offer(self, parcel: Parcel) -> Union[None, Truck]:
+        """Pack <parcel> onto the best truck for it, and return that truck.
+
+        Return None if no truck has enough available space, or <parcel> is
+        already on a truck, and keep <parcel> to be returned by flush.
+
+        >>> t1 = Truck(1423, 10, 'Toronto')
+        >>> t2 = Truck(1333, 5, 'Toronto')
+        >>> s = OnlineScheduler([t1, t2], {'truck_order': 'non-decreasing'})
+        >>> s.offer(Parcel(1, 4, 'Toronto', 'Hamilton')).get_id()
+        1333
+        >>> s.offer(Parcel(2, 8, 'Toronto', 'London')).get_id()
+        1423
+        >>> s.offer(Parcel(3, 5, 'Toronto', 'Hamilton')) is None
+        True
+        >>> [p.get_id() for p in s.flush()]
+        [3]
+        >>> s.flush()
+        []
+        """
+        truck = self._queues.find(parcel)
+        if truck is None or not self._queues.pack(truck, parcel):
+            self._unplaced.append(parcel)
+            return None
+        return truck
+
+    def flush(self) -> List[Parcel]:
+        """Return the parcels that could not be placed since the last call
+        to flush, in the order they were offered, and forget them."""
+        unplaced = self._unplaced
+        self._unplaced = []
+        return unplaced
 
 
 if __name__ == '__main__':